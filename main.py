@@ -0,0 +1,77 @@
+"""
+@name: main.py
+TG-Alert 命令行入口
+各子命令只在执行时才导入用到的模块：查看帮助、查询事件日志或检索消息都不会加载 asyncio 和 telethon
+
+用法:
+    python main.py [run] [--config config.json] [--accounts accounts.json]
+    python main.py replay run events.jsonl --rate 2000
+    python main.py journal query journal --chat 123 --since 1d
+    python main.py store search messages.db 关键词 --since 7d
+    python main.py bench startup
+"""
+
+import argparse
+import os
+import sys
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test')
+
+# 子命令 -> (模块, 说明)，其余参数原样交给模块自己的 main()
+TOOLS = {
+    'replay': ('replay', '离线事件回放'),
+    'journal': ('event_journal', '事件日志查询'),
+    'store': ('message_store', '消息全文检索'),
+    'bench': ('benchmarks', '性能基准'),
+}
+
+
+def run(args):
+    """启动告警系统"""
+    if args.config:
+        os.environ['CONFIG_FILE'] = args.config
+    if args.accounts:
+        os.environ['ACCOUNTS_FILE'] = args.accounts
+
+    import asyncio
+    import tg_alert_monitor
+
+    asyncio.run(tg_alert_monitor.main())
+
+
+def run_tool(command: str, argv):
+    """把剩余参数交给对应模块的命令行"""
+    import importlib
+
+    module = importlib.import_module(TOOLS[command][0])
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {command}", *argv]
+    module.main()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    sys.path.insert(0, SOURCE_DIR)
+
+    parser = argparse.ArgumentParser(description='TG-Alert Telegram 未回复消息提醒')
+    subparsers = parser.add_subparsers(dest='command')
+
+    p = subparsers.add_parser('run', help='启动告警系统（默认）')
+    p.add_argument('--config', help='JSON 配置文件，修改后自动重新加载（同 CONFIG_FILE 环境变量）')
+    p.add_argument('--accounts', help='多账号配置文件（同 ACCOUNTS_FILE 环境变量）')
+
+    # 只用于在帮助中列出
+    for command, (_, description) in TOOLS.items():
+        subparsers.add_parser(command, help=description)
+
+    # 工具子命令的参数（包括 --help）都交给模块自己解析
+    if argv and argv[0] in TOOLS:
+        run_tool(argv[0], argv[1:])
+        return
+    # 不带子命令时等同于 run
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv.insert(0, 'run')
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+@name: alert_scheduler.py
+集中式告警截止时间调度器
+所有告警的截止时间放在同一个最小堆里，只挂一个定时器，精确睡到最近的截止时间
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DueCallback = Callable[[Any], Awaitable[None]]
+
+
+class AlertScheduler:
+    """基于最小堆的截止时间调度器
+
+    - schedule/cancel 为 O(log n)：重新调度只压入新条目，旧条目在出堆时惰性丢弃
+    - 整个调度器只有一个 loop.call_later 定时器，没有轮询
+    - 到期后以独立任务执行回调，回调可以再次 schedule 同一个 key
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        # key -> (截止时间, 序号, 回调)，序号用于识别堆里过期的旧条目
+        self._entries: Dict[Hashable, Tuple[float, int, DueCallback]] = {}
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_deadline: Optional[float] = None
+        self._running: Set[asyncio.Task] = set()
+        self.wakeups = 0  # 定时器实际触发的次数
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """返回 key 当前的截止时间"""
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def schedule(self, key: Hashable, deadline: float, callback: DueCallback):
+        """设置（或重设）key 的截止时间，到期时执行 await callback(key)"""
+        seq = next(self._seq)
+        self._entries[key] = (deadline, seq, callback)
+        heapq.heappush(self._heap, (deadline, seq, key))
+        if self._timer_deadline is None or deadline < self._timer_deadline:
+            self._arm()
+
+    def cancel(self, key: Hashable) -> bool:
+        """取消 key 的截止时间，堆中的旧条目留待惰性清理"""
+        return self._entries.pop(key, None) is not None
+
+    def close(self):
+        """停止定时器并取消正在执行的回调"""
+        if self._timer:
+            self._timer.cancel()
+        self._timer = None
+        self._timer_deadline = None
+        self._entries.clear()
+        self._heap.clear()
+        for task in list(self._running):
+            task.cancel()
+
+    def _discard_stale(self):
+        """丢弃堆顶已被取消或重新调度的条目"""
+        heap, entries = self._heap, self._entries
+        while heap:
+            deadline, seq, key = heap[0]
+            entry = entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(heap)
+
+    def _arm(self):
+        """按最近的截止时间重设唯一的定时器"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = None
+        self._discard_stale()
+        if not self._heap:
+            return
+        deadline = self._heap[0][0]
+        delay = max(0.0, deadline - self._clock())
+        self._timer = asyncio.get_running_loop().call_later(delay, self._fire_due)
+        self._timer_deadline = deadline
+
+    def _fire_due(self):
+        """定时器到期：弹出所有已到期的条目并启动回调"""
+        self._timer = None
+        self._timer_deadline = None
+        self.wakeups += 1
+        now = self._clock()
+        loop = asyncio.get_running_loop()
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, key = heapq.heappop(self._heap)
+            _, _, callback = self._entries.pop(key)
+            task = loop.create_task(self._run_callback(callback, key))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        self._arm()
+
+    @staticmethod
+    async def _run_callback(callback: DueCallback, key: Hashable):
+        try:
+            await callback(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.error(f"调度回调执行失败: {key}", exc_info=True)
@@ -0,0 +1,139 @@
+"""
+@name: audio_cache.py
+解码后音频的磁盘缓存
+每个音频文件只解码一次，结果以 16 位 PCM WAV 的形式按内容哈希存放在缓存目录中，源文件没变时重启也不必重新解码；
+PCM 数据以只读 mmap 映射，Linux 驱动播放时直接从映射送给播放器，长音乐不会常驻内存（macOS 的 afplay 直接播放解码好的文件）
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import wave
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 解码结果的格式版本，格式变化时改这里，旧缓存自然失效
+_FORMAT = 's16'
+
+
+def convert_to_wav(source: str, target: str):
+    """把任意格式的音频转换为 16 位 PCM WAV（保持原采样率和声道数）：afconvert（macOS）或 ffmpeg"""
+    if sys.platform == 'darwin' and shutil.which('afconvert'):
+        args = ['afconvert', '-f', 'WAVE', '-d', 'LEI16', source, target]
+    elif shutil.which('ffmpeg'):
+        args = ['ffmpeg', '-v', 'error', '-y', '-i', source, '-acodec', 'pcm_s16le', '-f', 'wav', target]
+    else:
+        raise RuntimeError(f"没有可用的解码器（afconvert/ffmpeg）: {source}")
+    subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+
+def _is_pcm16_wav(path: str) -> bool:
+    try:
+        with wave.open(path, 'rb') as f:
+            return f.getsampwidth() == 2
+    except (wave.Error, EOFError):
+        return False
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+class AudioAsset:
+    """一个解码后的音频：缓存目录中的 WAV 文件，PCM 数据部分以只读 mmap 映射"""
+    __slots__ = ('source', 'path', 'rate', 'channels', 'frames', 'pcm', '_map')
+
+    def __init__(self, source: str, path: str):
+        self.source = source
+        self.path = path
+        with open(path, 'rb') as f:
+            with wave.open(f, 'rb') as w:
+                self.rate = w.getframerate()
+                self.channels = w.getnchannels()
+                self.frames = w.getnframes()
+                # 读完文件头后正好停在 data 块的开头
+                offset = f.tell()
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._map, 'madvise') and len(self._map):
+            # 提前把开头读进页缓存，第一次播放不用等磁盘
+            self._map.madvise(mmap.MADV_WILLNEED, 0, min(len(self._map), 1 << 20))
+        self.pcm = memoryview(self._map)[offset:offset + self.frames * self.channels * 2]
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.rate if self.rate else 0.0
+
+    def close(self):
+        self.pcm.release()
+        self._map.close()
+
+
+class AudioAssetCache:
+    """按内容哈希缓存解码结果：<directory>/<sha256 前 32 位>-s16.wav"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._assets: Dict[str, AudioAsset] = {}
+        # 源文件 (路径, 修改时间, 大小) -> 内容哈希，避免每次都重新读文件计算
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        # 预加载（线程池）和播放线程可能同时请求同一个文件
+        self._lock = threading.Lock()
+        self.decoded = 0
+        self.hits = 0
+
+    def get(self, source: str) -> AudioAsset:
+        """返回源文件对应的解码结果，没有缓存时先解码；源文件被修改后自动重新解码"""
+        with self._lock:
+            return self._get(source)
+
+    def _get(self, source: str) -> AudioAsset:
+        st = os.stat(source)
+        stamp = (source, st.st_mtime_ns, st.st_size)
+        digest = self._hashes.get(stamp)
+        if digest is None:
+            digest = self._hashes[stamp] = content_hash(source)
+        asset = self._assets.get(digest)
+        if asset is not None:
+            return asset
+
+        path = os.path.join(self.directory, f"{digest}-{_FORMAT}.wav")
+        if os.path.exists(path):
+            self.hits += 1
+        else:
+            self._decode(source, path)
+            self.decoded += 1
+        asset = self._assets[digest] = AudioAsset(source, path)
+        logger.info(f"🎵 音频 {source} 已映射: {asset.duration:.1f}s, {asset.rate}Hz, {asset.channels} 声道")
+        return asset
+
+    def _decode(self, source: str, path: str):
+        """解码到临时文件再改名，中途退出不会留下半个缓存文件"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.wav.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            if _is_pcm16_wav(source):
+                shutil.copyfile(source, tmp)
+            else:
+                convert_to_wav(source, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def close(self):
+        with self._lock:
+            for asset in self._assets.values():
+                asset.close()
+            self._assets.clear()
@@ -0,0 +1,333 @@
+"""
+@name: audio_engine.py
+常驻音频播放引擎
+一个后台线程串行处理所有播放请求，具体的出声方式由可替换的驱动实现；
+连续的一组播放（burst）只在开始时调整一次音量、结束后恢复一次
+"""
+
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from audio_cache import AudioAsset
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== 驱动 ====================
+class AudioDriver:
+    """音频驱动接口"""
+    name = 'base'
+
+    def load(self, path: str):
+        """预加载音频，返回驱动自己的句柄"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return path
+
+    def load_asset(self, asset):
+        """使用解码缓存中的音频（audio_cache.AudioAsset），返回驱动自己的句柄；默认直接播放解码好的 WAV 文件"""
+        return asset.path
+
+    def get_volume(self) -> Optional[int]:
+        """读取当前系统音量（0-100），不支持时返回 None"""
+        return None
+
+    def set_volume(self, volume: int):
+        """设置系统音量（0-100）"""
+
+    def play(self, sound):
+        """播放一次，阻塞到播放结束"""
+        raise NotImplementedError
+
+    def play_pcm(self, pcm, rate: int):
+        """播放一段 16 位 PCM（frames x channels 的 int16 数组），阻塞到播放结束；默认写成临时 WAV 再播放"""
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        try:
+            with os.fdopen(fd, 'wb') as f, wave.open(f, 'wb') as out:
+                out.setnchannels(pcm.shape[1])
+                out.setsampwidth(2)
+                out.setframerate(rate)
+                out.writeframes(pcm.tobytes())
+            self.play(path)
+        finally:
+            os.remove(path)
+
+    def close(self):
+        """释放资源"""
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    """直接执行命令（不经过 shell）"""
+    return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=False)
+
+
+class MacDriver(AudioDriver):
+    """macOS 驱动：osascript 控制音量，afplay 播放"""
+    name = 'mac'
+
+    def get_volume(self) -> Optional[int]:
+        out = _run(['osascript', '-e', 'output volume of (get volume settings)']).stdout.strip()
+        return int(out) if out.isdigit() else None
+
+    def set_volume(self, volume: int):
+        _run(['osascript', '-e', f'set volume output volume {int(volume)}'])
+
+    def play(self, sound):
+        _run(['afplay', sound])
+
+
+class LinuxDriver(AudioDriver):
+    """Linux 驱动：pactl 控制音量，paplay/aplay 播放"""
+    name = 'linux'
+
+    def __init__(self):
+        self.player = shutil.which('paplay') or shutil.which('aplay')
+        self.pactl = shutil.which('pactl')
+        if not self.player:
+            raise RuntimeError("未找到 paplay/aplay")
+
+    def get_volume(self) -> Optional[int]:
+        if not self.pactl:
+            return None
+        out = _run([self.pactl, 'get-sink-volume', '@DEFAULT_SINK@']).stdout
+        match = re.search(r'(\d+)%', out)
+        return int(match.group(1)) if match else None
+
+    def set_volume(self, volume: int):
+        if self.pactl:
+            _run([self.pactl, 'set-sink-volume', '@DEFAULT_SINK@', f'{int(volume)}%'])
+
+    def load_asset(self, asset):
+        # 播放时直接把映射好的 PCM 送给播放器
+        return asset
+
+    def play(self, sound):
+        if isinstance(sound, AudioAsset):
+            self._play_raw(sound.pcm, sound.rate, sound.channels)
+        else:
+            _run([self.player, sound])
+
+    def play_pcm(self, pcm, rate: int):
+        self._play_raw(pcm.tobytes(), rate, pcm.shape[1])
+
+    def _play_raw(self, data, rate: int, channels: int):
+        """经标准输入把 16 位 PCM 直接送给播放器，不写临时文件；data 可以是 mmap 的切片，按页读出，不整段复制"""
+        if os.path.basename(self.player) == 'paplay':
+            args = [self.player, '--raw', '--format=s16le', f'--rate={rate}', f'--channels={channels}']
+        else:
+            args = [self.player, '-q', '-t', 'raw', '-f', 'S16_LE', '-r', str(rate), '-c', str(channels), '-']
+        subprocess.run(args, input=data, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+
+
+class NullDriver(AudioDriver):
+    """空驱动：不出声，只记录播放过的音频，用于测试和无声环境"""
+    name = 'null'
+
+    def __init__(self):
+        self.volume = 50
+        self.plays: List[str] = []
+        self.volume_changes = 0
+
+    def load(self, path: str):
+        return path
+
+    def load_asset(self, asset):
+        # 记录原始文件名，便于和未启用缓存时的结果对照
+        return asset.source
+
+    def get_volume(self) -> Optional[int]:
+        return self.volume
+
+    def set_volume(self, volume: int):
+        self.volume = volume
+        self.volume_changes += 1
+
+    def play(self, sound):
+        self.plays.append(sound)
+
+    def play_pcm(self, pcm, rate: int):
+        self.plays.append(f"<pcm {len(pcm)} frames @ {rate}Hz>")
+
+
+class FileSinkDriver(NullDriver):
+    """文件驱动：把每次播放和音量变化追加写入文件，用于在没有声卡的机器上验证"""
+    name = 'file'
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def set_volume(self, volume: int):
+        super().set_volume(volume)
+        self._write(f"volume {volume}")
+
+    def play(self, sound):
+        super().play(sound)
+        self._write(f"play {sound}")
+
+    def load_asset(self, asset):
+        return f"{asset.source} (pcm {asset.frames} frames {asset.channels}ch {asset.rate}Hz, {asset.path})"
+
+    def play_pcm(self, pcm, rate: int):
+        super().play_pcm(pcm, rate)
+        self._write(f"play_pcm {len(pcm)} frames {pcm.shape[1]}ch {rate}Hz ({len(pcm) / rate:.3f}s)")
+
+    def _write(self, line: str):
+        self._file.write(f"{time.time():.3f} {line}\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def create_driver(name: str = 'auto', sink_path: str = 'audio_sink.log') -> AudioDriver:
+    """按名称创建驱动，auto 时根据平台选择，找不到播放器则退回空驱动"""
+    if name == 'auto':
+        if sys.platform == 'darwin':
+            return MacDriver()
+        try:
+            return LinuxDriver()
+        except RuntimeError:
+            logger.info("未找到可用的音频播放器，使用空驱动")
+            return NullDriver()
+    if name == 'mac':
+        return MacDriver()
+    if name == 'linux':
+        return LinuxDriver()
+    if name == 'null':
+        return NullDriver()
+    if name == 'file':
+        return FileSinkDriver(sink_path)
+    raise ValueError(f"未知的音频驱动: {name}")
+
+
+# ==================== 引擎 ====================
+@dataclass
+class PlayRequest:
+    """一次播放请求"""
+    path: str
+    volume: int
+    count: int
+    interval: float
+    future: Future
+    pcm: object = None  # 预先渲染好的 PCM，设置时忽略 path/count/interval
+    rate: int = 0
+
+
+class AudioEngine:
+    """常驻播放引擎：后台线程串行播放，音量按 burst 调整"""
+
+    def __init__(self, driver: AudioDriver, burst_idle: float = 1.0, cache=None):
+        self.driver = driver
+        self.burst_idle = burst_idle  # 队列空闲多久后认为一组播放结束并恢复音量
+        self.cache = cache  # audio_cache.AudioAssetCache，设置后每个文件只解码一次
+        self._sounds: Dict[str, object] = {}
+        self._queue: "queue.Queue[Optional[PlayRequest]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='audio-engine', daemon=True)
+        self._thread.start()
+
+    def preload(self, *paths: str):
+        """预加载音频文件，失败只记录日志"""
+        for path in paths:
+            try:
+                self._sound(path)
+            except Exception as e:
+                logger.info(f"❌ 预加载音频失败 {path}: {e}")
+
+    def _sound(self, path: str):
+        sound = self._sounds.get(path)
+        if sound is None:
+            sound = self._sounds[path] = self._load(path)
+        return sound
+
+    def _load(self, path: str):
+        if self.cache is not None:
+            try:
+                return self.driver.load_asset(self.cache.get(path))
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                logger.info(f"❌ 解码音频 {path} 失败，直接播放原文件: {e}")
+        return self.driver.load(path)
+
+    def submit(self, path: str, volume: int = 70, count: int = 1, interval: float = 0.5) -> Future:
+        """提交播放请求，返回在播放完成时结束的 Future"""
+        future = Future()
+        self._queue.put(PlayRequest(path, volume, count, interval, future))
+        return future
+
+    def submit_pcm(self, pcm, rate: int, volume: int = 70) -> Future:
+        """提交一段预先渲染好的 PCM，作为一次播放"""
+        future = Future()
+        self._queue.put(PlayRequest('<pcm>', volume, 1, 0.0, future, pcm, rate))
+        return future
+
+    def play(self, path: str, volume: int = 70, count: int = 1, interval: float = 0.5):
+        """同步播放，阻塞到播放结束"""
+        return self.submit(path, volume, count, interval).result()
+
+    def close(self):
+        """停止后台线程（会先播完已提交的请求）"""
+        self._queue.put(None)
+        self._thread.join(timeout=30)
+        self.driver.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _loop(self):
+        original_volume = None
+        current_volume = None
+        while True:
+            try:
+                # burst 进行中时只等待 burst_idle，超时即恢复音量
+                timeout = self.burst_idle if current_volume is not None else None
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._restore_volume(original_volume)
+                original_volume = current_volume = None
+                continue
+
+            if request is None:
+                self._restore_volume(original_volume)
+                return
+
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if current_volume is None:
+                    original_volume = self.driver.get_volume()
+                if request.volume != current_volume:
+                    self.driver.set_volume(request.volume)
+                    current_volume = request.volume
+                if request.pcm is not None:
+                    self.driver.play_pcm(request.pcm, request.rate)
+                else:
+                    sound = self._sound(request.path)
+                    for i in range(request.count):
+                        self.driver.play(sound)
+                        if i < request.count - 1:
+                            time.sleep(request.interval)
+                request.future.set_result(None)
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def _restore_volume(self, original_volume: Optional[int]):
+        if original_volume is None:
+            return
+        try:
+            self.driver.set_volume(original_volume)
+        except Exception:
+            logger.debug("恢复音量失败", exc_info=True)
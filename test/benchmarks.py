@@ -0,0 +1,448 @@
+"""
+@name: benchmarks.py
+性能基准脚本
+用法: python benchmarks.py <基准名> [参数]
+"""
+
+import argparse
+import random
+import string
+import time
+
+
+def _timeit(func, rounds: int) -> float:
+    """执行 rounds 次，返回平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+# ==================== 敏感词匹配 ====================
+def bench_sensitive(args):
+    """对比 Aho-Corasick 自动机与逐词子串扫描"""
+    from sensitive_matcher import SensitiveWordMatcher
+
+    rng = random.Random(42)
+    alphabet = string.ascii_letters + '你好请配合代码抽查在线状态组'
+    words = [''.join(rng.choice(alphabet) for _ in range(rng.randint(3, 8))) for _ in range(args.words)]
+    messages = [''.join(rng.choice(alphabet + ' ') for _ in range(args.length)) for _ in range(200)]
+    # 一半消息在末尾带一个命中词，覆盖命中和未命中两种情况
+    for i in range(0, len(messages), 2):
+        messages[i] += rng.choice(words)
+
+    build_start = time.perf_counter()
+    matcher = SensitiveWordMatcher(words)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    def linear_scan():
+        for msg in messages:
+            msg_lower = msg.lower()
+            any(word.lower() in msg_lower for word in words)
+
+    def automaton_scan():
+        for msg in messages:
+            matcher.search(msg)
+
+    # 两种方式的判定结果必须一致
+    for msg in messages:
+        msg_lower = msg.lower()
+        assert matcher.search(msg) == any(word.lower() in msg_lower for word in words)
+
+    linear_us = _timeit(linear_scan, args.rounds) / len(messages)
+    automaton_us = _timeit(automaton_scan, args.rounds) / len(messages)
+    print(f"词表 {args.words} 个，消息长度 {args.length}，自动机构建 {build_ms:.1f}ms")
+    print(f"逐词扫描:    {linear_us:8.2f} us/消息")
+    print(f"Aho-Corasick: {automaton_us:8.2f} us/消息 ({linear_us / automaton_us:.1f}x)")
+
+
+# ==================== 会话状态内存 ====================
+def _allocated(build) -> int:
+    """返回 build() 构造的对象占用的内存（字节）"""
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return after - before
+
+
+def bench_memory(args):
+    """对比旧的告警记录/会话状态结构与 __slots__ 记录 + 可老化状态的内存占用"""
+    import asyncio
+    from dataclasses import dataclass
+    from typing import Optional
+    from bounded_state import AgingMap
+    from tg_alert_monitor import AlertRecord
+
+    @dataclass
+    class LegacyAlertRecord:
+        message_id: int
+        mention_time: float
+        is_private: bool
+        alert_count: int = 0
+        is_cancelled: bool = False
+        task: Optional[asyncio.Task] = None
+        timeout_interval: int = 10
+
+    n = args.chats
+    now = time.time()
+    # 模拟长时间运行：每个会话都互动过，只有 active 比例的会话在取消窗口内
+    active = max(1, int(n * args.active))
+    touched = [now - (0 if i < active else 3600 * (1 + i % 24 * 7)) for i in range(n)]
+
+    legacy_records = _allocated(lambda: [LegacyAlertRecord(i, now, False) for i in range(n)])
+    slot_records = _allocated(lambda: [AlertRecord(i, now, False) for i in range(n)])
+
+    def legacy_state():
+        from collections import defaultdict
+        interactions, plays = {}, defaultdict(int)
+        for i in range(n):
+            interactions[-1000000000000 - i] = touched[i]
+            plays[-1000000000000 - i] += 1
+        return interactions, plays
+
+    def aging_state():
+        interactions, plays = AgingMap(), AgingMap(int)
+        for i in sorted(range(n), key=touched.__getitem__):
+            interactions.set(-1000000000000 - i, touched[i], touched[i])
+            plays.set(-1000000000000 - i, plays[-1000000000000 - i] + 1, touched[i])
+        interactions.prune(60)
+        plays.prune(86400)
+        return interactions, plays
+
+    legacy_maps = _allocated(legacy_state)
+    aging_maps = _allocated(aging_state)
+
+    scale = 10000 / n
+    print(f"{n} 个会话（{active} 个活跃），折算为每 1 万会话:")
+    print(f"告警记录:   dataclass {legacy_records * scale / 1024:8.1f} KiB -> slots {slot_records * scale / 1024:8.1f} KiB "
+          f"(节省 {(legacy_records - slot_records) * scale / 1024:.1f} KiB)")
+    print(f"会话状态:   dict      {legacy_maps * scale / 1024:8.1f} KiB -> 清理后 {aging_maps * scale / 1024:8.1f} KiB "
+          f"(节省 {(legacy_maps - aging_maps) * scale / 1024:.1f} KiB)")
+
+
+# ==================== 多账号 ====================
+def bench_accounts(args):
+    """对比多账号共用调度器/实体缓存与每个账号各自独立时的内存、任务数和定时器唤醒次数"""
+    import asyncio
+    import tracemalloc
+    import replay
+    import tg_alert_monitor as monitor
+
+    monitor.config.AUDIO_DRIVER = 'null'
+    monitor.config.AUDIO_CACHE_DIR = ''
+    monitor.config.METRICS_PORT = 0
+    monitor.config.STATE_DB_PATH = ''
+    monitor.config.JOURNAL_DIR = ''
+    monitor.config.CATCH_UP_ENABLED = False
+    monitor.config.GROUP_MENTION_TIMEOUT = args.timeout
+    monitor.config.PRIVATE_MESSAGE_TIMEOUT = args.timeout
+
+    async def run(n: int, shared_mode: bool) -> dict:
+        records = [list(replay.synthesize(args.events, seed=i)) for i in range(n)]
+        baseline_tasks = len(asyncio.all_tasks())
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        shared = monitor.SharedResources() if shared_mode else None
+        systems = []
+        for i in range(n):
+            client = replay.FakeClient(records[i], rate=args.rate, linger=args.linger)
+            system = monitor.TelegramAlertSystem(0, '', '', client=client, shared=shared, name=f"acc{i}")
+            client.after_replay = system.pipeline.join
+            systems.append(system)
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        runs = [asyncio.create_task(system.run()) for system in systems]
+        await asyncio.sleep(0.1)
+        tasks = len(asyncio.all_tasks()) - baseline_tasks - len(runs) - 1
+        schedulers = {id(system.scheduler): system.scheduler for system in systems}
+        await asyncio.gather(*runs)
+        wakeups = sum(s.wakeups for s in schedulers.values())
+        if shared:
+            await shared.close()
+        await monitor.SoundManager.close_queue()
+        return {'memory': memory, 'tasks': tasks, 'wakeups': wakeups, 'schedulers': len(schedulers)}
+
+    async def main():
+        for shared_mode in (False, True):
+            one = await run(1, shared_mode)
+            many = await run(args.accounts, shared_mode)
+            extra = max(1, args.accounts - 1)
+            label = '共享' if shared_mode else '独立'
+            print(f"{label}: {args.accounts} 个账号, 调度器 {many['schedulers']} 个; 每增加一个账号: "
+                  f"内存 {(many['memory'] - one['memory']) / extra / 1024:.1f} KiB, "
+                  f"任务 {(many['tasks'] - one['tasks']) / extra:.1f} 个, "
+                  f"定时器唤醒 {(many['wakeups'] - one['wakeups']) / extra:.1f} 次")
+
+    asyncio.run(main())
+    monitor.SoundManager.shutdown()
+
+
+# ==================== 消息全文存储 ====================
+def bench_message_store(args):
+    """批量写入合成消息，然后测量按关键词/会话/发送者/时间范围查询的耗时"""
+    import os
+    import tempfile
+    from message_store import MessageStore, search
+
+    rng = random.Random(42)
+    words = ['ok', '收到', 'hello', '今天', '代码', '发布', 'deploy', 'lunch', '会议', 'bug', '线上故障', 'rollback']
+    now = time.time()
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'messages.db')
+    if not os.path.exists(path):
+        store = MessageStore(path, retention=365 * 86400, max_rows=args.rows * 2)
+        store.start()
+        started = time.perf_counter()
+        for i in range(args.rows):
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+            store.add('default', rng.randint(100, 100 + args.chats), i, rng.randint(10_000, 15_000), text,
+                      now - (args.rows - i) * (30 * 86400 / args.rows))
+        store.close(timeout=None)
+        elapsed = time.perf_counter() - started
+        print(f"写入 {args.rows} 条: {elapsed:.1f}s ({args.rows / elapsed:.0f} 条/s), "
+              f"{store.batches} 个事务, 数据库 {os.path.getsize(path) / 1024 / 1024:.1f} MiB")
+
+    queries = [
+        ('关键词', dict(keyword='线上故障')),
+        ('短关键词', dict(keyword='bug')),
+        ('关键词+会话', dict(keyword='rollback', chat_id=150)),
+        ('会话+最近一天', dict(chat_id=150, since=now - 86400)),
+        ('发送者+最近一周', dict(sender_id=12345, since=now - 7 * 86400)),
+        ('关键词+最近一小时', dict(keyword='deploy', since=now - 3600)),
+        ('罕见关键词', dict(keyword='不存在的词')),
+    ]
+    for label, kwargs in queries:
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            results = search(path, limit=50, **kwargs)
+        print(f"{label:12s} {(time.perf_counter() - started) / args.rounds * 1000:8.1f} ms  ({len(results)} 条)")
+
+
+# ==================== 启动耗时 ====================
+# 子进程中执行：导入告警系统，用只有一个事件的 FakeClient 启动，记录处理器收到第一个事件的时间
+_FIRST_EVENT_SCRIPT = """
+import asyncio, json, sys, time
+t0 = float(sys.argv[1])
+import replay
+import tg_alert_monitor as monitor
+imported = time.time()
+monitor.config.AUDIO_DRIVER = 'null'
+monitor.config.AUDIO_CACHE_DIR = ''
+monitor.config.METRICS_PORT = 0
+monitor.config.STATE_DB_PATH = ''
+monitor.config.JOURNAL_DIR = ''
+monitor.config.CATCH_UP_ENABLED = False
+
+async def main():
+    client = replay.FakeClient(list(replay.synthesize(1)))
+    system = monitor.TelegramAlertSystem(0, '', '', client=client)
+    ingest = system._ingest
+    first = []
+
+    async def probe(event):
+        if not first:
+            first.append(time.time())
+        await ingest(event)
+
+    system._ingest = probe
+    await system.run()
+    await monitor.SoundManager.close_queue()
+    return first[0]
+
+first = asyncio.run(main())
+print(json.dumps({'import': imported - t0, 'first_event': first - t0}))
+"""
+
+
+def _median_ms(samples) -> float:
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000
+
+
+def bench_startup(args):
+    """测量入口的导入耗时和进程启动到收到第一个事件的耗时（每项都在新进程中执行）"""
+    import json
+    import os
+    import subprocess
+    import sys
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    entry = os.path.join(os.path.dirname(here), 'main.py')
+
+    def wall(argv) -> float:
+        started = time.perf_counter()
+        subprocess.run(argv, cwd=here, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return time.perf_counter() - started
+
+    commands = [
+        ('空解释器', [sys.executable, '-c', 'pass']),
+        ('main.py --help', [sys.executable, entry, '--help']),
+        ('import tg_alert_monitor', [sys.executable, '-c', 'import tg_alert_monitor']),
+        # 改动前的入口在导入时还会加载 pyautogui 和 dotenv
+        ('+ pyautogui/dotenv', [sys.executable, '-c', 'import pyautogui, dotenv, tg_alert_monitor']),
+    ]
+    for label, argv in commands:
+        try:
+            samples = [wall(argv) for _ in range(args.rounds)]
+        except subprocess.CalledProcessError:
+            print(f"{label:24s}     失败（未安装或没有图形界面）")
+            continue
+        print(f"{label:24s} {_median_ms(samples):8.1f} ms")
+
+    # 导入 tg_alert_monitor 时最慢的直接依赖
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import tg_alert_monitor'],
+                            cwd=here, capture_output=True, text=True, check=True)
+    direct = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        if len(name) - len(name.lstrip()) == 3:
+            direct.append((int(parts[1]), name.strip()))
+    print("最慢的直接依赖: " + ", ".join(f"{name} {us / 1000:.1f}ms" for us, name in sorted(direct, reverse=True)[:args.top]))
+
+    timings = []
+    for _ in range(args.rounds):
+        t0 = time.time()
+        result = subprocess.run([sys.executable, '-c', _FIRST_EVENT_SCRIPT, str(t0)], cwd=here,
+                                capture_output=True, text=True, check=True)
+        timings.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    print(f"进程启动到导入完成     {_median_ms([t['import'] for t in timings]):8.1f} ms")
+    print(f"进程启动到收到第一个事件 {_median_ms([t['first_event'] for t in timings]):8.1f} ms")
+
+
+# ==================== 会话存储 ====================
+def _io_counters() -> dict:
+    """本进程（含所有线程）的 I/O 计数，非 Linux 时返回空字典"""
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except OSError:
+        return {}
+
+
+def bench_session(args):
+    """按 telethon 客户端实际的调用方式驱动默认的 SQLiteSession 和 BatchedSession，比较磁盘写入和调用方耗时
+
+    telethon 1.28 起更新中的实体只保存在内存里：每分钟一次 _save_states_and_entities（自己的实体、主更新状态和
+    本分钟有更新的频道状态）后 save()；此外每个带实体的请求结果（如 get_entity）会立即 process_entities。
+    调用方耗时是花在会话存储调用上的时间；实际运行时 BatchedSession 的写入在后台线程完成，不占用事件循环
+    """
+    import os
+    import tempfile
+    from datetime import datetime, timezone
+    from telethon.sessions import SQLiteSession
+    from telethon.tl import types
+    from session_store import BatchedSession
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    users = [types.User(10_000 + i, access_hash=rng.getrandbits(62), username=f"user{i}", first_name=f"User{i}")
+             for i in range(args.users)]
+    me = types.contacts.ResolvedPeer(None, [types.InputPeerUser(0, 1)], [])
+    # 每分钟：有更新的频道（幂律分布，少数活跃群组贡献大部分更新）和期间的实体请求
+    minutes = []
+    for _ in range(args.minutes):
+        channels = {int(args.chats * rng.random() ** 3) for _ in range(int(args.rate * 60))}
+        requests = [types.contacts.ResolvedPeer(None, [rng.choice(users)], [])
+                    for _ in range(int(args.rpc_rate * 60))]
+        minutes.append((channels, requests))
+
+    def drive(session) -> dict:
+        before = _io_counters()
+        elapsed = 0.0
+        pts = 0
+        for channels, requests in minutes:
+            started = time.perf_counter()
+            for result in requests:
+                session.process_entities(result)
+            pts += int(args.rate * 60)
+            session.process_entities(me)
+            session.set_update_state(0, types.updates.State(pts, 0, now, pts, 0))
+            for channel in channels:
+                session.set_update_state(1_000_000 + channel, types.updates.State(pts, 0, now, 0, 0))
+            session.save()
+            elapsed += time.perf_counter() - started
+        started = time.perf_counter()
+        session.close()
+        elapsed += time.perf_counter() - started
+        after = _io_counters()
+        return {'elapsed': elapsed, **{key: after[key] - before[key] for key in after}}
+
+    directory = tempfile.mkdtemp()
+    results = {
+        '默认 SQLiteSession': drive(SQLiteSession(os.path.join(directory, 'default'))),
+        # flush_interval=0：每次 save() 都在调用方同步写入，与默认存储的写入次数相同，比较的是每次写入的开销
+        'BatchedSession': drive(BatchedSession(os.path.join(directory, 'batched'), flush_interval=0)),
+    }
+    print(f"{args.minutes} 分钟（{args.rate:.0f} 条更新/秒, {args.rpc_rate:g} 次实体请求/秒），"
+          f"{args.chats} 个群组，折算为每小时:")
+    scale = 60 / args.minutes
+    for label, r in results.items():
+        if 'syscw' in r:
+            print(f"{label:20s} write 调用 {r['syscw'] * scale:8.0f} 次, 写入 {r['wchar'] * scale / 1024:8.1f} KiB, "
+                  f"落盘 {r['write_bytes'] * scale / 1024:8.1f} KiB, 调用方耗时 {r['elapsed'] * scale * 1000:7.1f} ms")
+        else:
+            print(f"{label:20s} 调用方耗时 {r['elapsed'] * scale * 1000:7.1f} ms（当前平台无法读取 I/O 计数）")
+
+
+BENCHMARKS = {
+    'sensitive': bench_sensitive,
+    'memory': bench_memory,
+    'accounts': bench_accounts,
+    'message_store': bench_message_store,
+    'startup': bench_startup,
+    'session': bench_session,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TG-Alert 性能基准')
+    subparsers = parser.add_subparsers(dest='name', required=True)
+
+    p = subparsers.add_parser('sensitive', help='敏感词匹配')
+    p.add_argument('--words', type=int, default=2000, help='词表大小')
+    p.add_argument('--length', type=int, default=120, help='消息长度')
+    p.add_argument('--rounds', type=int, default=20, help='重复轮数')
+
+    p = subparsers.add_parser('memory', help='告警记录与会话状态内存占用')
+    p.add_argument('--chats', type=int, default=10000, help='跟踪的会话数')
+    p.add_argument('--active', type=float, default=0.02, help='仍在取消窗口内的会话比例')
+
+    p = subparsers.add_parser('accounts', help='多账号共享资源')
+    p.add_argument('--accounts', type=int, default=5, help='账号数')
+    p.add_argument('--events', type=int, default=2000, help='每个账号回放的事件数')
+    p.add_argument('--rate', type=float, default=2000.0, help='每个账号每秒事件数')
+    p.add_argument('--timeout', type=float, default=0.5, help='告警超时（秒）')
+    p.add_argument('--linger', type=float, default=2.0, help='回放结束后继续运行的秒数')
+
+    p = subparsers.add_parser('message_store', help='消息全文存储')
+    p.add_argument('--rows', type=int, default=1_000_000, help='消息条数')
+    p.add_argument('--chats', type=int, default=500, help='会话数')
+    p.add_argument('--rounds', type=int, default=5, help='每个查询重复的次数')
+    p.add_argument('--path', help='数据库文件，已存在时跳过写入直接查询')
+
+    p = subparsers.add_parser('startup', help='导入耗时与首个事件到达时间')
+    p.add_argument('--rounds', type=int, default=5, help='每项启动的进程数（取中位数）')
+    p.add_argument('--top', type=int, default=8, help='列出最慢的几个直接依赖')
+
+    p = subparsers.add_parser('session', help='会话存储磁盘写入')
+    p.add_argument('--minutes', type=int, default=60, help='模拟的分钟数（每分钟一次 save）')
+    p.add_argument('--users', type=int, default=5000, help='发送者数')
+    p.add_argument('--chats', type=int, default=200, help='群组数')
+    p.add_argument('--rate', type=float, default=20.0, help='每秒更新数')
+    p.add_argument('--rpc-rate', type=float, default=0.5, help='每秒带实体的请求数（如 get_entity）')
+
+    args = parser.parse_args()
+    BENCHMARKS[args.name](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+@name: bounded_state.py
+会随时间老化的按会话状态
+记录每个 key 最近一次写入的时间，可以按年龄批量淘汰，也可以设置容量上限
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterator, List, MutableMapping, Optional
+
+
+class AgingMap(MutableMapping):
+    """按最近写入时间排序的映射
+
+    - 写入时把 key 移到末尾，因此最旧的条目总在最前面，prune 只需从头扫描到第一个未过期的条目
+    - default_factory 与 defaultdict 相同：读取不存在的 key 时创建默认值（不计为写入）
+    - maxsize 为容量上限，超出时淘汰最久未写入的条目，并以被淘汰的 key 调用 on_evict
+    """
+
+    def __init__(self, default_factory: Optional[Callable] = None, maxsize: Optional[int] = None,
+                 clock: Callable[[], float] = time.time, on_evict: Optional[Callable[[Hashable], None]] = None):
+        self.default_factory = default_factory
+        self.maxsize = maxsize
+        self._clock = clock
+        self.on_evict = on_evict
+        # key -> (值, 写入时间)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._high_water = 0  # 上次重建以来的最大条目数
+        self.evicted = 0
+
+    def __getitem__(self, key):
+        item = self._data.get(key)
+        if item is not None:
+            return item[0]
+        if self.default_factory is None:
+            raise KeyError(key)
+        return self.default_factory()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, touched_at: Optional[float] = None):
+        """写入，touched_at 可指定写入时间（恢复历史数据时按时间先后写入）"""
+        self._data[key] = (value, self._clock() if touched_at is None else touched_at)
+        self._data.move_to_end(key)
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            self.evicted += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+        if len(self._data) > self._high_water:
+            self._high_water = len(self._data)
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        return item[0] if item is not None else default
+
+    def touched_at(self, key) -> Optional[float]:
+        """返回 key 最近一次写入的时间"""
+        item = self._data.get(key)
+        return item[1] if item is not None else None
+
+    def prune(self, max_age: float) -> List[Hashable]:
+        """淘汰超过 max_age 秒未写入的条目，返回被淘汰的 key"""
+        cutoff = self._clock() - max_age
+        removed = []
+        data = self._data
+        while data:
+            key, (_, touched) = next(iter(data.items()))
+            if touched > cutoff:
+                break
+            data.popitem(last=False)
+            removed.append(key)
+        self.evicted += len(removed)
+        # 字典删除条目后不会收缩，大量淘汰后重建一次以归还内存
+        if len(data) * 4 < self._high_water:
+            self._data = OrderedDict(data)
+            self._high_water = len(data)
+        return removed
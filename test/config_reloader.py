@@ -0,0 +1,128 @@
+"""
+@name: config_reloader.py
+配置文件热加载
+定期检查配置文件是否被修改，修改后在线程池中读取、校验并编译，再回到事件循环中一次性替换；
+校验失败时保留旧配置继续运行
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import fields
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigError(ValueError):
+    """配置文件内容不合法"""
+
+
+# 字段类型 -> 配置文件中允许的 JSON 类型
+_ACCEPTED_TYPES = {
+    bool: (bool,),
+    int: (int,),
+    float: (int, float),
+    str: (str,),
+    list: (list,),
+    dict: (dict,),
+}
+
+
+def read_config_file(path: str) -> dict:
+    """读取 JSON 配置文件"""
+    with open(path, encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"{path} 不是合法的 JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path} 顶层必须是对象")
+    return data
+
+
+def validate(data: dict, template) -> dict:
+    """按 dataclass 实例 template 的字段名和类型校验，返回可直接传给 dataclasses.replace 的参数"""
+    known = {f.name: f.type for f in fields(template)}
+    values = {}
+    for key, value in data.items():
+        if key not in known:
+            raise ConfigError(f"未知的配置项: {key}")
+        accepted = _ACCEPTED_TYPES.get(known[key])
+        if accepted is not None:
+            # bool 是 int 的子类，需要单独排除
+            if not isinstance(value, accepted) or (isinstance(value, bool) and bool not in accepted):
+                raise ConfigError(f"配置项 {key} 应为 {known[key].__name__}，实际为 {type(value).__name__}")
+            if known[key] is float:
+                value = float(value)
+        values[key] = value
+    return values
+
+
+class ConfigWatcher:
+    """轮询配置文件的修改时间，变化后重新加载
+
+    - compile 在线程池中执行：接收读取到的配置字典，完成校验和所有预编译，返回编译结果
+    - apply 在事件循环中同步执行：只做引用替换，中间没有 await，消息处理不会看到新旧混合的配置
+    """
+
+    def __init__(self, path: str, compile: Callable[[dict], Any], apply: Callable[[Any], None],
+                 interval: float = 2.0):
+        self.path = path
+        self.compile = compile
+        self.apply = apply
+        self.interval = interval
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.failures = 0
+
+    def _current_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        return self.compile(read_config_file(self.path))
+
+    async def start(self):
+        """记录当前文件状态并开始轮询（启动时的配置由调用方自行加载）"""
+        self._stamp = self._current_stamp()
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def check(self) -> bool:
+        """文件有变化时重新加载，返回是否替换了配置"""
+        stamp = self._current_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            compiled = await asyncio.get_running_loop().run_in_executor(None, self._load)
+        except (OSError, ConfigError) as e:
+            self.failures += 1
+            logger.error(f"⚠️ 配置文件 {self.path} 加载失败，继续使用旧配置: {e}")
+            return False
+        except Exception:
+            self.failures += 1
+            logger.error(f"⚠️ 配置文件 {self.path} 编译失败，继续使用旧配置", exc_info=True)
+            return False
+        self.apply(compiled)
+        self.reloads += 1
+        return True
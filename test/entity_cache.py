@@ -0,0 +1,100 @@
+"""
+@name: entity_cache.py
+会话/用户实体缓存
+按 peer id 缓存 event.get_chat()/event.get_sender() 的结果，带 TTL 过期和容量上限的 LRU 淘汰
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class EntityCache:
+    """带 TTL 的 LRU 实体缓存，并发请求同一个 key 时只发起一次获取"""
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 600.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (过期时间, 实体)，按最近使用排序
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存，过期或不存在返回 None"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, entity = item
+        if expires <= self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entity
+
+    def put(self, key: Hashable, entity: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = (self._clock() + self.ttl, entity)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """删除指定缓存"""
+        self._data.pop(key, None)
+
+    async def get_or_fetch(self, key: Optional[Hashable], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """命中直接返回，否则调用 fetch 获取并写入缓存；key 为 None 时不缓存"""
+        if key is None:
+            return await fetch()
+
+        entity = self.get(key)
+        if entity is not None:
+            self.hits += 1
+            return entity
+        self.misses += 1
+
+        # 同一实体已有请求在途，等待其结果即可
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entity = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # 没有其他等待者时避免 "exception was never retrieved" 警告
+                future.exception()
+            raise
+        else:
+            if entity is not None:
+                self.put(key, entity)
+            future.set_result(entity)
+            return entity
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
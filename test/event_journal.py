@@ -0,0 +1,312 @@
+"""
+@name: event_journal.py
+结构化事件日志（JSONL）
+消息、告警决策和告警触发以紧凑的 JSON 行追加写入分段文件，后台线程负责序列化和写盘；
+分段写满后切换到新文件，旧分段在后台压缩成 gzip，并在 index.jsonl 中记录它的时间范围和涉及的会话，
+查询时只打开时间和会话都对得上的分段
+
+用法: python event_journal.py query <目录> [--chat ID] [--kind fire] [--since 7d] [--until 2024-01-31]
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.jsonl'
+_SEGMENT_RE = re.compile(r'^events-(\d+)\.jsonl(\.gz)?$')
+
+
+def _segment_name(seq: int) -> str:
+    return f"events-{seq:06d}.jsonl"
+
+
+class _SegmentStats:
+    """当前分段的索引信息"""
+
+    def __init__(self):
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+        self.count = 0
+        self.chats: Set[int] = set()
+
+    def add(self, ts: float, chat_id):
+        if self.start is None:
+            self.start = ts
+        self.end = ts
+        self.count += 1
+        if chat_id is not None:
+            self.chats.add(chat_id)
+
+    def entry(self, segment: str) -> dict:
+        return {'segment': segment, 'start': self.start, 'end': self.end, 'count': self.count,
+                'chats': sorted(self.chats)}
+
+
+class EventJournal:
+    """追加写入、按大小分段、后台压缩的事件日志"""
+
+    def __init__(self, directory: str, max_bytes: int = 16 * 1024 * 1024, compress: bool = True,
+                 flush_interval: float = 0.5):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self._queue: "queue.SimpleQueue[Optional[dict]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._compressors: List[threading.Thread] = []
+        self.written = 0
+        self.rotations = 0
+
+    def record(self, kind: str, chat_id: Optional[int] = None, **fields):
+        """追加一条事件（只入队，序列化和写盘都在后台线程中完成）"""
+        self._queue.put({'ts': time.time(), 'kind': kind, 'chat_id': chat_id, **fields})
+
+    def start(self):
+        """补建上次未正常关闭的分段的索引，然后启动写线程"""
+        if self._thread:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        indexed = {entry['segment'] for entry in read_index(self.directory)}
+        last_seq = 0
+        for name in sorted(os.listdir(self.directory)):
+            match = _SEGMENT_RE.match(name)
+            if not match:
+                continue
+            last_seq = max(last_seq, int(match.group(1)))
+            if match.group(2):
+                continue
+            segment = _segment_name(int(match.group(1)))
+            if segment not in indexed:
+                stats = _scan_segment(os.path.join(self.directory, name))
+                if stats.count:
+                    self._close_segment(segment, stats)
+                else:
+                    os.remove(os.path.join(self.directory, name))
+            else:
+                # 已登记但上次没来得及压缩
+                self._compress_later(segment)
+        self._thread = threading.Thread(target=self._writer, args=(last_seq + 1,), name='event-journal', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """写完剩余事件，关闭当前分段并等待压缩完成"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+        for thread in self._compressors:
+            thread.join(timeout=30)
+        self._compressors.clear()
+
+    def _writer(self, seq: int):
+        segment = _segment_name(seq)
+        f = open(os.path.join(self.directory, segment), 'a', encoding='utf-8')
+        stats = _SegmentStats()
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item] if item is not None else []
+                stop = item is None
+                deadline = time.monotonic() + self.flush_interval
+                while not stop:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                    else:
+                        batch.append(item)
+                if batch:
+                    lines = []
+                    for fields in batch:
+                        stats.add(fields['ts'], fields['chat_id'])
+                        lines.append(json.dumps(fields, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n'.join(lines) + '\n')
+                    f.flush()
+                    self.written += len(batch)
+                if stop:
+                    return
+                if f.tell() >= self.max_bytes:
+                    f.close()
+                    self._close_segment(segment, stats)
+                    self.rotations += 1
+                    seq += 1
+                    segment = _segment_name(seq)
+                    f = open(os.path.join(self.directory, segment), 'a', encoding='utf-8')
+                    stats = _SegmentStats()
+        except Exception:
+            logger.error("事件日志写入线程异常退出", exc_info=True)
+        finally:
+            if not f.closed:
+                f.close()
+                if stats.count:
+                    self._close_segment(segment, stats)
+                else:
+                    os.remove(os.path.join(self.directory, segment))
+
+    def _close_segment(self, segment: str, stats: _SegmentStats):
+        """把写满（或关闭时）的分段登记到索引，并在后台压缩"""
+        with open(os.path.join(self.directory, INDEX_FILE), 'a', encoding='utf-8') as index:
+            index.write(json.dumps(stats.entry(segment), separators=(',', ':')) + '\n')
+        self._compress_later(segment)
+
+    def _compress_later(self, segment: str):
+        if not self.compress:
+            return
+        thread = threading.Thread(target=_compress, args=(os.path.join(self.directory, segment),),
+                                  name='event-journal-gzip', daemon=True)
+        thread.start()
+        self._compressors = [t for t in self._compressors if t.is_alive()] + [thread]
+
+
+def _compress(path: str):
+    """压缩为 .gz：先写临时文件再改名，中途退出不会留下半个压缩文件"""
+    try:
+        with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + '.gz.tmp', path + '.gz')
+        os.remove(path)
+    except Exception:
+        logger.error(f"压缩事件日志 {path} 失败", exc_info=True)
+
+
+def _scan_segment(path: str) -> _SegmentStats:
+    stats = _SegmentStats()
+    for event in _read_segment(path):
+        stats.add(event['ts'], event.get('chat_id'))
+    return stats
+
+
+def _read_segment(path: str) -> Iterator[dict]:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # 异常退出时最后一行可能不完整
+                continue
+
+
+def read_index(directory: str) -> List[dict]:
+    """读取分段索引"""
+    try:
+        with open(os.path.join(directory, INDEX_FILE), encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _segment_path(directory: str, segment: str) -> Optional[str]:
+    for name in (segment + '.gz', segment):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def query(directory: str, chat_id: Optional[int] = None, kinds: Optional[Set[str]] = None,
+          since: Optional[float] = None, until: Optional[float] = None,
+          account: Optional[str] = None) -> Iterator[dict]:
+    """按时间、会话和事件类型查询，只读取索引显示可能包含结果的分段和尚未登记的当前分段"""
+    index = read_index(directory)
+    indexed = {entry['segment'] for entry in index}
+    segments = []
+    for entry in index:
+        if since is not None and entry['end'] < since:
+            continue
+        if until is not None and entry['start'] > until:
+            continue
+        if chat_id is not None and chat_id not in entry['chats']:
+            continue
+        segments.append(entry['segment'])
+    # 当前正在写入的分段还没有索引，总是要读
+    for name in sorted(os.listdir(directory)):
+        match = _SEGMENT_RE.match(name)
+        if match and _segment_name(int(match.group(1))) not in indexed:
+            segments.append(_segment_name(int(match.group(1))))
+
+    for segment in sorted(set(segments)):
+        path = _segment_path(directory, segment)
+        if path is None:
+            continue
+        for event in _read_segment(path):
+            ts = event['ts']
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts > until:
+                continue
+            if chat_id is not None and event.get('chat_id') != chat_id:
+                continue
+            if kinds and event['kind'] not in kinds:
+                continue
+            if account is not None and event.get('account') != account:
+                continue
+            yield event
+
+
+_RELATIVE_RE = re.compile(r'^(\d+(?:\.\d+)?)([smhdw])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """解析时间参数：相对时间（30m、12h、7d、1w）或 ISO 日期/时间"""
+    if value is None:
+        return None
+    match = _RELATIVE_RE.match(value)
+    if match:
+        return time.time() - float(match.group(1)) * _UNITS[match.group(2)]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TG-Alert 事件日志查询')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('query', help='查询事件（JSONL 输出到标准输出）')
+    p.add_argument('directory', help='事件日志目录')
+    p.add_argument('--chat', type=int, help='会话 ID')
+    p.add_argument('--kind', action='append', help='事件类型，可重复（message/alert/refresh/skip/fire/retire/done）')
+    p.add_argument('--account', help='账号名')
+    p.add_argument('--since', help='起始时间，如 7d、12h 或 2024-01-01')
+    p.add_argument('--until', help='结束时间，格式同 --since')
+    p.add_argument('--count', action='store_true', help='只输出匹配的条数')
+
+    p = subparsers.add_parser('segments', help='列出分段索引')
+    p.add_argument('directory', help='事件日志目录')
+
+    args = parser.parse_args()
+    if args.command == 'segments':
+        for entry in read_index(args.directory):
+            print(f"{entry['segment']}  {datetime.fromtimestamp(entry['start']):%Y-%m-%d %H:%M:%S} ~ "
+                  f"{datetime.fromtimestamp(entry['end']):%Y-%m-%d %H:%M:%S}  "
+                  f"{entry['count']} 条, {len(entry['chats'])} 个会话")
+        return
+
+    events = query(args.directory, args.chat, set(args.kind) if args.kind else None,
+                   parse_time(args.since), parse_time(args.until), args.account)
+    if args.count:
+        print(sum(1 for _ in events))
+        return
+    for event in events:
+        sys.stdout.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+@name: message_index.py
+最近消息索引
+按 (chat_id, msg_id) 记录近期消息是否 @ 了我们以及发送者，回复判断优先在本地完成
+"""
+
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+
+class IndexedMessage(NamedTuple):
+    """索引中的单条消息"""
+    is_mention: bool
+    sender_id: Optional[int]
+
+
+class MessageIndex:
+    """有界的消息索引：每个会话保留最近 per_chat 条，最多跟踪 max_chats 个会话"""
+
+    def __init__(self, per_chat: int = 500, max_chats: int = 1000):
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[Hashable, OrderedDict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(len(messages) for messages in self._chats.values())
+
+    def add(self, chat_id: Hashable, msg_id: int, is_mention: bool, sender_id: Optional[int]):
+        """记录一条消息，超出上限时淘汰最旧的消息和最久不活跃的会话"""
+        messages = self._chats.get(chat_id)
+        if messages is None:
+            messages = self._chats[chat_id] = OrderedDict()
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        messages[msg_id] = IndexedMessage(is_mention, sender_id)
+        messages.move_to_end(msg_id)
+        if len(messages) > self.per_chat:
+            messages.popitem(last=False)
+
+    def get(self, chat_id: Hashable, msg_id: int) -> Optional[IndexedMessage]:
+        """查找消息，未收录时返回 None"""
+        messages = self._chats.get(chat_id)
+        entry = messages.get(msg_id) if messages else None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
@@ -0,0 +1,264 @@
+"""
+@name: message_store.py
+收到的消息的本地全文索引（SQLite FTS5）
+消息正文由后台线程批量写入，可以按会话、发送者、时间范围和关键词查询；
+超过保留时长或总条数上限的旧消息定期删除，磁盘占用有上限
+
+用法: python message_store.py search <数据库> [关键词] [--chat ID] [--sender ID] [--since 1d] [--limit 50]
+"""
+
+import argparse
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    account TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    msg_id INTEGER NOT NULL,
+    sender_id INTEGER,
+    text TEXT NOT NULL,
+    UNIQUE (account, chat_id, msg_id)
+);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+CREATE INDEX IF NOT EXISTS messages_chat_ts ON messages (chat_id, ts);
+CREATE INDEX IF NOT EXISTS messages_sender_ts ON messages (sender_id, ts);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+# trigram 分词支持中文子串检索（需要 SQLite 3.34+），不支持时退回按空白/标点分词
+_FTS_TRIGRAM = "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id', tokenize='trigram')"
+_FTS_DEFAULT = "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id')"
+
+# 编辑后的消息只在正文变化时更新，避免无谓地重建全文索引
+_UPSERT = """
+INSERT INTO messages (ts, account, chat_id, msg_id, sender_id, text) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (account, chat_id, msg_id) DO UPDATE SET text = excluded.text WHERE text != excluded.text
+"""
+
+_PRUNE_BATCH = 5000
+
+
+class StoredMessage(NamedTuple):
+    ts: float
+    account: str
+    chat_id: int
+    msg_id: int
+    sender_id: Optional[int]
+    text: str
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """打开（必要时创建）数据库"""
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    # auto_vacuum 只能在建表前设置，之后删除的页可以用 incremental_vacuum 归还
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    try:
+        conn.execute(_FTS_TRIGRAM)
+    except sqlite3.OperationalError:
+        conn.execute(_FTS_DEFAULT)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class MessageStore:
+    """消息全文存储，写入全部在后台线程中批量完成"""
+
+    def __init__(self, path: str, retention: float = 30 * 86400, max_rows: int = 5_000_000,
+                 flush_interval: float = 1.0, prune_interval: float = 600.0, max_batch: int = 1000):
+        self.path = path
+        self.retention = retention
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch  # 单个事务最多写入的条数，消息洪峰时不会长时间占用写锁
+        self.prune_interval = prune_interval
+        self._queue: "queue.SimpleQueue[Optional[tuple]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.batches = 0
+        self.pruned = 0
+
+    def add(self, account: str, chat_id: int, msg_id: int, sender_id: Optional[int], text: str,
+            ts: Optional[float] = None):
+        """追加一条消息（只入队，不阻塞调用方）；同一条消息再次写入时覆盖正文"""
+        self._queue.put((ts or time.time(), account, chat_id, msg_id, sender_id, text))
+
+    def start(self):
+        if self._thread:
+            return
+        conn = _connect(self.path)
+        self._thread = threading.Thread(target=self._writer, args=(conn,), name='message-store', daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: Optional[float] = 30):
+        """写完剩余消息并关闭，timeout 为 None 时一直等到写完"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _writer(self, conn: sqlite3.Connection):
+        next_prune = time.monotonic()
+        try:
+            while True:
+                batch = []
+                stop = False
+                try:
+                    item = self._queue.get(timeout=self.prune_interval)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    stop = True
+                elif item:
+                    batch.append(item)
+                    # 攒一批：等 flush_interval、队列取空或者攒够 max_batch 条
+                    deadline = time.monotonic() + self.flush_interval
+                    while len(batch) < self.max_batch:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            item = self._queue.get(timeout=remaining)
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            stop = True
+                            break
+                        batch.append(item)
+                if batch:
+                    conn.execute('BEGIN')
+                    conn.executemany(_UPSERT, batch)
+                    conn.execute('COMMIT')
+                    self.written += len(batch)
+                    self.batches += 1
+                if time.monotonic() >= next_prune:
+                    self._prune(conn)
+                    next_prune = time.monotonic() + self.prune_interval
+                if stop:
+                    return
+        except Exception:
+            logger.error("消息存储写入线程异常退出", exc_info=True)
+        finally:
+            conn.close()
+
+    def _prune(self, conn: sqlite3.Connection):
+        """删除超过保留时长的消息，以及超出条数上限的最旧消息（分批提交，不长时间占用写锁）"""
+        removed = 0
+        cutoff = time.time() - self.retention
+        while True:
+            cur = conn.execute('DELETE FROM messages WHERE id IN (SELECT id FROM messages WHERE ts < ? LIMIT ?)',
+                               (cutoff, _PRUNE_BATCH))
+            removed += cur.rowcount
+            if cur.rowcount < _PRUNE_BATCH:
+                break
+        excess = conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0] - self.max_rows
+        while excess > 0:
+            n = min(excess, _PRUNE_BATCH)
+            conn.execute('DELETE FROM messages WHERE id IN (SELECT id FROM messages ORDER BY ts LIMIT ?)', (n,))
+            removed += n
+            excess -= n
+        if removed:
+            conn.execute('PRAGMA incremental_vacuum')
+            self.pruned += removed
+            logger.info(f"🧹 消息存储清理了 {removed} 条旧消息")
+
+
+def search(path: str, keyword: Optional[str] = None, chat_id: Optional[int] = None,
+           sender_id: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None,
+           account: Optional[str] = None, limit: int = 50) -> List[StoredMessage]:
+    """按关键词、会话、发送者和时间范围查询，返回最新的 limit 条
+
+    - 指定了会话或发送者时，先用 (chat_id, ts)/(sender_id, ts) 索引取出该会话的消息，再逐条匹配关键词
+    - 只有关键词时走全文索引，按写入顺序从新到旧取结果，取够 limit 条即停止；
+      trigram 分词下不足 3 个字符的关键词无法用全文索引，同样逐条匹配
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        fts_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'messages_fts'").fetchone()[0]
+        where, params = [], []
+        for column, value in (('chat_id', chat_id), ('sender_id', sender_id), ('account', account)):
+            if value is not None:
+                where.append(f"m.{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("m.ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("m.ts <= ?")
+            params.append(until)
+
+        order = "m.ts DESC"
+        source = "messages m"
+        if keyword:
+            # trigram 至少需要 3 个字符才能用全文索引
+            use_fts = chat_id is None and sender_id is None and ('trigram' not in fts_sql or len(keyword) >= 3)
+            if use_fts:
+                source = "messages_fts f JOIN messages m ON m.id = f.rowid"
+                where.insert(0, "messages_fts MATCH ?")
+                params.insert(0, '"' + keyword.replace('"', '""') + '"')
+                # 按 rowid 倒序可以边查边停，rowid 与写入时间同序
+                order = "f.rowid DESC"
+            else:
+                where.append("m.text LIKE ?")
+                params.append(f"%{keyword}%")
+
+        query = f"SELECT m.ts, m.account, m.chat_id, m.msg_id, m.sender_id, m.text FROM {source}"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {order} LIMIT ?"
+        return [StoredMessage(*row) for row in conn.execute(query, (*params, limit))]
+    finally:
+        conn.close()
+
+
+def main():
+    from event_journal import parse_time
+
+    parser = argparse.ArgumentParser(description='TG-Alert 消息全文检索')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('search', help='检索消息')
+    p.add_argument('path', help='消息数据库文件')
+    p.add_argument('keyword', nargs='?',
+                   help='关键词；没有 --chat/--sender 时走全文索引（trigram 分词需要至少 3 个字符），'
+                        '否则用 LIKE 逐条匹配该会话/发送者的消息，不足 3 个字符且没有其他条件时会扫描整张表')
+    p.add_argument('--chat', type=int, help='会话 ID')
+    p.add_argument('--sender', type=int, help='发送者 ID')
+    p.add_argument('--account', help='账号名')
+    p.add_argument('--since', help='起始时间，如 7d、12h 或 2024-01-01')
+    p.add_argument('--until', help='结束时间，格式同 --since')
+    p.add_argument('--limit', type=int, default=50, help='最多返回的条数')
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    results = search(args.path, args.keyword, args.chat, args.sender, parse_time(args.since),
+                     parse_time(args.until), args.account, args.limit)
+    for m in results:
+        sys.stdout.write(f"{datetime.fromtimestamp(m.ts):%m-%d %H:%M:%S} [{m.account}] chat {m.chat_id} "
+                         f"sender {m.sender_id} #{m.msg_id}: {m.text}\n")
+    sys.stderr.write(f"{len(results)} 条, 耗时 {(time.perf_counter() - started) * 1000:.1f}ms\n")
+
+
+if __name__ == '__main__':
+    main()
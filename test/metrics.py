@@ -0,0 +1,257 @@
+"""
+@name: metrics.py
+轻量的 Prometheus 指标
+提供 Counter / Gauge / Histogram 和文本格式输出，以及一个只响应 /metrics 的本地 HTTP 服务
+"""
+
+import asyncio
+import bisect
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    # 文本格式中特殊值的写法与 Python 的 repr 不同
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _Metric:
+    """指标基类，按标签值保存子指标"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry or REGISTRY).register(self)
+        if not self.labelnames:
+            # 无标签指标从一开始就输出 0
+            self.labels()
+
+    def labels(self, *values, **kwargs):
+        """按标签取子指标"""
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class _Value:
+    __slots__ = ('value', 'lock', 'func')
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+        self.func: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, func: Callable[[], float]):
+        """取值时调用 func，适合暴露已有的计数"""
+        self.func = func
+
+    def get(self) -> float:
+        if self.func is not None:
+            try:
+                return float(self.func())
+            except Exception:
+                logger.debug("读取指标值失败", exc_info=True)
+                return math.nan
+        return self.value
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def set_function(self, func: Callable[[], float]):
+        self._default().set_function(func)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v.get())}"
+                for k, v in list(self._children.items())]
+
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+    kind = 'gauge'
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: "Registry" = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        return '\n'.join(m.render() for m in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    """本地 HTTP 指标服务，GET /metrics 返回注册表内容"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9108, registry: Registry = None):
+        self.host = host
+        self.port = port
+        self.registry = registry or REGISTRY
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"📈 指标服务已启动: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # 读完请求头
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', self.registry.render().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                status, body, content_type = '404 Not Found', b'not found\n', 'text/plain'
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
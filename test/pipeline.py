@@ -0,0 +1,193 @@
+"""
+@name: pipeline.py
+分阶段的消息处理流水线
+每个阶段有自己的有界 asyncio 队列和若干 worker，阶段之间由处理函数显式转发；
+需要保持顺序的阶段可以按 key 分片，每个分片只有一个 worker，同一 key 的条目按放入顺序处理；
+队列满时可以选择阻塞（向上游施加背压）或丢弃（不可丢弃的条目仍然等待），并记录每个阶段的排队和处理耗时
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Union
+
+logger = logging.getLogger(__name__)
+
+StageHandler = Callable[[Any], Awaitable[None]]
+ShardKey = Callable[[Any], Hashable]
+
+
+class StageStats:
+    """单个阶段的计数和耗时统计"""
+    __slots__ = ('processed', 'dropped', 'errors', 'wait_total', 'service_total', 'service_max')
+
+    def __init__(self):
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.wait_total = 0.0  # 排队总耗时
+        self.service_total = 0.0  # 处理总耗时
+        self.service_max = 0.0
+
+    def as_dict(self) -> dict:
+        n = self.processed or 1
+        return {
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'wait_avg': self.wait_total / n,
+            'service_avg': self.service_total / n,
+            'service_max': self.service_max,
+        }
+
+
+class Stage:
+    """流水线中的一个阶段"""
+
+    def __init__(self, name: str, handler: StageHandler, workers: int = 1, maxsize: int = 1000,
+                 drop_when_full: bool = False):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.drop_when_full = drop_when_full
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.stats = StageStats()
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    async def put(self, item: Any, essential: bool = False) -> bool:
+        """放入队列；阻塞模式下队列满会等待，丢弃模式下返回 False，essential 的条目在丢弃模式下也会等待"""
+        entry = (time.perf_counter(), item)
+        if self.drop_when_full and not essential:
+            try:
+                self.queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                self.stats.dropped += 1
+                return False
+            return True
+        await self.queue.put(entry)
+        return True
+
+    def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"{self.name}-{i}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def join(self):
+        await self.queue.join()
+
+    async def _worker(self):
+        stats = self.stats
+        while True:
+            enqueued_at, item = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                stats.errors += 1
+                logger.error(f"流水线阶段 {self.name} 处理失败", exc_info=True)
+            finally:
+                finished = time.perf_counter()
+                stats.processed += 1
+                stats.wait_total += started - enqueued_at
+                service = finished - started
+                stats.service_total += service
+                if service > stats.service_max:
+                    stats.service_max = service
+                self.queue.task_done()
+
+
+class ShardedStage:
+    """按 key 分片的阶段：每个分片有自己的队列（容量 maxsize）和一个 worker，同一 key 的条目按放入顺序处理"""
+
+    def __init__(self, name: str, handler: StageHandler, key: ShardKey, shards: int = 1, maxsize: int = 1000,
+                 drop_when_full: bool = False):
+        self.name = name
+        self.key = key
+        self.shards = [Stage(f"{name}.{i}", handler, 1, maxsize, drop_when_full) for i in range(max(1, shards))]
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.depth for shard in self.shards)
+
+    @property
+    def stats(self) -> StageStats:
+        """所有分片的汇总统计"""
+        total = StageStats()
+        for shard in self.shards:
+            stats = shard.stats
+            total.processed += stats.processed
+            total.dropped += stats.dropped
+            total.errors += stats.errors
+            total.wait_total += stats.wait_total
+            total.service_total += stats.service_total
+            total.service_max = max(total.service_max, stats.service_max)
+        return total
+
+    async def put(self, item: Any, essential: bool = False) -> bool:
+        """放入 key 对应的分片，队列满时的行为与 Stage.put 相同"""
+        shard = self.shards[hash(self.key(item)) % len(self.shards)]
+        return await shard.put(item, essential)
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    async def stop(self):
+        for shard in self.shards:
+            await shard.stop()
+
+    async def join(self):
+        for shard in self.shards:
+            await shard.join()
+
+
+class Pipeline:
+    """按名称管理的一组阶段"""
+
+    def __init__(self):
+        self.stages: Dict[str, Union[Stage, ShardedStage]] = {}
+
+    def add_stage(self, name: str, handler: StageHandler, workers: int = 1, maxsize: int = 1000,
+                  drop_when_full: bool = False) -> Stage:
+        stage = Stage(name, handler, workers, maxsize, drop_when_full)
+        self.stages[name] = stage
+        return stage
+
+    def add_sharded_stage(self, name: str, handler: StageHandler, key: ShardKey, shards: int = 1,
+                          maxsize: int = 1000, drop_when_full: bool = False) -> ShardedStage:
+        stage = ShardedStage(name, handler, key, shards, maxsize, drop_when_full)
+        self.stages[name] = stage
+        return stage
+
+    def __getitem__(self, name: str) -> Union[Stage, ShardedStage]:
+        return self.stages[name]
+
+    def start(self):
+        for stage in self.stages.values():
+            stage.start()
+
+    async def join(self):
+        """等待所有阶段的队列清空（按添加顺序，上游先清空）"""
+        for stage in self.stages.values():
+            await stage.join()
+
+    async def stop(self):
+        for stage in self.stages.values():
+            await stage.stop()
+
+    def stats(self) -> Dict[str, dict]:
+        result = {}
+        for name, stage in self.stages.items():
+            result[name] = dict(stage.stats.as_dict(), depth=stage.depth)
+        return result
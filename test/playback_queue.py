@@ -0,0 +1,175 @@
+"""
+@name: playback_queue.py
+带优先级、可合并的异步播放队列
+所有播放请求进入同一个队列，按优先级（敏感词 > 私聊 > 群组）依次交给播放引擎；
+同一音频的重复请求在排队期间或刚开始播放的短时间内会被合并成一次播放
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SubmitFunc = Callable[[str, int, int, float], Future]
+
+
+class Priority(IntEnum):
+    """播放优先级，数值越小越先播放"""
+    SENSITIVE = 0
+    PRIVATE = 1
+    GROUP = 2
+
+
+@dataclass
+class _Request:
+    path: str
+    volume: int
+    count: int
+    interval: float
+    priority: Priority
+    enqueued_at: float
+    waiters: List[asyncio.Future] = field(default_factory=list)
+    started_at: Optional[float] = None
+    seq: int = 0
+
+
+class PlaybackQueue:
+    """单消费者的异步播放队列"""
+
+    def __init__(self, submit: SubmitFunc, coalesce_window: float = 0.3, latency_samples: int = 256,
+                 on_start: Optional[Callable[[float], None]] = None):
+        self._submit = submit
+        # 每个请求开始播放时以排队延迟（秒）调用，用于导出指标
+        self._on_start = on_start
+        self.coalesce_window = coalesce_window
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        # path -> 排队中的请求；以及当前正在播放的请求
+        self._pending: Dict[str, _Request] = {}
+        self._playing: Optional[_Request] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self.played = 0
+        self.coalesced = 0
+
+    @property
+    def depth(self) -> int:
+        """排队中（尚未开始播放）的请求数"""
+        return len(self._pending)
+
+    def enqueue(self, path: str, priority: Priority, volume: int = 70, count: int = 1,
+                interval: float = 0.5) -> asyncio.Future:
+        """加入播放队列，返回在播放结束时完成的 Future（调用方可以选择不等待）"""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        now = time.monotonic()
+
+        # 同一音频刚开始播放，直接并入
+        playing = self._playing
+        if (playing and playing.path == path and playing.count >= count
+                and now - playing.started_at <= self.coalesce_window):
+            playing.waiters.append(waiter)
+            self.coalesced += 1
+            return waiter
+
+        # 同一音频已在排队，合并并在需要时提升优先级
+        pending = self._pending.get(path)
+        if pending is not None:
+            pending.waiters.append(waiter)
+            pending.volume = max(pending.volume, volume)
+            pending.count = max(pending.count, count)
+            self.coalesced += 1
+            if priority < pending.priority:
+                pending.priority = priority
+                pending.seq = next(self._seq)
+                self._queue.put_nowait((pending.priority, pending.seq, pending))
+            return waiter
+
+        request = _Request(path, volume, count, interval, priority, now, [waiter], seq=next(self._seq))
+        self._pending[path] = request
+        self._ensure_worker()
+        self._queue.put_nowait((priority, request.seq, request))
+        return waiter
+
+    async def play(self, path: str, priority: Priority, volume: int = 70, count: int = 1, interval: float = 0.5):
+        """加入队列并等待播放结束"""
+        await self.enqueue(path, priority, volume, count, interval)
+
+    def stats(self) -> dict:
+        """队列深度与排队延迟（入队到开始播放）统计"""
+        samples = sorted(self._latencies)
+        return {
+            'depth': self.depth,
+            'played': self.played,
+            'coalesced': self.coalesced,
+            'latency_p50': samples[len(samples) // 2] if samples else 0.0,
+            'latency_max': samples[-1] if samples else 0.0,
+        }
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        """停止消费任务，未播放的请求以取消结束"""
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for request in self._pending.values():
+            self._finish(request, cancelled=True)
+        self._pending.clear()
+
+    async def _run(self):
+        while True:
+            priority, seq, request = await self._queue.get()
+            # 提升优先级后留下的旧条目直接丢弃
+            if seq != request.seq or self._pending.get(request.path) is not request:
+                continue
+            del self._pending[request.path]
+
+            request.started_at = time.monotonic()
+            latency = request.started_at - request.enqueued_at
+            self._latencies.append(latency)
+            if self._on_start is not None:
+                self._on_start(latency)
+            self._playing = request
+            error = None
+            try:
+                await asyncio.wrap_future(self._submit(request.path, request.volume, request.count, request.interval))
+                self.played += 1
+            except asyncio.CancelledError:
+                self._finish(request, cancelled=True)
+                raise
+            except Exception as e:
+                error = e
+                logger.info(f"❌ 播放 {request.path} 失败: {e}")
+            finally:
+                self._playing = None
+            self._finish(request, error=error)
+
+    @staticmethod
+    def _finish(request: _Request, error: Optional[BaseException] = None, cancelled: bool = False):
+        for waiter in request.waiters:
+            if waiter.done():
+                continue
+            if cancelled:
+                waiter.cancel()
+            elif error is not None:
+                waiter.set_exception(error)
+                # 不等待结果的调用方不需要 "exception was never retrieved" 警告
+                waiter.exception()
+            else:
+                waiter.set_result(None)
@@ -0,0 +1,377 @@
+"""
+@name: replay.py
+离线事件回放与吞吐基准
+用 FakeClient 代替 TelegramClient，把录制或合成的 NewMessage/MessageEdited 事件（JSONL）
+按指定速率送入 TelegramAlertSystem，统计吞吐、处理延迟以及创建/触发的告警数
+
+用法:
+    python replay.py synth --events 10000 > events.jsonl
+    python replay.py run events.jsonl --rate 2000
+
+事件格式（每行一个 JSON）:
+    {"t": 0.0, "kind": "new", "id": 1, "chat_id": 100, "sender_id": 5, "private": false,
+     "text": "hi @me", "mentioned": true, "reply_to": null, "out": false}
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+# ==================== 假对象 ====================
+class FakeEntity:
+    """假的用户/会话实体"""
+
+    def __init__(self, entity_id: int, username: Optional[str] = None, title: Optional[str] = None):
+        self.id = entity_id
+        self.username = username or f"user{entity_id}"
+        self.first_name = f"User{entity_id}"
+        self.last_name = None
+        self.title = title or f"Chat{entity_id}"
+
+
+class FakeMessage:
+    """假的 Message，字段与告警系统用到的 telethon Message 字段一致"""
+
+    def __init__(self, client: "FakeClient", record: dict):
+        self._client = client
+        self.id = record['id']
+        self.chat_id = record['chat_id']
+        self.sender_id = record['sender_id']
+        self.message = record.get('text', '')
+        self.mentioned = record.get('mentioned', False)
+        self.out = record.get('out', False)
+        self.reply_to_msg_id = record.get('reply_to')
+        self.reply_to = self.reply_to_msg_id
+        self.entities = None
+
+    async def get_reply_message(self):
+        if self.reply_to_msg_id is None:
+            return None
+        await asyncio.sleep(self._client.fetch_latency)
+        self._client.reply_fetches += 1
+        return self._client.messages.get((self.chat_id, self.reply_to_msg_id))
+
+
+class FakeEvent:
+    """假的 NewMessage/MessageEdited 事件"""
+
+    def __init__(self, client: "FakeClient", record: dict):
+        self._client = client
+        self.kind = record.get('kind', 'new')
+        self.is_edit = self.kind == 'edit'
+        self.message = FakeMessage(client, record)
+        self.id = self.message.id
+        self.chat_id = self.message.chat_id
+        self.sender_id = self.message.sender_id
+        self.is_private = record.get('private', False)
+        self.is_group = not self.is_private
+        self.is_channel = False
+        self.out = self.message.out
+        self.mentioned = self.message.mentioned
+        self.dispatched_at = 0.0
+
+    async def get_chat(self):
+        return await self._client.get_entity(self.chat_id, title=None if self.is_private else f"Group{self.chat_id}")
+
+    async def get_sender(self):
+        return await self._client.get_entity(self.sender_id)
+
+
+class FakeReadEvent:
+    """假的 MessageRead 事件（我们在其他设备上读到了 max_id）"""
+
+    def __init__(self, record: dict):
+        self.kind = 'read'
+        self.chat_id = record['chat_id']
+        self.max_id = record['max_id']
+        self.inbox = True
+        self.outbox = False
+        self.dispatched_at = 0.0
+
+
+class FakeClient:
+    """TelegramClient 的本地替身：注册处理器、模拟实体获取延迟、按速率回放事件"""
+
+    def __init__(self, records: Iterable[dict], my_id: int = 1, my_username: str = 'me',
+                 rate: float = 0.0, realtime: bool = False, fetch_latency: float = 0.0, linger: float = 0.0):
+        self.records = records
+        self.me = FakeEntity(my_id, my_username)
+        self.rate = rate
+        self.realtime = realtime
+        self.fetch_latency = fetch_latency
+        self.linger = linger  # 回放结束后保持“在线”的秒数，让到期告警有机会触发
+        self.after_replay = None  # 回放结束后等待的协程函数（如清空流水线）
+        self.handlers: Dict[type, List] = {}
+        self.messages: Dict[tuple, FakeMessage] = {}
+        self.entity_fetches = 0
+        self.reply_fetches = 0
+        self.dispatched = 0
+        self.replay_seconds = 0.0
+        self.processed_seconds = 0.0  # 回放开始到全部事件处理完毕
+
+    # ---- TelegramClient 接口 ----
+    def on(self, builder):
+        def decorator(handler):
+            self.add_event_handler(handler, builder)
+            return handler
+        return decorator
+
+    def add_event_handler(self, handler, builder=None):
+        key = builder if isinstance(builder, type) else type(builder)
+        self.handlers.setdefault(key, []).append(handler)
+
+    async def start(self, *args, **kwargs):
+        return self
+
+    async def get_me(self):
+        return self.me
+
+    async def get_entity(self, entity_id: int, title: Optional[str] = None):
+        self.entity_fetches += 1
+        if self.fetch_latency:
+            await asyncio.sleep(self.fetch_latency)
+        return FakeEntity(entity_id, title=title)
+
+    async def disconnect(self):
+        pass
+
+    async def run_until_disconnected(self):
+        """回放全部事件后返回，相当于连接断开"""
+        start = time.perf_counter()
+        await self.replay()
+        if self.after_replay:
+            await self.after_replay()
+        self.processed_seconds = time.perf_counter() - start
+        if self.linger:
+            await asyncio.sleep(self.linger)
+
+    # ---- 回放 ----
+    def _handlers_for(self, kind: str) -> List:
+        return self.handlers.get(_builder(kind), [])
+
+    async def replay(self):
+        interval = 1.0 / self.rate if self.rate else 0.0
+        start = time.perf_counter()
+        for i, record in enumerate(self.records):
+            if self.realtime:
+                target = start + record.get('t', 0.0)
+            else:
+                target = start + i * interval
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif i % 256 == 0:
+                # 全速回放时定期让出事件循环
+                await asyncio.sleep(0)
+
+            if record.get('kind') == 'read':
+                event = FakeReadEvent(record)
+            else:
+                event = FakeEvent(self, record)
+                self.messages[(event.chat_id, event.id)] = event.message
+            event.dispatched_at = time.perf_counter()
+            for handler in self._handlers_for(event.kind):
+                await handler(event)
+            self.dispatched += 1
+        self.replay_seconds = time.perf_counter() - start
+
+
+# ==================== 事件来源 ====================
+def load_events(path: str) -> Iterator[dict]:
+    """逐行读取 JSONL 事件，'-' 表示标准输入"""
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def synthesize(count: int, chats: int = 200, senders: int = 500, private_rate: float = 0.05,
+               mention_rate: float = 0.02, edit_rate: float = 0.05, out_rate: float = 0.01,
+               my_id: int = 1, my_username: str = 'me', seed: int = 42, rate: float = 1000.0,
+               unchanged_edit_rate: float = 0.5, read_rate: float = 0.01) -> Iterator[dict]:
+    """生成合成事件流
+
+    unchanged_edit_rate 为编辑事件中内容未变化（链接预览、表情回应等）的比例，
+    read_rate 为在其他设备上已读某个会话的事件比例
+    """
+    rng = random.Random(seed)
+    next_id: Dict[int, int] = {}
+    last: Dict[int, dict] = {}
+    words = ['ok', '收到', 'hello', '今天', '代码', '发布', 'deploy', 'lunch', '会议', 'bug']
+    for i in range(count):
+        if last and rng.random() < read_rate:
+            chat_id = rng.choice(list(last))
+            yield {'t': i / rate, 'kind': 'read', 'chat_id': chat_id, 'max_id': next_id[chat_id],
+                   'private': last[chat_id]['private']}
+            continue
+        private = rng.random() < private_rate
+        chat_id = rng.randint(10_000, 10_000 + senders) if private else rng.randint(100, 100 + chats)
+        out = rng.random() < out_rate
+        sender_id = my_id if out else (chat_id if private else rng.randint(10_000, 10_000 + senders))
+        msg_id = next_id.get(chat_id, 0)
+        kind = 'new'
+        if msg_id and rng.random() < edit_rate:
+            kind = 'edit'
+        else:
+            msg_id += 1
+            next_id[chat_id] = msg_id
+        if kind == 'edit' and rng.random() < unchanged_edit_rate:
+            yield dict(last[chat_id], t=i / rate, kind=kind)
+            continue
+        mentioned = not private and not out and rng.random() < mention_rate
+        text = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+        if mentioned:
+            text = f"@{my_username} {text}"
+        record = last[chat_id] = {
+            't': i / rate, 'kind': kind, 'id': msg_id, 'chat_id': chat_id, 'sender_id': sender_id,
+            'private': private, 'text': text, 'mentioned': mentioned,
+            'reply_to': msg_id - 1 if msg_id > 1 and rng.random() < 0.2 else None, 'out': out,
+        }
+        yield record
+
+
+# ==================== 基准 ====================
+def _percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def run_replay(records: Iterable[dict], rate: float = 0.0, realtime: bool = False,
+                     direct: bool = False, fetch_latency: float = 0.0, drain: float = 0.0) -> dict:
+    """回放事件并返回统计结果
+
+    direct=True 时直接调用 _handle_message，否则走 run() 注册的事件回调（流水线）
+    """
+    import tg_alert_monitor as monitor
+
+    monitor.config.AUDIO_DRIVER = 'null'
+    monitor.config.AUDIO_CACHE_DIR = ''
+    monitor.config.PIPELINE_ENABLED = not direct
+    monitor.config.METRICS_PORT = 0
+    monitor.config.STATE_DB_PATH = ''
+    monitor.config.JOURNAL_DIR = ''
+    monitor.config.CATCH_UP_ENABLED = False
+    client = FakeClient(records, rate=rate, realtime=realtime, fetch_latency=fetch_latency, linger=drain)
+    system = monitor.TelegramAlertSystem(0, '', '', client=client)
+
+    latencies: List[float] = []
+    counters = {'fired': 0}
+
+    decide = system._decide
+
+    async def timed_decide(event, chat, sender):
+        await decide(event, chat, sender)
+        latencies.append(time.perf_counter() - event.dispatched_at)
+
+    play_alert = system._play_alert
+
+    async def counted_play(chat_id, record):
+        counters['fired'] += 1
+        await play_alert(chat_id, record)
+
+    system._decide = timed_decide
+    system._play_alert = counted_play
+
+    if direct:
+        await _run_direct(system, client)
+    else:
+        client.after_replay = system.pipeline.join
+        await system.run()
+    elapsed = client.processed_seconds
+    system.scheduler.close()
+    await monitor.SoundManager.close_queue()
+    monitor.SoundManager.shutdown()
+
+    return {
+        'events': client.dispatched,
+        'seconds': elapsed,
+        'events_per_sec': client.dispatched / elapsed if elapsed else 0.0,
+        'decided': len(latencies),
+        'latency_p50_ms': _percentile(latencies, 0.50) * 1000,
+        'latency_p99_ms': _percentile(latencies, 0.99) * 1000,
+        'alerts_created': system.alerts_created,
+        'alerts_fired': counters['fired'],
+        'pending_alerts': len(system.pending_alerts),
+        'edits_skipped': system.edits_skipped,
+        'alerts_retired': system.alerts_retired,
+        'entity_fetches': client.entity_fetches,
+        'reply_fetches': client.reply_fetches,
+        'entity_cache': system.entity_cache.stats(),
+        'pipeline': system.pipeline.stats(),
+    }
+
+
+async def _run_direct(system, client: FakeClient):
+    """不经过事件回调，直接把事件交给 _handle_message"""
+    system._set_identity(client.me)
+    client.add_event_handler(system._handle_message, _builder('new'))
+    client.add_event_handler(system._handle_message, _builder('edit'))
+    client.add_event_handler(system._on_read, _builder('read'))
+    await client.run_until_disconnected()
+
+
+def _builder(kind: str):
+    from telethon import events
+    if kind == 'read':
+        return events.MessageRead
+    return events.MessageEdited if kind == 'edit' else events.NewMessage
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TelegramAlertSystem 离线回放')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('synth', help='生成合成事件（JSONL 输出到标准输出）')
+    p.add_argument('--events', type=int, default=10000)
+    p.add_argument('--chats', type=int, default=200)
+    p.add_argument('--senders', type=int, default=500)
+    p.add_argument('--private-rate', type=float, default=0.05)
+    p.add_argument('--mention-rate', type=float, default=0.02)
+    p.add_argument('--edit-rate', type=float, default=0.05)
+    p.add_argument('--unchanged-edit-rate', type=float, default=0.5, help='内容未变化的编辑所占比例')
+    p.add_argument('--read-rate', type=float, default=0.01, help='在其他设备上已读会话的事件比例')
+    p.add_argument('--seed', type=int, default=42)
+
+    p = subparsers.add_parser('run', help='回放事件并输出统计')
+    p.add_argument('path', help="JSONL 事件文件，'-' 为标准输入")
+    p.add_argument('--rate', type=float, default=0.0, help='每秒事件数，0 为全速')
+    p.add_argument('--realtime', action='store_true', help='按事件中的 t 字段回放')
+    p.add_argument('--direct', action='store_true', help='直接调用 _handle_message，不经过流水线')
+    p.add_argument('--fetch-latency', type=float, default=0.0, help='模拟实体获取的网络延迟（秒）')
+    p.add_argument('--group-timeout', type=float, help='覆盖 GROUP_MENTION_TIMEOUT')
+    p.add_argument('--private-timeout', type=float, help='覆盖 PRIVATE_MESSAGE_TIMEOUT')
+    p.add_argument('--drain', type=float, default=0.0, help='回放结束后继续等待告警触发的秒数')
+
+    args = parser.parse_args()
+    if args.command == 'synth':
+        for record in synthesize(args.events, args.chats, args.senders, args.private_rate,
+                                 args.mention_rate, args.edit_rate, seed=args.seed,
+                                 unchanged_edit_rate=args.unchanged_edit_rate, read_rate=args.read_rate):
+            print(json.dumps(record, ensure_ascii=False))
+        return
+
+    import tg_alert_monitor as monitor
+    if args.group_timeout is not None:
+        monitor.config.GROUP_MENTION_TIMEOUT = args.group_timeout
+    if args.private_timeout is not None:
+        monitor.config.PRIVATE_MESSAGE_TIMEOUT = args.private_timeout
+
+    result = asyncio.run(run_replay(load_events(args.path), args.rate, args.realtime, args.direct,
+                                    args.fetch_latency, args.drain))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
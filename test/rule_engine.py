@@ -0,0 +1,153 @@
+"""
+@name: rule_engine.py
+按会话/发送者索引的告警规则
+规则在加载配置时编译成以 chat_id 和 sender_id 为 key 的字典，每条消息最多两次字典查找即可取到
+适用于它的规则，没有规则的会话直接走默认逻辑，不做任何额外检查
+"""
+
+import re
+import time
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from config_reloader import ConfigError
+from sensitive_matcher import SensitiveWordMatcher
+
+
+class Rule(NamedTuple):
+    """编译后的规则，None 表示沿用全局配置"""
+    muted: bool = False  # 不为该会话/发送者创建提醒
+    vip: bool = False  # 任何消息都提醒（不需要@），且不受免打扰时段限制
+    group_timeout: Optional[int] = None
+    private_timeout: Optional[int] = None
+    max_alert_count: Optional[int] = None
+    # 关键词/正则匹配函数，命中任意一个即视为需要提醒
+    watchers: Tuple[Callable[[str], object], ...] = ()
+    # 免打扰时段，(开始分钟, 结束分钟)，结束早于开始表示跨零点
+    quiet_hours: Tuple[Tuple[int, int], ...] = ()
+
+    def matches(self, text: str) -> bool:
+        """消息内容是否命中关键词或正则"""
+        return bool(text) and any(watch(text) for watch in self.watchers)
+
+    def in_quiet_hours(self, ts: float) -> bool:
+        """ts（本地时间）是否在免打扰时段内"""
+        if not self.quiet_hours:
+            return False
+        tm = time.localtime(ts)
+        minute = tm.tm_hour * 60 + tm.tm_min
+        for start, end in self.quiet_hours:
+            if start <= minute < end if start <= end else (minute >= start or minute < end):
+                return True
+        return False
+
+    def merge(self, other: "Rule") -> "Rule":
+        """叠加另一条规则：标记取并集，数值以 other 为准，关键词和免打扰时段合并"""
+        return Rule(
+            muted=self.muted or other.muted,
+            vip=self.vip or other.vip,
+            group_timeout=other.group_timeout or self.group_timeout,
+            private_timeout=other.private_timeout or self.private_timeout,
+            max_alert_count=other.max_alert_count or self.max_alert_count,
+            watchers=self.watchers + other.watchers,
+            quiet_hours=self.quiet_hours + other.quiet_hours,
+        )
+
+
+def _parse_quiet_hours(value, where: str) -> Tuple[Tuple[int, int], ...]:
+    """解析 "23:00-07:00" 或其列表"""
+    ranges = []
+    for item in [value] if isinstance(value, str) else value:
+        try:
+            start, end = (h * 60 + m for h, m in (map(int, part.split(':')) for part in item.split('-')))
+        except (AttributeError, ValueError):
+            raise ConfigError(f"{where} 的 QUIET_HOURS 格式应为 HH:MM-HH:MM: {item!r}") from None
+        if not (0 <= start < 1440 and 0 <= end <= 1440):
+            raise ConfigError(f"{where} 的 QUIET_HOURS 超出范围: {item!r}")
+        ranges.append((start, end))
+    return tuple(ranges)
+
+
+def _positive_int(value, key: str, where: str) -> int:
+    if type(value) is not int or value <= 0:
+        raise ConfigError(f"{where} 的 {key} 必须是正整数: {value!r}")
+    return value
+
+
+def compile_rule(spec: dict, where: str) -> Rule:
+    """把配置文件中的一条规则编译成 Rule"""
+    if not isinstance(spec, dict):
+        raise ConfigError(f"{where} 的规则必须是对象")
+    values = {}
+    watchers = []
+    for key, value in spec.items():
+        if key in ('MUTED', 'VIP'):
+            if type(value) is not bool:
+                raise ConfigError(f"{where} 的 {key} 必须是布尔值: {value!r}")
+            values[key.lower()] = value
+        elif key == 'GROUP_MENTION_TIMEOUT':
+            values['group_timeout'] = _positive_int(value, key, where)
+        elif key == 'PRIVATE_MESSAGE_TIMEOUT':
+            values['private_timeout'] = _positive_int(value, key, where)
+        elif key == 'MAX_ALERT_COUNT':
+            values['max_alert_count'] = _positive_int(value, key, where)
+        elif key == 'KEYWORDS':
+            if not isinstance(value, list) or not all(isinstance(word, str) for word in value):
+                raise ConfigError(f"{where} 的 KEYWORDS 必须是字符串列表")
+            if value:
+                watchers.append(SensitiveWordMatcher(value).search)
+        elif key == 'REGEX':
+            for pattern in [value] if isinstance(value, str) else value:
+                try:
+                    watchers.append(re.compile(pattern, re.IGNORECASE).search)
+                except (re.error, TypeError) as e:
+                    raise ConfigError(f"{where} 的 REGEX 无法编译: {pattern!r} ({e})") from None
+        elif key == 'QUIET_HOURS':
+            values['quiet_hours'] = _parse_quiet_hours(value, where)
+        else:
+            raise ConfigError(f"{where} 的规则包含未知项: {key}")
+    return Rule(watchers=tuple(watchers), **values)
+
+
+def _index(specs: dict, kind: str) -> Dict[int, Rule]:
+    index = {}
+    for key, spec in specs.items():
+        try:
+            peer_id = int(key)
+        except (TypeError, ValueError):
+            raise ConfigError(f"{kind} 的 key 必须是数字 ID: {key!r}") from None
+        index[peer_id] = compile_rule(spec, f"{kind}[{key}]")
+    return index
+
+
+class RuleEngine:
+    """按 chat_id / sender_id 索引的规则表
+
+    同一条消息同时命中会话规则和发送者规则时，两条规则合并（发送者规则的数值优先），
+    合并结果按 (chat_id, sender_id) 缓存
+    """
+
+    def __init__(self, chat_rules: Optional[dict] = None, sender_rules: Optional[dict] = None,
+                 merged_cache_size: int = 4096):
+        self.by_chat = _index(chat_rules or {}, 'CHAT_RULES')
+        self.by_sender = _index(sender_rules or {}, 'SENDER_RULES')
+        self._merged: Dict[Hashable, Rule] = {}
+        self._merged_cache_size = merged_cache_size
+
+    def __len__(self) -> int:
+        return len(self.by_chat) + len(self.by_sender)
+
+    def resolve(self, chat_id: Optional[int], sender_id: Optional[int] = None) -> Optional[Rule]:
+        """返回适用于该消息的规则，没有规则时返回 None"""
+        chat_rule = self.by_chat.get(chat_id)
+        sender_rule = self.by_sender.get(sender_id) if sender_id is not None else None
+        if sender_rule is None:
+            return chat_rule
+        if chat_rule is None:
+            return sender_rule
+        key = (chat_id, sender_id)
+        merged = self._merged.get(key)
+        if merged is None:
+            if len(self._merged) >= self._merged_cache_size:
+                self._merged.clear()
+            merged = self._merged[key] = chat_rule.merge(sender_rule)
+        return merged
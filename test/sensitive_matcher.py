@@ -0,0 +1,124 @@
+"""
+@name: sensitive_matcher.py
+敏感词多模式匹配（Aho-Corasick 自动机）
+词表在启动时编译一次，每条消息只需扫描一遍即可找出全部命中的敏感词及位置
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple
+
+
+class SensitiveMatch(NamedTuple):
+    """单个敏感词命中结果"""
+    word: str   # 命中的敏感词（词表中的原始写法）
+    start: int  # 在消息中的起始下标
+    end: int    # 在消息中的结束下标（不含）
+
+
+class SensitiveWordMatcher:
+    """基于 Aho-Corasick 自动机的敏感词匹配器，大小写不敏感（按 casefold 比较）"""
+
+    def __init__(self, words: Iterable[str]):
+        """根据词表构建自动机"""
+        # 每个节点: 子节点表、失败指针、以该节点结尾的词（下标）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self.words: List[str] = []
+        self._lengths: List[int] = []
+
+        seen = set()
+        for word in words or ():
+            if not word:
+                continue
+            key = word.casefold()
+            if key in seen:
+                continue
+            seen.add(key)
+            self.words.append(word)
+            self._lengths.append(len(key))
+            self._insert(key, len(self.words) - 1)
+        self._build_fail_links()
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _insert(self, key: str, word_index: int):
+        """向字典树中插入一个词"""
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append(word_index)
+
+    def _build_fail_links(self):
+        """广度优先构建失败指针，并合并输出链"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                # 把失败节点上的词合并进来，匹配时无需再沿失败链回溯
+                self._output[child].extend(self._output[self._fail[child]])
+
+    def find_all(self, text: str) -> List[SensitiveMatch]:
+        """扫描一遍文本，返回所有命中（按出现位置排序），start/end 是原文中的下标"""
+        if not text or not self.words:
+            return []
+        folded = text.casefold()
+        if len(folded) != len(text):
+            # 有字符折叠后变长（如 'ß' -> 'ss'），需要把下标映射回原文
+            return self._find_all_mapped(text)
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        node = 0
+        for i, ch in enumerate(folded):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for word_index in output[node]:
+                start = i + 1 - self._lengths[word_index]
+                matches.append(SensitiveMatch(self.words[word_index], start, i + 1))
+        return matches
+
+    def _find_all_mapped(self, text: str) -> List[SensitiveMatch]:
+        """逐个字符折叠并记录每个折叠后字符对应的原文下标"""
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        origin: List[int] = []
+        node = 0
+        for i, original in enumerate(text):
+            for ch in original.casefold():
+                origin.append(i)
+                while node and ch not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(ch, 0)
+                for word_index in output[node]:
+                    start = origin[len(origin) - self._lengths[word_index]]
+                    matches.append(SensitiveMatch(self.words[word_index], start, i + 1))
+        return matches
+
+    def search(self, text: str) -> bool:
+        """是否包含任意敏感词，命中第一个即返回"""
+        if not text or not self.words:
+            return False
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for ch in text.casefold():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                return True
+        return False
@@ -0,0 +1,315 @@
+"""
+@name: session_store.py
+TelegramClient 的批量写入会话存储
+登录密钥、实体 access_hash 和更新状态保存在内存中，变化的行由后台线程定时在一个事务内批量写入 SQLite；
+表结构与 telethon 默认的 .session 文件相同，已有的会话文件直接沿用，也可以随时切换回默认存储
+"""
+
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from telethon import utils
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession
+from telethon.tl import types
+
+logger = logging.getLogger(__name__)
+
+# 与 telethon SQLiteSession 相同的表结构（telethon 1.36 起为第 8 版，sessions 增加了 tmp_auth_key）
+SESSION_VERSION = 8
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS version (version INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS sessions (
+    dc_id INTEGER PRIMARY KEY,
+    server_address TEXT,
+    port INTEGER,
+    auth_key BLOB,
+    takeout_id INTEGER,
+    tmp_auth_key BLOB
+);
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    hash INTEGER NOT NULL,
+    username TEXT,
+    phone INTEGER,
+    name TEXT,
+    date INTEGER
+);
+CREATE TABLE IF NOT EXISTS sent_files (
+    md5_digest BLOB,
+    file_size INTEGER,
+    type INTEGER,
+    id INTEGER,
+    hash INTEGER,
+    PRIMARY KEY (md5_digest, file_size, type)
+);
+CREATE TABLE IF NOT EXISTS update_state (
+    id INTEGER PRIMARY KEY,
+    pts INTEGER,
+    qts INTEGER,
+    date INTEGER,
+    seq INTEGER
+);
+"""
+
+
+# 旧版本会话文件缺少的列，按 telethon 的升级步骤补上
+_UPGRADES = (
+    ('sessions', 'takeout_id', 'INTEGER'),
+    ('entities', 'date', 'INTEGER'),
+    ('sessions', 'tmp_auth_key', 'BLOB'),
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(_SCHEMA)
+    for table, column, kind in _UPGRADES:
+        if column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+    version = conn.execute('SELECT MAX(version) FROM version').fetchone()[0]
+    if version is None or version < SESSION_VERSION:
+        conn.execute('DELETE FROM version')
+        conn.execute('INSERT INTO version VALUES (?)', (SESSION_VERSION,))
+    return conn
+
+
+class BatchedSession(MemorySession):
+    """内存会话 + 定时批量落盘
+
+    - 实体和更新状态的变化只修改内存并记为脏行，同一行在一个周期内变化多次也只写一次，内容没变的实体不写
+    - 后台线程每 flush_interval 秒把脏行在一个事务内写入（WAL），client 调用 save()（如登录后保存密钥）
+      时立即写入，关闭时写完剩余的行；flush_interval 为 0 时不启动线程，save() 在调用方线程中同步写入
+    - 每次写入都是一个完整的事务，崩溃后文件总是某一次写入后的状态：最多丢失最后一个周期的变化，
+      实体会重新获取，更新状态回退后 telethon 会补拉这段时间的更新
+    - 发送文件的缓存只保存在内存中（告警系统不发送文件）
+    """
+
+    def __init__(self, session_id: str = 'tg_monitor_bot', flush_interval: float = 60.0):
+        super().__init__()
+        self.filename = session_id if session_id.endswith('.session') else f"{session_id}.session"
+        self.flush_interval = flush_interval
+        # 实体按 id 保存，用户名/手机号/名称另建索引，查找不必遍历全部实体
+        self._rows: Dict[int, tuple] = {}
+        self._by_username: Dict[str, int] = {}
+        self._by_phone: Dict[str, int] = {}
+        self._by_name: Dict[str, int] = {}
+        # 待写入的变化，后台线程整体取走
+        self._lock = threading.Lock()
+        self._dirty_rows: Dict[int, tuple] = {}
+        self._dirty_states: Dict[int, tuple] = {}
+        self._dirty_session = False
+        self._wakeup = threading.Event()
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self._load()
+
+    def _load(self):
+        """读取已有的会话文件（telethon 默认存储写的也可以，旧版本的表结构先升级）"""
+        if not os.path.exists(self.filename):
+            return
+        conn = _connect(self.filename)
+        try:
+            row = conn.execute('SELECT dc_id, server_address, port, auth_key, takeout_id FROM sessions').fetchone()
+            if row:
+                self._dc_id, self._server_address, self._port, key, self._takeout_id = row
+                self._auth_key = AuthKey(data=key) if key else None
+            # 按更新时间顺序建索引，用户名被转让时以最新的为准
+            for row in conn.execute('SELECT id, hash, username, phone, name FROM entities ORDER BY date'):
+                self._index(row)
+            for entity_id, pts, qts, date, seq in conn.execute('SELECT id, pts, qts, date, seq FROM update_state'):
+                date = datetime.datetime.fromtimestamp(date, tz=datetime.timezone.utc)
+                self._update_states[entity_id] = types.updates.State(pts, qts, date, seq, unread_count=0)
+        finally:
+            conn.close()
+        logger.info(f"💾 已读取会话 {self.filename}: {len(self._rows)} 个实体")
+
+    # ---- 会话信息 ----
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._session_changed()
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._session_changed()
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self._session_changed()
+
+    def _session_changed(self):
+        with self._lock:
+            self._dirty_session = True
+        self._changed()
+
+    # ---- 更新状态 ----
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        with self._lock:
+            self._dirty_states[entity_id] = (entity_id, state.pts, state.qts, int(state.date.timestamp()), state.seq)
+        self._changed()
+
+    # ---- 实体 ----
+    def process_entities(self, tlo):
+        changed = [row for row in self._entities_to_rows(tlo) if self._rows.get(row[0]) != row]
+        if not changed:
+            return
+        for row in changed:
+            self._index(row)
+        with self._lock:
+            for row in changed:
+                self._dirty_rows[row[0]] = row
+        self._changed()
+
+    def _index(self, row: tuple):
+        entity_id, _, username, phone, name = row
+        old = self._rows.get(entity_id)
+        if old is not None:
+            for index, key in ((self._by_username, old[2]), (self._by_phone, old[3]), (self._by_name, old[4])):
+                if key is not None and index.get(str(key)) == entity_id:
+                    del index[str(key)]
+        self._rows[entity_id] = row
+        for index, key in ((self._by_username, username), (self._by_phone, phone), (self._by_name, name)):
+            if key is not None:
+                index[str(key)] = entity_id
+
+    def _lookup(self, index: Dict[str, int], key):
+        entity_id = index.get(str(key)) if key is not None else None
+        return self._rows[entity_id][:2] if entity_id is not None else None
+
+    def get_entity_rows_by_phone(self, phone):
+        return self._lookup(self._by_phone, phone)
+
+    def get_entity_rows_by_username(self, username):
+        return self._lookup(self._by_username, username)
+
+    def get_entity_rows_by_name(self, name):
+        return self._lookup(self._by_name, name)
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        if exact:
+            row = self._rows.get(id)
+            return row[:2] if row else None
+        for peer_id in (utils.get_peer_id(types.PeerUser(id)), utils.get_peer_id(types.PeerChat(id)),
+                        utils.get_peer_id(types.PeerChannel(id))):
+            row = self._rows.get(peer_id)
+            if row:
+                return row[:2]
+        return None
+
+    # ---- 写入 ----
+    def _changed(self):
+        """有了新的变化：确保后台写线程在运行"""
+        if self._thread is None and self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._writer, name='session-store', daemon=True)
+            self._thread.start()
+
+    def save(self):
+        """立即写入当前的变化"""
+        if self.flush_interval > 0:
+            self._wakeup.set()
+        else:
+            self._flush(self._sync_connection())
+
+    def close(self):
+        """写完剩余的变化并停止后台线程（之后再有变化会重新启动）"""
+        if self._thread:
+            self._closing = True
+            self._wakeup.set()
+            self._thread.join(timeout=10)
+            self._thread = None
+            self._closing = False
+        if self._conn:
+            self._flush(self._conn)
+            self._conn.close()
+            self._conn = None
+
+    def delete(self):
+        """退出登录时删除会话文件"""
+        with self._lock:
+            self._dirty_rows.clear()
+            self._dirty_states.clear()
+            self._dirty_session = False
+        self.close()
+        try:
+            os.remove(self.filename)
+        except OSError:
+            return False
+        for suffix in ('-wal', '-shm'):
+            try:
+                os.remove(self.filename + suffix)
+            except OSError:
+                pass
+        return True
+
+    def _sync_connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.filename)
+        return self._conn
+
+    def _writer(self):
+        conn = _connect(self.filename)
+        try:
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                # 先读关闭标记再写：close() 之前的变化一定在这次写入中
+                closing = self._closing
+                self._flush(conn)
+                if closing:
+                    return
+        except Exception:
+            logger.error("会话写入线程异常退出", exc_info=True)
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection):
+        """取走所有脏行，在一个事务内写入"""
+        with self._lock:
+            rows, self._dirty_rows = self._dirty_rows, {}
+            states, self._dirty_states = self._dirty_states, {}
+            session = self._dirty_session
+            self._dirty_session = False
+        if not (rows or states or session):
+            return
+        now = int(time.time())
+        try:
+            conn.execute('BEGIN')
+            if session:
+                conn.execute('DELETE FROM sessions')
+                # 与 telethon 默认设置一致，临时密钥不落盘
+                conn.execute('INSERT INTO sessions (dc_id, server_address, port, auth_key, takeout_id, tmp_auth_key) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (self._dc_id, self._server_address, self._port,
+                              self._auth_key.key if self._auth_key else b'', self._takeout_id, b''))
+            conn.executemany('INSERT OR REPLACE INTO entities (id, hash, username, phone, name, date) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', [row + (now,) for row in rows.values()])
+            conn.executemany('INSERT OR REPLACE INTO update_state (id, pts, qts, date, seq) VALUES (?, ?, ?, ?, ?)',
+                             states.values())
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # 放回去等下次重试，期间更新过的行以新的为准
+            with self._lock:
+                for entity_id, row in rows.items():
+                    self._dirty_rows.setdefault(entity_id, row)
+                for entity_id, row in states.items():
+                    self._dirty_states.setdefault(entity_id, row)
+                self._dirty_session = self._dirty_session or session
+            logger.error(f"写入会话 {self.filename} 失败，稍后重试", exc_info=True)
+            return
+        self.flushes += 1
+        self.rows_written += len(rows) + len(states) + session
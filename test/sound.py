@@ -1,9 +1,26 @@
-import subprocess
-import time
-import threading
+"""
+@name: sound.py
+节奏提示音
+每段节奏（同一个音效按 beats 中的时间点敲击）预先用 NumPy 混音渲染成一整段 PCM，
+按 (节奏, 重复次数, 重复间隔) 缓存，交给播放引擎一次播完：不再每拍启动一个播放进程，节拍也不受 sleep 抖动影响
+"""
+
+import asyncio
+import functools
+import os
+import tempfile
+import wave
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_cache import AudioAssetCache, convert_to_wav
+from audio_engine import AudioEngine
 
 SOUNDS_DIR = "/System/Library/Sounds/"
 MIN_INTERVAL = 0.05  # 两次触发之间的最小间隔秒数
+SAMPLE_RATE = 44100
+CHANNELS = 2
 # 格式：(音效文件, 播放前等待秒数)
 SEQUENCES = {
     "knock": {
@@ -25,46 +42,121 @@ SEQUENCES = {
 }
 
 
-_lock = threading.Lock()
-
-def play_sequence(name: str = "knock", repeat: int = 1, repeat_interval: float = 0.8):
-    if not _lock.acquire(blocking=False):
-        return  # 上一次还在播，直接跳过
-
-    try:
-        seq = SEQUENCES.get(name)
-        if not seq:
-            print(f"Unknown sequence '{name}', available: {list(SEQUENCES.keys())}")
-            return
-
-        filepath = f"{SOUNDS_DIR}{seq['sound']}.aiff"
-        beats = seq["beats"]
-
-        corrected = [beats[0]]
-        for i in range(1, len(beats)):
-            corrected.append(max(beats[i], corrected[-1] + MIN_INTERVAL))
-
-        for i in range(repeat):
-            if i > 0:
-                time.sleep(repeat_interval)
-
-            start = time.perf_counter()
-            procs = []
-            for offset in corrected:
-                wait = (start + offset) - time.perf_counter()
-                if wait > 0:
-                    time.sleep(wait)
-                p = subprocess.Popen(
-                    ["afplay", filepath],
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-                )
-                procs.append(p)
-            for p in procs:
-                p.wait()
-    finally:
-        _lock.release()
+def corrected_beats(beats: List[float]) -> List[float]:
+    """保证相邻两拍至少间隔 MIN_INTERVAL"""
+    corrected = [beats[0]]
+    for beat in beats[1:]:
+        corrected.append(max(beat, corrected[-1] + MIN_INTERVAL))
+    return corrected
+
+
+def sound_path(name: str) -> str:
+    seq = SEQUENCES.get(name)
+    if not seq:
+        raise KeyError(f"Unknown sequence '{name}', available: {list(SEQUENCES.keys())}")
+    return f"{SOUNDS_DIR}{seq['sound']}.aiff"
+
+
+# ==================== 解码 ====================
+def _read_wav(path: str) -> Tuple[np.ndarray, int]:
+    """读取 16 位 PCM WAV，返回 (frames x channels 的 float32 数组, 采样率)"""
+    with wave.open(path, 'rb') as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"只支持 16 位 PCM: {path}")
+        data = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')
+        return data.reshape(-1, f.getnchannels()).astype(np.float32) / 32768, f.getframerate()
+
+
+def _decode(path: str, cache: Optional[AudioAssetCache] = None) -> Tuple[np.ndarray, int]:
+    """把音频文件解码为 PCM：有解码缓存时直接读取映射好的 PCM，否则 WAV 直接读取、其他格式先转换"""
+    if cache is not None:
+        asset = cache.get(path)
+        data = np.frombuffer(asset.pcm, dtype='<i2').reshape(-1, asset.channels)
+        return data.astype(np.float32) / 32768, asset.rate
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if path.lower().endswith('.wav'):
+        return _read_wav(path)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'decoded.wav')
+        convert_to_wav(path, out)
+        return _read_wav(out)
+
+
+@functools.lru_cache(maxsize=16)
+def load_sample(path: str, cache: Optional[AudioAssetCache] = None) -> np.ndarray:
+    """解码音效并转换为 SAMPLE_RATE、CHANNELS 声道的 float32 数组"""
+    data, rate = _decode(path, cache)
+    if rate != SAMPLE_RATE:
+        # 线性插值重采样，提示音够用
+        src = np.arange(len(data)) / rate
+        dst = np.arange(int(len(data) * SAMPLE_RATE / rate)) / SAMPLE_RATE
+        data = np.stack([np.interp(dst, src, data[:, c]) for c in range(data.shape[1])], axis=1).astype(np.float32)
+    if data.shape[1] != CHANNELS:
+        data = np.repeat(data.mean(axis=1, keepdims=True), CHANNELS, axis=1)
+    data.flags.writeable = False
+    return data
+
+
+# ==================== 渲染 ====================
+@functools.lru_cache(maxsize=32)
+def render_sequence(name: str, repeat: int = 1, repeat_interval: float = 0.8,
+                    cache: Optional[AudioAssetCache] = None) -> np.ndarray:
+    """把一段节奏渲染成 16 位 PCM（frames x CHANNELS），结果按参数缓存且只读
+
+    与逐拍播放时的时序一致：每次重复在上一次最后一拍播完后再等 repeat_interval 秒
+    """
+    sample = load_sample(sound_path(name), cache)
+    beats = np.asarray(corrected_beats(SEQUENCES[name]['beats']))
+    period = beats[-1] + len(sample) / SAMPLE_RATE + repeat_interval
+    offsets = (beats[None, :] + period * np.arange(repeat)[:, None]).ravel()
+    starts = np.round(offsets * SAMPLE_RATE).astype(np.int64)
+
+    mixed = np.zeros((starts[-1] + len(sample), CHANNELS), dtype=np.float32)
+    for start in starts:
+        mixed[start:start + len(sample)] += sample
+    # 重叠的拍子叠加后可能超出范围，整体压低而不是削波
+    peak = np.abs(mixed).max()
+    if peak > 1:
+        mixed /= peak
+    pcm = (mixed * 32767).astype('<i2')
+    pcm.flags.writeable = False
+    return pcm
+
+
+# ==================== 播放 ====================
+_playing: Dict[tuple, asyncio.Future] = {}
+
+
+async def play_sequence(engine: AudioEngine, name: str = "knock", repeat: int = 1, repeat_interval: float = 0.8,
+                        volume: int = 70):
+    """播放一段节奏，播完后返回
+
+    同一段节奏正在播放时不再重复提交，而是等待正在进行的那次播完；
+    不同的节奏由播放引擎依次播放
+    """
+    key = (name, repeat, repeat_interval)
+    playing = _playing.get(key)
+    if playing is None:
+        playing = _playing[key] = asyncio.ensure_future(_play(engine, key, volume))
+        playing.add_done_callback(lambda _: _playing.pop(key, None))
+    await asyncio.shield(playing)
+
+
+async def _play(engine: AudioEngine, key: tuple, volume: int):
+    loop = asyncio.get_running_loop()
+    # 首次渲染需要解码音效文件，放到线程池中
+    pcm = await loop.run_in_executor(None, render_sequence, *key, engine.cache)
+    await asyncio.wrap_future(engine.submit_pcm(pcm, SAMPLE_RATE, volume))
+
 
 if __name__ == "__main__":
-    # 示例：温和提醒，重播 3 次，每次间隔 1 秒
-    play_sequence("phrase", repeat=3, repeat_interval=1.0)
\ No newline at end of file
+    from audio_engine import create_driver
+
+    async def demo():
+        # 示例：温和提醒，重播 3 次，每次间隔 1 秒
+        engine = AudioEngine(create_driver())
+        await play_sequence(engine, "phrase", repeat=3, repeat_interval=1.0)
+        engine.close()
+
+    asyncio.run(demo())
@@ -0,0 +1,192 @@
+"""
+@name: state_store.py
+告警状态持久化（SQLite WAL）
+待触发告警、最近互动时间和播放次数以追加日志的形式写入 SQLite，后台线程批量提交并定期压缩成快照；
+启动时读取快照并重放其后的日志即可恢复状态，不需要再请求 Telegram
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 日志操作类型
+OP_ALERT = 'alert'  # 创建/更新告警（完整记录）
+OP_CLEAR = 'clear'  # 告警结束（触发完毕、取消或清理）
+OP_INTERACTION = 'interaction'  # 最近互动时间
+OP_PLAY = 'play'  # 播放次数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    op TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS snapshot (
+    kind TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, chat_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class PersistedState:
+    """持久化状态的内存副本"""
+
+    def __init__(self):
+        self.alerts: Dict[int, dict] = {}
+        self.interactions: Dict[int, float] = {}
+        self.play_counts: Dict[int, int] = {}
+
+    def apply(self, op: str, chat_id: int, data):
+        """应用一条日志"""
+        if op == OP_ALERT:
+            self.alerts[chat_id] = data
+        elif op == OP_CLEAR:
+            self.alerts.pop(chat_id, None)
+        elif op == OP_INTERACTION:
+            if data is None:
+                self.interactions.pop(chat_id, None)
+            else:
+                self.interactions[chat_id] = data
+        elif op == OP_PLAY:
+            if data is None:
+                self.play_counts.pop(chat_id, None)
+            else:
+                self.play_counts[chat_id] = data
+
+    def rows(self):
+        """以快照表的行形式输出"""
+        for chat_id, data in self.alerts.items():
+            yield OP_ALERT, chat_id, json.dumps(data)
+        for chat_id, ts in self.interactions.items():
+            yield OP_INTERACTION, chat_id, json.dumps(ts)
+        for chat_id, count in self.play_counts.items():
+            yield OP_PLAY, chat_id, json.dumps(count)
+
+
+class StateStore:
+    """追加日志 + 周期压缩的状态存储，所有磁盘写入都在后台线程中完成"""
+
+    def __init__(self, path: str, flush_interval: float = 0.5, compact_every: int = 5000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self._queue: "queue.SimpleQueue[Optional[Tuple[float, str, int, object]]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._state = PersistedState()
+        self._journal_rows = 0
+        self.written = 0
+        self.batches = 0
+        self.compactions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def load(self) -> PersistedState:
+        """读取快照并重放日志，返回恢复的状态，然后启动后台写线程"""
+        started = time.perf_counter()
+        conn = self._connect()
+        state = PersistedState()
+        for kind, chat_id, data in conn.execute('SELECT kind, chat_id, data FROM snapshot'):
+            state.apply(kind, chat_id, json.loads(data))
+        rows = 0
+        for op, chat_id, data in conn.execute('SELECT op, chat_id, data FROM journal ORDER BY seq'):
+            state.apply(op, chat_id, json.loads(data) if data is not None else None)
+            rows += 1
+        self._state = state
+        self._journal_rows = rows
+        logger.info(f"💾 已恢复状态: {len(state.alerts)} 个告警, {len(state.interactions)} 个互动记录, "
+                    f"重放日志 {rows} 条, 耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        self._thread = threading.Thread(target=self._writer, args=(conn,), name='state-store', daemon=True)
+        self._thread.start()
+        # 返回副本，后台线程继续维护自己的那份
+        restored = PersistedState()
+        restored.alerts = dict(state.alerts)
+        restored.interactions = dict(state.interactions)
+        restored.play_counts = dict(state.play_counts)
+        return restored
+
+    def record(self, op: str, chat_id: int, data=None):
+        """追加一条日志（只入队，不阻塞调用方）"""
+        self._queue.put((time.time(), op, chat_id, data))
+
+    def close(self):
+        """写完剩余日志、压缩并关闭"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _writer(self, conn: sqlite3.Connection):
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item] if item is not None else []
+                stop = item is None
+                # 攒一批：等 flush_interval 或者队列取空
+                deadline = time.monotonic() + self.flush_interval
+                while not stop:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                    else:
+                        batch.append(item)
+                if batch:
+                    self._write_batch(conn, batch)
+                if stop or self._journal_rows >= self.compact_every:
+                    self._compact(conn)
+                if stop:
+                    return
+        except Exception:
+            logger.error("状态写入线程异常退出", exc_info=True)
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch):
+        rows = []
+        for ts, op, chat_id, data in batch:
+            self._state.apply(op, chat_id, data)
+            rows.append((ts, op, chat_id, json.dumps(data) if data is not None else None))
+        conn.execute('BEGIN')
+        conn.executemany('INSERT INTO journal (ts, op, chat_id, data) VALUES (?, ?, ?, ?)', rows)
+        conn.execute('COMMIT')
+        self._journal_rows += len(rows)
+        self.written += len(rows)
+        self.batches += 1
+
+    def _compact(self, conn: sqlite3.Connection):
+        """把当前状态写成快照并清空日志（同一事务内完成，中途崩溃不会丢状态）"""
+        if not self._journal_rows:
+            return
+        conn.execute('BEGIN')
+        conn.execute('DELETE FROM snapshot')
+        conn.executemany('INSERT INTO snapshot (kind, chat_id, data) VALUES (?, ?, ?)', self._state.rows())
+        conn.execute('DELETE FROM journal')
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('compacted_at', ?)", (str(time.time()),))
+        conn.execute('COMMIT')
+        self._journal_rows = 0
+        self.compactions += 1
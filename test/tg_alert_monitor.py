@@ -4,20 +4,31 @@ import os
 import time
 import json
 import logging
-import threading
+import logging.handlers
+import queue
 import random
 from datetime import datetime
-from typing import Dict, Optional
-from dataclasses import dataclass
-from collections import defaultdict
-from telethon import TelegramClient, events
-from dotenv import load_dotenv
-import pyautogui
+from typing import Dict, List, Optional
+from dataclasses import asdict, dataclass, fields, replace
+from telethon import TelegramClient, events, utils
+from telethon.tl import types
+from sensitive_matcher import SensitiveWordMatcher
+from alert_scheduler import AlertScheduler
+from entity_cache import EntityCache
+from message_index import MessageIndex
+from audio_cache import AudioAssetCache
+from audio_engine import AudioEngine, create_driver
+from playback_queue import PlaybackQueue, Priority
+from pipeline import Pipeline
+from metrics import Counter, Gauge, Histogram, MetricsServer
+from state_store import OP_ALERT, OP_CLEAR, OP_INTERACTION, OP_PLAY, StateStore
+from bounded_state import AgingMap
+from event_journal import EventJournal
+from message_store import MessageStore
+from config_reloader import ConfigError, ConfigWatcher, read_config_file, validate
+from rule_engine import Rule, RuleEngine
 
 
-# 加载环境变量
-load_dotenv()
-
 # 配置类
 @dataclass
 class Config:
@@ -33,21 +44,149 @@ class Config:
     ALERT_SOUND_INTERVAL: float = 0.5  # 播放提示音的间隔时间
     MUSIC_SOUND_INTERVAL: float = 1.0  # 播放音乐的间隔时间
     SENSITIVE_MUSIC_PATH: str = 'music.mp3'  # 敏感词触发时播放的音乐文件
+    ALERT_SEQUENCE: str = ''  # 告警时播放的节奏（sound.SEQUENCES 中的名称），为空时播放 ALERT_SOUND_PATH
+    AUDIO_DRIVER: str = 'auto'  # 音频驱动: auto / mac / linux / null / file
+    AUDIO_SINK_PATH: str = 'audio_sink.log'  # file 驱动的输出文件
+    AUDIO_CACHE_DIR: str = '.audio_cache'  # 解码后音频（PCM WAV）的缓存目录，空字符串表示每次播放原文件
+    AUDIO_BURST_IDLE: float = 1.0  # 连续播放结束多久后恢复原音量（秒）
+    PLAYBACK_COALESCE_WINDOW: float = 0.3  # 同一音频在此时间内的重复请求合并为一次播放（秒）
+
+    # 实体缓存配置
+    ENTITY_CACHE_SIZE: int = 2048  # 缓存的会话/用户实体上限
+    ENTITY_CACHE_TTL: float = 600.0  # 实体缓存有效期（秒）
+    MESSAGE_INDEX_PER_CHAT: int = 500  # 每个群组保留的最近消息索引条数
+    MESSAGE_INDEX_MAX_CHATS: int = 1000  # 最多建立索引的群组数
+
+    # 消息处理流水线配置
+    PIPELINE_ENABLED: bool = True  # 关闭后在事件回调中直接串行处理
+    PIPELINE_QUEUE_SIZE: int = 1000  # 每个阶段的队列容量
+    PIPELINE_CLASSIFY_WORKERS: int = 1  # 分类阶段 worker 数
+    PIPELINE_ENRICH_WORKERS: int = 4  # 每条通道的实体获取阶段分片数（每个分片一个 worker，同一会话总在同一分片）
+    PIPELINE_DECIDE_WORKERS: int = 1  # 每条通道的告警决策阶段分片数
+
+    # 启动补扫配置
+    CATCH_UP_ENABLED: bool = True  # 启动时补扫离线期间的未读@和未回复私聊
+    CATCH_UP_HORIZON: float = 3600.0  # 只补扫这么多秒以内的消息
+    CATCH_UP_CONCURRENCY: int = 8  # 并发查询数
+    CATCH_UP_MAX_DIALOGS: int = 2000  # 最多遍历的对话数
+    CATCH_UP_MIN_INTERVAL: float = 0.05  # 相邻两次查询的最小间隔（秒）
+
+    # 配置文件热加载
+    CONFIG_FILE: str = ''  # JSON 配置文件，修改后自动重新加载；为空时只使用默认值
+    CONFIG_RELOAD_INTERVAL: float = 2.0  # 检查配置文件是否修改的间隔（秒）
+
+    # 多账号配置
+    ACCOUNTS_FILE: str = ''  # 多账号配置文件（JSON），为空时从环境变量读取单个账号
+
+    # 指标服务配置
+    METRICS_HOST: str = '127.0.0.1'  # 指标服务监听地址
+    METRICS_PORT: int = 9108  # 指标服务端口，0 表示不启动
+
+    # 编辑去重配置
+    EDIT_DEDUP_SIZE: int = 4096  # 记录内容指纹的最近消息数，内容未变化的编辑事件直接丢弃
+
+    # 事件日志配置
+    JOURNAL_DIR: str = 'journal'  # 结构化事件日志（消息、告警决策、触发）目录，空字符串表示不记录
+    JOURNAL_MAX_BYTES: int = 16 * 1024 * 1024  # 单个日志分段的大小上限（字节）
+    JOURNAL_COMPRESS: bool = True  # 写满的分段是否在后台压缩为 gzip
+
+    # 消息全文存储配置
+    MESSAGE_STORE_PATH: str = ''  # 收到的消息正文的全文索引数据库（SQLite FTS5），空字符串表示不保存
+    MESSAGE_STORE_RETENTION: float = 30 * 86400.0  # 消息保留时长（秒）
+    MESSAGE_STORE_MAX_ROWS: int = 5_000_000  # 最多保留的消息条数
+
+    # 会话存储配置
+    SESSION_BACKEND: str = 'sqlite'  # sqlite: telethon 默认存储; batched: 内存会话 + 后台线程批量写入（两者文件格式相同）
+    SESSION_FLUSH_INTERVAL: float = 60.0  # batched 会话把变化写入磁盘的间隔（秒），与 telethon 定期 save() 的间隔相同
+
+    # 状态持久化配置
+    STATE_DB_PATH: str = 'tg_alert_state.db'  # 告警状态日志文件，空字符串表示不持久化
+    STATE_FLUSH_INTERVAL: float = 0.5  # 批量写入间隔（秒）
+    STATE_COMPACT_EVERY: int = 5000  # 日志累计多少条后压缩为快照
+    STATE_PRUNE_INTERVAL: float = 300.0  # 清理过期会话状态的间隔（秒）
+    PLAY_COUNT_RETENTION: float = 86400.0  # 播放次数的保留时长（秒）
+    MAX_TRACKED_CHATS: int = 10000  # 互动时间/播放次数最多跟踪的会话数
 
     # 日志配置
     LOG_FORMAT: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s\n' + '=' * 80
     LOG_DATE_FORMAT: str = '%m-%d %H:%M:%S'
     LOG_ENCODING: str = 'utf-8'
 
+    # 调试数据采集配置（完整的消息/会话/发送者转储）
+    DEBUG_CAPTURE_SAMPLE_RATE: float = 0.0  # 随机采样比例，0 表示不采样
+    DEBUG_CAPTURE_CHAT_IDS: list = None  # 始终采集的会话 ID
+
     # 敏感词列表
     SENSITIVE_WORDS: list = None
 
+    # 按会话/发送者的告警规则: {"chat_id": {"MUTED": false, "VIP": false, "GROUP_MENTION_TIMEOUT": 30,
+    #   "PRIVATE_MESSAGE_TIMEOUT": 60, "MAX_ALERT_COUNT": 3, "KEYWORDS": [...], "REGEX": "...", "QUIET_HOURS": "23:00-07:00"}}
+    CHAT_RULES: dict = None
+    SENDER_RULES: dict = None
+
     def __post_init__(self):
-        self.SENSITIVE_WORDS = ['ZF-DA组', '不定时抽查', '请您配合', '在线状态', '你好', '您好', '代码review', '代码review']
+        if self.SENSITIVE_WORDS is None:
+            self.SENSITIVE_WORDS = ['ZF-DA组', '不定时抽查', '请您配合', '在线状态', '你好', '您好', '代码review', '代码review']
+        if self.DEBUG_CAPTURE_CHAT_IDS is None:
+            self.DEBUG_CAPTURE_CHAT_IDS = []
+        if self.CHAT_RULES is None:
+            self.CHAT_RULES = {}
+        if self.SENDER_RULES is None:
+            self.SENDER_RULES = {}
 
 # 创建全局配置实例
 config = Config()
 
+# 运行中修改即可生效的配置项，其余配置项（队列、数据库、指标端口等）修改后需要重启
+RELOADABLE_FIELDS = frozenset({
+    'GROUP_MENTION_TIMEOUT', 'PRIVATE_MESSAGE_TIMEOUT', 'MAX_ALERT_COUNT', 'ALERT_SOUND_PATH', 'CANCEL_WINDOW',
+    'ALERT_SOUND_INTERVAL', 'MUSIC_SOUND_INTERVAL', 'SENSITIVE_MUSIC_PATH', 'ALERT_SEQUENCE', 'PLAY_COUNT_RETENTION',
+    'STATE_PRUNE_INTERVAL', 'DEBUG_CAPTURE_SAMPLE_RATE', 'DEBUG_CAPTURE_CHAT_IDS', 'SENSITIVE_WORDS', 'CHAT_RULES',
+    'SENDER_RULES',
+})
+
+
+def load_config(path: str) -> Config:
+    """读取配置文件，在默认配置上覆盖文件中给出的配置项"""
+    values = validate(read_config_file(path), Config())
+    values['CONFIG_FILE'] = path
+    return replace(Config(), **values)
+
+
+@dataclass(frozen=True)
+class CompiledConfig:
+    """由 Config 预先编译出的只读结构，热加载时整体替换"""
+    config: Config
+    sensitive_matcher: SensitiveWordMatcher
+    debug_capture_chat_ids: frozenset
+    rules: RuleEngine
+
+
+def compile_config(cfg: Config, overrides: Optional[dict] = None) -> CompiledConfig:
+    """校验配置（叠加账号自己覆盖的 overrides 后）并编译敏感词自动机和会话/发送者规则，不合法时抛出 ConfigError"""
+    if overrides:
+        cfg = replace(cfg, **validate(overrides, cfg))
+    for name in ('GROUP_MENTION_TIMEOUT', 'PRIVATE_MESSAGE_TIMEOUT', 'MAX_ALERT_COUNT'):
+        if getattr(cfg, name) <= 0:
+            raise ConfigError(f"{name} 必须大于 0")
+    if not 0 <= cfg.DEBUG_CAPTURE_SAMPLE_RATE <= 1:
+        raise ConfigError("DEBUG_CAPTURE_SAMPLE_RATE 必须在 0 到 1 之间")
+    if cfg.ALERT_SEQUENCE:
+        from sound import SEQUENCES
+        if cfg.ALERT_SEQUENCE not in SEQUENCES:
+            raise ConfigError(f"未知的 ALERT_SEQUENCE: {cfg.ALERT_SEQUENCE}，可选: {', '.join(SEQUENCES)}")
+    if cfg.SESSION_BACKEND not in ('batched', 'sqlite'):
+        raise ConfigError(f"未知的 SESSION_BACKEND: {cfg.SESSION_BACKEND}")
+    if not all(isinstance(word, str) for word in cfg.SENSITIVE_WORDS):
+        raise ConfigError("SENSITIVE_WORDS 只能包含字符串")
+
+    return CompiledConfig(
+        config=cfg,
+        sensitive_matcher=SensitiveWordMatcher(cfg.SENSITIVE_WORDS),
+        debug_capture_chat_ids=frozenset(cfg.DEBUG_CAPTURE_CHAT_IDS),
+        rules=RuleEngine(cfg.CHAT_RULES, cfg.SENDER_RULES),
+    )
+
 
 
 # 日志管理类
@@ -63,15 +202,76 @@ class LogManager:
         )
         return logging.getLogger(__name__)
 
+    _debug_listener = None
+
+    @staticmethod
+    def setup_debug_capture():
+        """创建调试转储日志器，记录经队列交给后台线程格式化输出"""
+        debug_logger = logging.getLogger(f"{__name__}.debug")
+        debug_logger.setLevel(logging.DEBUG)
+        debug_logger.propagate = False
+        if not debug_logger.handlers:
+            records = queue.SimpleQueue()
+            output = logging.StreamHandler()
+            output.setFormatter(logging.Formatter(config.LOG_FORMAT, config.LOG_DATE_FORMAT))
+            debug_logger.addHandler(_DeferredQueueHandler(records))
+            LogManager._debug_listener = logging.handlers.QueueListener(records, output)
+            LogManager._debug_listener.start()
+        return debug_logger
+
+    @staticmethod
+    def shutdown():
+        """停止后台日志线程，并输出队列中剩余的记录"""
+        if LogManager._debug_listener:
+            LogManager._debug_listener.stop()
+            LogManager._debug_listener = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """不在调用线程格式化记录的 QueueHandler，序列化留给后台线程"""
+    def prepare(self, record):
+        return record
+
+
+class _LazyDump:
+    """对象 __dict__ 的惰性 JSON 转储，只在日志真正被格式化时才序列化"""
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return json.dumps(getattr(self.obj, '__dict__', self.obj), default=str, ensure_ascii=False)
+
+
 logger = LogManager.setup()
+debug_logger = LogManager.setup_debug_capture()
+
+
+# 监控指标
+MESSAGES_TOTAL = Counter('tg_alert_messages_total', '处理的消息数（group/private/edited/self/filtered）', ['type'])
+MENTIONS_TOTAL = Counter('tg_alert_mentions_total', '群组中@我们的消息数')
+SENSITIVE_HITS_TOTAL = Counter('tg_alert_sensitive_hits_total', '命中敏感词的私聊消息数')
+PENDING_ALERTS = Gauge('tg_alert_pending_alerts', '当前待触发的告警数')
+ALERTS_FIRED_TOTAL = Counter('tg_alert_alerts_fired_total', '触发的告警次数', ['chat_type'])
+ALERTS_RETIRED_TOTAL = Counter('tg_alert_alerts_retired_total', '因已读或自己发言而提前结束的告警数', ['reason'])
+ALERT_FIRE_DELAY = Histogram('tg_alert_fire_delay_seconds', '告警实际触发时间相对截止时间的延迟')
+SOUND_PLAY_SECONDS = Histogram('tg_alert_sound_play_seconds', '单次播放请求的耗时',
+                               buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+PLAYBACK_QUEUE_DEPTH = Gauge('tg_alert_playback_queue_depth', '播放队列中等待的请求数')
+PLAYBACK_LATENCY = Histogram('tg_alert_playback_latency_seconds', '播放请求从入队到开始播放的等待时间',
+                             buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+ENTITY_FETCH_SECONDS = Histogram('tg_alert_entity_fetch_seconds', '获取会话/发送者实体的耗时（含缓存命中）', ['kind'])
+ENTITY_CACHE_LOOKUPS = Counter('tg_alert_entity_cache_lookups_total', '实体缓存查询次数', ['result'])
+EDITS_SKIPPED_TOTAL = Counter('tg_alert_edits_skipped_total', '内容未变化而跳过的编辑事件数')
+PIPELINE_PROCESSED = Counter('tg_alert_pipeline_processed_total', '流水线各阶段处理的条目数', ['account', 'stage'])
+PIPELINE_DROPPED = Counter('tg_alert_pipeline_dropped_total', '流水线各阶段因队列满丢弃的条目数', ['account', 'stage'])
+PIPELINE_DEPTH = Gauge('tg_alert_pipeline_queue_depth', '流水线各阶段的队列长度', ['account', 'stage'])
 
 # # 防止远程桌面超时的活动模拟器
 # class ActivitySimulator:
 #     """模拟用户活动，防止远程桌面认为进程不活跃而自动结束进程"""
     
-#     # 禁用pyautogui的安全保护（快速移动到屏幕角落不会触发)
-#     pyautogui.FAILSAFE = False
-    
 #     def __init__(self, interval_minutes: int = 10):
 #         """
 #         初始化活动模拟器
@@ -82,7 +282,16 @@ logger = LogManager.setup()
 #         self.thread = None
     
 #     def start(self):
-#         """启动活动模拟线程"""
+#         """启动活动模拟线程（pyautogui 导入很慢，只在这里导入；没有图形界面的 Linux 上直接跳过）"""
+#         import sys
+#         import threading
+#         if sys.platform.startswith('linux') and not (os.getenv('DISPLAY') or os.getenv('WAYLAND_DISPLAY')):
+#             logger.info("没有图形界面，不启动防超时活动模拟器")
+#             return
+#         global pyautogui
+#         import pyautogui
+#         # 禁用pyautogui的安全保护（快速移动到屏幕角落不会触发)
+#         pyautogui.FAILSAFE = False
 #         if not self.running:
 #             self.running = True
 #             self.thread = threading.Thread(target=self._simulate_activity_loop, daemon=True)
@@ -143,53 +352,95 @@ logger = LogManager.setup()
 
 # 声音管理类
 class SoundManager:
-    """声音管理类，处理所有声音相关操作"""
+    """声音管理类，处理所有声音相关操作，实际播放交给常驻的 AudioEngine"""
+    _engine: Optional[AudioEngine] = None
+    _queue: Optional[PlaybackQueue] = None
+    # 播放队列中节奏请求的 key 前缀，后接 sound.SEQUENCES 中的名称
+    SEQUENCE_PREFIX = 'sequence:'
+
+    @staticmethod
+    def engine() -> AudioEngine:
+        """获取（首次调用时创建）播放引擎"""
+        if SoundManager._engine is None:
+            driver = create_driver(config.AUDIO_DRIVER, config.AUDIO_SINK_PATH)
+            cache = AudioAssetCache(config.AUDIO_CACHE_DIR) if config.AUDIO_CACHE_DIR else None
+            SoundManager._engine = AudioEngine(driver, config.AUDIO_BURST_IDLE, cache)
+        return SoundManager._engine
+
+    @staticmethod
+    def queue() -> PlaybackQueue:
+        """获取（首次调用时创建）播放队列，所有异步播放都经过它"""
+        if SoundManager._queue is None:
+            SoundManager._queue = PlaybackQueue(SoundManager._timed_submit, config.PLAYBACK_COALESCE_WINDOW,
+                                                on_start=PLAYBACK_LATENCY.observe)
+            PLAYBACK_QUEUE_DEPTH.set_function(lambda: SoundManager._queue.depth if SoundManager._queue else 0)
+        return SoundManager._queue
+
+    @staticmethod
+    def _timed_submit(path: str, volume: int, count: int, interval: float):
+        """提交给播放引擎，并在播放结束时记录耗时；节奏请求先渲染成 PCM 再提交"""
+        started = time.perf_counter()
+        if path.startswith(SoundManager.SEQUENCE_PREFIX):
+            name = path[len(SoundManager.SEQUENCE_PREFIX):]
+            future = asyncio.ensure_future(SoundManager._play_sequence(name, volume, count, interval))
+        else:
+            future = SoundManager.engine().submit(path, volume, count, interval)
+        future.add_done_callback(lambda _: SOUND_PLAY_SECONDS.observe(time.perf_counter() - started))
+        return future
+
+    @staticmethod
+    async def _play_sequence(name: str, volume: int, repeat: int, interval: float):
+        # 用到时才导入（需要 NumPy）
+        import sound
+        await sound.play_sequence(SoundManager.engine(), name, repeat, interval, volume)
+
+    @staticmethod
+    def preload():
+        """预加载告警音和敏感词音乐"""
+        SoundManager.engine().preload(config.ALERT_SOUND_PATH, config.SENSITIVE_MUSIC_PATH)
+
     @staticmethod
-    async def play_alert_sound_async(target_volume: int = 60, count: int = 1):
-        """异步播放提示音"""
-        await asyncio.to_thread(SoundManager._play_alert_sound, target_volume, count)
+    async def close_queue():
+        """停止播放队列"""
+        if SoundManager._queue is not None:
+            await SoundManager._queue.close()
+            SoundManager._queue = None
 
     @staticmethod
-    def _play_alert_sound(target_volume: int = 70, count: int = 1):
-        """同步播放提示音"""
-        original_volume = None
+    def shutdown():
+        """关闭播放引擎"""
+        if SoundManager._engine is not None:
+            SoundManager._engine.close()
+            SoundManager._engine = None
+
+    @staticmethod
+    async def play_alert_sound_async(target_volume: int = 60, count: int = 1, priority: Priority = Priority.GROUP):
+        """异步播放提示音（经播放队列，与同时到期的其他提示音合并）"""
         try:
-            original_volume = int(os.popen('osascript -e "output volume of (get volume settings)"').read())
-            os.system(f'osascript -e "set volume output volume {target_volume}"')
-            for i in range(count):
-                os.system(f'afplay {config.ALERT_SOUND_PATH}')
-                if i < count - 1:
-                    time.sleep(config.ALERT_SOUND_INTERVAL)
+            await SoundManager.queue().play(config.ALERT_SOUND_PATH, priority, target_volume, count, config.ALERT_SOUND_INTERVAL)
             logger.info(f"🔔 播放提示音 {count} 次")
         except Exception as e:
             logger.info(f"❌ 播放提示音失败: {e}")
-        finally:
-            if original_volume is not None:
-                try:
-                    os.system(f'osascript -e "set volume output volume {original_volume}"')
-                except Exception:
-                    logger.debug("恢复音量失败", exc_info=True)
 
     @staticmethod
-    def play_sound(file_path: str, target_volume: int = 70, count: int = 1):
-        """播放音频文件并控制音量"""
-        original_volume = None
+    async def play_sequence_async(name: str, target_volume: int = 60, repeat: int = 1,
+                                  priority: Priority = Priority.GROUP):
+        """播放 sound.SEQUENCES 中的节奏（经播放队列）：整段预先渲染成 PCM，由播放引擎一次播完"""
         try:
-            original_volume = int(os.popen('osascript -e "output volume of (get volume settings)"').read())
-            os.system(f'osascript -e "set volume output volume {target_volume}"')
-            for i in range(count):
-                os.system(f'afplay {file_path}')
-                if i < count - 1:
-                    time.sleep(config.MUSIC_SOUND_INTERVAL)
-            logger.info(f"🔔 播放音频 {file_path} {count} 次")
+            await SoundManager.queue().play(f"{SoundManager.SEQUENCE_PREFIX}{name}", priority, target_volume, repeat,
+                                            config.ALERT_SOUND_INTERVAL)
+            logger.info(f"🔔 播放节奏 {name} {repeat} 次")
         except Exception as e:
-            logger.info(f"❌ 播放音频失败: {e}")
-        finally:
-            if original_volume is not None:
-                os.system(f'osascript -e "set volume output volume {original_volume}"')
+            logger.info(f"❌ 播放节奏 {name} 失败: {e}")
+
+    @staticmethod
+    def play_sound_nowait(file_path: str, priority: Priority, target_volume: int = 70, count: int = 1) -> asyncio.Future:
+        """把音频加入播放队列后立即返回，不阻塞事件循环"""
+        logger.info(f"🔔 排队播放音频 {file_path} {count} 次")
+        return SoundManager.queue().enqueue(file_path, priority, target_volume, count, config.MUSIC_SOUND_INTERVAL)
 
 # 告警记录类
-@dataclass
+@dataclass(slots=True)
 class AlertRecord:
     """告警记录类，存储单个告警的相关信息"""
     message_id: int
@@ -197,27 +448,208 @@ class AlertRecord:
     is_private: bool
     alert_count: int = 0
     is_cancelled: bool = False
-    task: Optional[asyncio.Task] = None
     timeout_interval: int = config.GROUP_MENTION_TIMEOUT
+    max_alert_count: int = config.MAX_ALERT_COUNT
+
+class SharedResources:
+    """同一进程内所有账号共享的资源：告警调度器、实体缓存、事件日志、指标服务和配置文件监视（播放队列由 SoundManager 全局共享）"""
+
+    def __init__(self):
+        self.scheduler = AlertScheduler()
+        self.entity_cache = EntityCache(config.ENTITY_CACHE_SIZE, config.ENTITY_CACHE_TTL)
+        # 启动前记录的事件先在队列中等待
+        self.journal = EventJournal(config.JOURNAL_DIR, config.JOURNAL_MAX_BYTES,
+                                    config.JOURNAL_COMPRESS) if config.JOURNAL_DIR else None
+        self.message_store = MessageStore(config.MESSAGE_STORE_PATH, config.MESSAGE_STORE_RETENTION,
+                                          config.MESSAGE_STORE_MAX_ROWS) if config.MESSAGE_STORE_PATH else None
+        self.metrics_server: Optional[MetricsServer] = None
+        self.config_watcher: Optional[ConfigWatcher] = None
+        self._started = False
+
+    async def start(self):
+        """启动指标服务和配置文件监视"""
+        # 多个账号都会调用，只有第一个真正启动
+        if self._started:
+            return
+        self._started = True
+        if self.journal:
+            self.journal.start()
+        if self.message_store:
+            self.message_store.start()
+        if config.METRICS_PORT:
+            self.metrics_server = MetricsServer(config.METRICS_HOST, config.METRICS_PORT)
+            await self.metrics_server.start()
+        if config.CONFIG_FILE:
+            self.config_watcher = ConfigWatcher(config.CONFIG_FILE, self._compile_reload, self._apply_reload,
+                                                config.CONFIG_RELOAD_INTERVAL)
+            await self.config_watcher.start()
+
+    async def close(self):
+        """停止调度器、指标服务和配置文件监视，写完事件日志"""
+        self.scheduler.close()
+        if self.journal:
+            self.journal.close()
+        if self.message_store:
+            self.message_store.close()
+        if self.config_watcher:
+            await self.config_watcher.stop()
+            self.config_watcher = None
+        if self.metrics_server:
+            await self.metrics_server.stop()
+            self.metrics_server = None
+        self._started = False
+
+    def _compile_reload(self, data: dict):
+        """在线程池中执行：校验新的配置文件，并为共用本资源的每个账号编译新配置"""
+        base = replace(Config(), **validate(data, Config()))
+        compiled = []
+        for system in TelegramAlertSystem.instances:
+            if system.shared is not self:
+                continue
+            current = system.config
+            try:
+                candidate = compile_config(base, system.account_overrides).config
+            except ConfigError as e:
+                raise ConfigError(f"账号 {system.name} 的配置不合法: {e}") from e
+            restart_needed = [f.name for f in fields(Config) if f.name not in RELOADABLE_FIELDS
+                              and f.name != 'CONFIG_FILE' and getattr(candidate, f.name) != getattr(current, f.name)]
+            if restart_needed:
+                logger.warning(f"⚠️ 账号 {system.name} 的配置项 {', '.join(restart_needed)} 需要重启才能生效")
+            updated = replace(current, **{name: getattr(candidate, name) for name in RELOADABLE_FIELDS})
+            compiled.append((system, compile_config(updated)))
+        return base, compiled
+
+    def _apply_reload(self, result):
+        """在事件循环中执行：一次性替换所有账号的配置，进行中的告警沿用创建时的超时"""
+        global config
+        base, compiled = result
+        config = replace(config, **{name: getattr(base, name) for name in RELOADABLE_FIELDS})
+        for system, snapshot in compiled:
+            system.apply_config(snapshot)
+        logger.info(f"🔄 已重新加载配置 {config.CONFIG_FILE}: {len(config.SENSITIVE_WORDS)} 个敏感词, "
+                    f"{len(config.CHAT_RULES)} 条会话规则, {len(config.SENDER_RULES)} 条发送者规则")
+
 
 class TelegramAlertSystem:
     """Telegram 告警系统主类"""
+
+    # 当前进程中的所有账号实例，用于汇总指标
+    instances: List["TelegramAlertSystem"] = []
     
-    def __init__(self, api_id: int, api_hash: str, phone: str):
-        """初始化告警系统"""
-        self.client = TelegramClient('tg_monitor_bot', api_id, api_hash, device_model='iPhone X', system_version='iOS 16.7.11', app_version='')                                     
+    def __init__(self, api_id: int, api_hash: str, phone: str, client=None, session: str = 'tg_monitor_bot',
+                 account_config: Optional[Config] = None, shared: Optional[SharedResources] = None,
+                 name: str = 'default'):
+        """初始化告警系统
+
+        client 可传入替代的客户端（如离线回放用的 FakeClient）；多账号运行时每个账号有自己的
+        session 和 account_config，并共用同一个 shared
+        """
+        self.name = name
+        self.config = account_config or config
+        # 账号自己覆盖的配置项，热加载时叠加在新的全局配置上
+        self.account_overrides: dict = {}
+        self.client = client or TelegramClient(self._open_session(session), api_id, api_hash, device_model='iPhone X', system_version='iOS 16.7.11', app_version='')                                     
+        # 未传入共享资源时自己持有一份，退出时负责关闭
+        self._owns_shared = shared is None
+        self.shared = shared or SharedResources()
         self.my_id = None
         self.my_username = None
+        self._mention_handle: Optional[str] = None  # "@用户名"，登录后计算一次
         self.pending_alerts: Dict[int, AlertRecord] = {}
-        self.last_interactions: Dict[int, float] = {}
-        self.play_counts: Dict[int, int] = defaultdict(int)
-
-    def _log_debug_info(self, event, chat, sender, message_text):
-        """记录调试信息"""
-        logging.info(f"event消息: \n{json.dumps(event.message.__dict__, default=str, ensure_ascii=False)}")
-        logging.info(f"chat消息: \n{json.dumps(chat.__dict__, default=str, ensure_ascii=False)}")
-        logging.info(f"sender消息: \n{json.dumps(sender.__dict__, default=str, ensure_ascii=False)}")
-        logging.info(f"收到新消息: {message_text}")
+        # 互动时间只在 CANCEL_WINDOW 内有意义，播放次数保留 PLAY_COUNT_RETENTION，超期后定期清理；
+        # 超出容量被淘汰的会话同样从状态日志中删除
+        self.last_interactions: AgingMap = AgingMap(maxsize=self.config.MAX_TRACKED_CHATS,
+                                                    on_evict=lambda chat_id: self._journal(OP_INTERACTION, chat_id))
+        self.play_counts: AgingMap = AgingMap(int, maxsize=self.config.MAX_TRACKED_CHATS,
+                                              on_evict=lambda chat_id: self._journal(OP_PLAY, chat_id))
+        # 敏感词自动机和会话规则预先编译，配置热加载时由 apply_config 整体替换
+        self.apply_config(compile_config(self.config))
+        # 所有告警的截止时间由同一个调度器管理，key 为 (账号名, chat_id)
+        self.scheduler = self.shared.scheduler
+        # 会话和发送者实体按 (账号名, peer id) 缓存，避免每条消息都请求一次
+        self.entity_cache = self.shared.entity_cache
+        # 最近消息的内容指纹 (chat_id, msg_id) -> hash，用于识别内容没有变化的编辑事件
+        self.content_hashes: AgingMap = AgingMap(maxsize=self.config.EDIT_DEDUP_SIZE)
+        self.edits_skipped = 0
+        self.alerts_created = 0
+        self.alerts_retired = 0
+        # 群组近期消息索引，用于在本地判断回复的是否是@消息
+        self.message_index = MessageIndex(self.config.MESSAGE_INDEX_PER_CHAT, self.config.MESSAGE_INDEX_MAX_CHATS)
+        self.pipeline = self._build_pipeline()
+        self._catch_up_task: Optional[asyncio.Task] = None
+        self._register_metrics()
+        # 告警状态日志，写入在后台线程批量完成
+        self.state_store = StateStore(self.config.STATE_DB_PATH, self.config.STATE_FLUSH_INTERVAL,
+                                      self.config.STATE_COMPACT_EVERY) if self.config.STATE_DB_PATH else None
+
+    def _open_session(self, session: str):
+        """按 SESSION_BACKEND 创建 client 的会话存储"""
+        if self.config.SESSION_BACKEND == 'sqlite':
+            return session
+        # 只在创建真正的客户端时导入
+        from session_store import BatchedSession
+        return BatchedSession(session, self.config.SESSION_FLUSH_INTERVAL)
+
+    def apply_config(self, compiled: CompiledConfig):
+        """切换到新编译的配置（同步执行，中间没有 await，消息处理不会看到一半新一半旧的配置）"""
+        self.compiled = compiled
+        self.config = compiled.config
+        self.sensitive_matcher = compiled.sensitive_matcher
+        self.debug_capture_chat_ids = compiled.debug_capture_chat_ids
+
+    def _set_identity(self, me):
+        """记录登录账号的 ID 和用户名"""
+        self.my_id = me.id
+        self.my_username = me.username
+        self._mention_handle = f"@{me.username}" if me.username else None
+
+    def _register_metrics(self):
+        """把运行状态挂到指标上，取值发生在抓取时"""
+        TelegramAlertSystem.instances.append(self)
+        PENDING_ALERTS.set_function(lambda: sum(len(s.pending_alerts) for s in TelegramAlertSystem.instances))
+        ENTITY_CACHE_LOOKUPS.labels(result='hit').set_function(lambda: self.entity_cache.hits)
+        ENTITY_CACHE_LOOKUPS.labels(result='miss').set_function(lambda: self.entity_cache.misses)
+        for name, stage in self.pipeline.stages.items():
+            PIPELINE_PROCESSED.labels(account=self.name, stage=name).set_function(lambda st=stage: st.stats.processed)
+            PIPELINE_DROPPED.labels(account=self.name, stage=name).set_function(lambda st=stage: st.stats.dropped)
+            PIPELINE_DEPTH.labels(account=self.name, stage=name).set_function(lambda st=stage: st.depth)
+
+    def _build_pipeline(self) -> Pipeline:
+        """构建流水线：分类 -> 实体获取 -> 告警决策
+
+        私聊和群组在分类后走各自的通道；私聊通道满时向上游施加背压，
+        群组通道满时丢弃只因规则进入的消息，群组消息洪峰不会拖慢私聊告警；
+        @我们的消息和我们自己发的消息不丢弃，通道满时同样等待；
+        实体获取和决策阶段按 chat_id 分片，同一会话的消息按到达顺序做决策（对方的消息不会排到我们的回复之后）
+        """
+        pipeline = Pipeline()
+        size = self.config.PIPELINE_QUEUE_SIZE
+        pipeline.add_stage('classify', self._classify_stage, self.config.PIPELINE_CLASSIFY_WORKERS, size)
+        for lane in ('private', 'group'):
+            drop = lane == 'group'
+            pipeline.add_sharded_stage(f'enrich_{lane}', self._enrich_stage, lambda event: event.chat_id,
+                                       self.config.PIPELINE_ENRICH_WORKERS, size, drop)
+        for lane in ('private', 'group'):
+            drop = lane == 'group'
+            pipeline.add_sharded_stage(f'decide_{lane}', self._decide_stage, lambda item: item[0].chat_id,
+                                       self.config.PIPELINE_DECIDE_WORKERS, size, drop)
+        return pipeline
+
+    def _should_capture_debug(self, chat_id: int) -> bool:
+        """判断本条消息是否需要采集调试数据：DEBUG 级别、指定会话或命中采样"""
+        if logger.isEnabledFor(logging.DEBUG) or chat_id in self.debug_capture_chat_ids:
+            return True
+        rate = self.config.DEBUG_CAPTURE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def _log_debug_info(self, event, chat, sender, message_text, chat_id):
+        """记录调试信息，JSON 序列化在后台日志线程中进行"""
+        if not self._should_capture_debug(chat_id):
+            return
+        debug_logger.debug("event消息: \n%s", _LazyDump(event.message))
+        debug_logger.debug("chat消息: \n%s", _LazyDump(chat))
+        debug_logger.debug("sender消息: \n%s", _LazyDump(sender))
+        debug_logger.debug("收到新消息: %s", message_text)
         
     def _get_sender_info(self, sender):
         """获取发送者信息"""
@@ -227,58 +659,210 @@ class TelegramAlertSystem:
         return f"{first_name if first_name else last_name}(@{username})"
 
     async def _handle_message(self, event) -> None:
-        """处理新消息"""
-        # 获取消息相关信息
-        chat = await event.get_chat()
-        sender = await event.get_sender()
+        """处理新消息（不经过流水线，依次完成分类、实体获取和告警决策）"""
+        if self._classify(event) is None:
+            return
+        chat, sender = await self._enrich(event)
+        await self._decide(event, chat, sender)
+
+    def _classify(self, event) -> Optional[str]:
+        """只用事件自带字段做分类（不发网络请求、不 await），返回处理通道名，不需要处理时返回 None"""
+        if event.is_private:
+            lane = 'private'
+        elif event.is_group:
+            if not self._is_group_candidate(event):
+                # 与我们无关的群聊消息只记入索引（供之后判断回复对象）和消息存储，不获取实体
+                self.message_index.add(event.chat_id, event.id, False, event.sender_id)
+                self._store_message(event)
+                MESSAGES_TOTAL.labels(type='filtered').inc()
+                return None
+            lane = 'group'
+        else:
+            logger.debug("非群聊或私聊消息，忽略处理")
+            return None
+        if not self._content_changed(event) and getattr(event, 'is_edit', False):
+            # 链接预览、表情回应等不改变内容的编辑，不再获取实体和重新决策
+            self.edits_skipped += 1
+            EDITS_SKIPPED_TOTAL.inc()
+            return None
+        self._store_message(event)
+        return lane
+
+    def _store_message(self, event):
+        """把消息正文交给全文存储（未启用时忽略）"""
+        store = self.shared.message_store
+        message = event.message
+        if store is None or message is None or not message.message:
+            return
+        date = getattr(message, 'date', None)
+        store.add(self.name, utils.resolve_id(event.chat_id)[0], event.id, event.sender_id, message.message,
+                  date.timestamp() if date else None)
+
+    def _is_group_candidate(self, event) -> bool:
+        """群聊消息是否可能需要处理：自己发的、@了我们的、会话/发送者有规则，或者会话在调试采集名单中"""
+        message = event.message
+        if message is None:
+            return False
+        if message.out or event.sender_id == self.my_id or self._is_mention(message):
+            return True
+        rules = self.compiled.rules
+        if not rules and not self.debug_capture_chat_ids:
+            return False
+        # 规则和采集名单按实体 ID 配置，event.chat_id 是带类型前缀的 ID
+        chat_id = utils.resolve_id(event.chat_id)[0]
+        if chat_id in self.debug_capture_chat_ids:
+            return True
+        return bool(rules) and rules.resolve(chat_id, event.sender_id) is not None
+
+    def _content_changed(self, event) -> bool:
+        """记录消息中影响告警决策的字段的指纹，返回与上次收到时相比是否变化（首次收到视为变化）"""
+        message = event.message
+        if message is None:
+            return True
+        fingerprint = hash((message.message, message.mentioned, message.reply_to_msg_id))
+        key = (event.chat_id, event.id)
+        if self.content_hashes.get(key) == fingerprint:
+            return False
+        self.content_hashes[key] = fingerprint
+        return True
+
+    def _peer_key(self, peer_id: Optional[int]):
+        """共享实体缓存的 key，不同账号看到的同一实体 access_hash 不同，需要分开缓存"""
+        return (self.name, peer_id) if peer_id is not None else None
+
+    async def _enrich(self, event):
+        """获取会话和发送者实体"""
+        started = time.perf_counter()
+        chat = await self.entity_cache.get_or_fetch(self._peer_key(event.chat_id), event.get_chat)
+        fetched = time.perf_counter()
+        sender = await self.entity_cache.get_or_fetch(self._peer_key(event.sender_id), event.get_sender)
+        ENTITY_FETCH_SECONDS.labels(kind='chat').observe(fetched - started)
+        ENTITY_FETCH_SECONDS.labels(kind='sender').observe(time.perf_counter() - fetched)
+        return chat, sender
+
+    async def _decide(self, event, chat, sender) -> None:
+        """根据消息内容和会话状态决定是否创建告警"""
         message_text = event.message.message if event.message else ""
         chat_id = chat.id
         event_id = event.id
         
         # 记录调试信息
-        self._log_debug_info(event, chat, sender, message_text)
+        self._log_debug_info(event, chat, sender, message_text, chat_id)
         
+        if event.message is not None and event.message.out and not getattr(event, 'is_edit', False):
+            # 我们自己发了新消息（包括在其他设备上），该会话的提醒立即结束，不必等到期再判断；
+            # 编辑旧消息（包括表情回应、链接预览）不算。在决策阶段处理，才能排在同一会话更早的消息之后
+            self._retire_alert(chat_id, 'outgoing')
+
         # 如果是自己发的消息，更新互动时间并返回
         if sender.id == self.my_id:
-            self.last_interactions[chat_id] = time.time()
+            MESSAGES_TOTAL.labels(type='self').inc()
+            self._event('message', chat_id, msg_id=event_id, sender_id=sender.id, type='self')
+            self._mark_interaction(chat_id)
+            if event.is_group:
+                self.message_index.add(event.chat_id, event_id, False, sender.id)
+            return
+
+        if getattr(event, 'is_edit', False):
+            message_type = 'edited'
+        else:
+            message_type = 'group' if event.is_group else 'private'
+        MESSAGES_TOTAL.labels(type=message_type).inc()
+        self._event('message', chat_id, msg_id=event_id, sender_id=sender.id, type=message_type)
+
+        # 两次字典查找取到适用的规则，没有规则时为 None，走默认逻辑
+        rule = self.compiled.rules.resolve(chat_id, sender.id)
+        if rule is not None and rule.muted:
+            logger.debug(f"chat {chat_id} / sender {sender.id} 已设置静音，忽略消息")
             return
 
         # 处理群组消息
         if event.is_group:
-            await self._handle_group_message(event, chat, sender, message_text, chat_id, event_id)
+            await self._handle_group_message(event, chat, sender, message_text, chat_id, event_id, rule)
         # 处理私聊消息
-        elif event.is_private:
-            await self._handle_private_message(event, chat, sender, message_text, chat_id, event_id)
         else:
-            logging.info("非群聊或私聊消息，忽略处理")
+            await self._handle_private_message(event, chat, sender, message_text, chat_id, event_id, rule)
 
-    async def _handle_group_message(self, event, chat, sender, message_text, chat_id, event_id):
+    async def _classify_stage(self, event):
+        """流水线分类阶段"""
+        lane = self._classify(event)
+        if lane is not None:
+            await self.pipeline[f'enrich_{lane}'].put(event, self._is_essential(event))
+
+    async def _enrich_stage(self, event):
+        """流水线实体获取阶段"""
+        chat, sender = await self._enrich(event)
+        lane = 'private' if event.is_private else 'group'
+        await self.pipeline[f'decide_{lane}'].put((event, chat, sender), self._is_essential(event))
+
+    def _is_essential(self, event) -> bool:
+        """群组通道满时也不能丢弃的消息：@了我们的，或者我们自己发的（影响取消窗口）"""
+        message = event.message
+        return message is not None and (message.out or event.sender_id == self.my_id or self._is_mention(message))
+
+    async def _decide_stage(self, item):
+        """流水线告警决策阶段"""
+        await self._decide(*item)
+
+    async def _handle_group_message(self, event, chat, sender, message_text, chat_id, event_id,
+                                    rule: Optional[Rule] = None):
         """处理群组消息"""
         # 检查是否是@消息或者提到了我们
-        is_mention = event.mentioned or (message_text and f"@{self.my_username}" in message_text)
-        
-        # 对于@消息，我们需要特殊处理
+        is_mention = self._is_mention(event.message)
+        self.message_index.add(event.chat_id, event_id, is_mention, sender.id)
         if is_mention:
-            sender_info = self._get_sender_info(sender)
-            chat_title = chat.title or "Unknown"
-            logging.info(f"群组 {chat_title} 来自 {sender_info} 的消息")
-            
-            # 对于@消息，我们只检查是否有自己回复过这个@，而不是任意消息
-            now_ts = time.time()
-            last_inter = self.last_interactions.get(chat_id, 0)
-            
-            # 只有当这个@消息是对之前@消息的回复时，才考虑取消窗口
-            if last_inter and (now_ts - last_inter) <= config.CANCEL_WINDOW:
-                # 检查这条消息是否是回复之前的@消息
-                if event.message.reply_to:
-                    reply_msg = await event.message.get_reply_message()
-                    if reply_msg and (reply_msg.mentioned or (reply_msg.message and f"@{self.my_username}" in reply_msg.message)):
-                        logger.info(f"检测到对之前@消息的回复，在取消窗口内，跳过创建提醒")
-                        return
-            
-            self._add_alert(chat_id, event_id, is_private=False)
+            MENTIONS_TOTAL.inc()
+        # 规则中的 VIP 和关键词/正则也会触发提醒
+        elif rule is not None and (rule.vip or rule.matches(message_text)):
+            logger.info(f"chat {chat_id} 的消息命中规则 (VIP={rule.vip})")
+        else:
+            return
 
-    async def _handle_private_message(self, event, chat, sender, message_text, chat_id, event_id):
+        sender_info = self._get_sender_info(sender)
+        chat_title = chat.title or "Unknown"
+        logging.info(f"群组 {chat_title} 来自 {sender_info} 的消息")
+
+        # 对于@消息，我们只检查是否有自己回复过这个@，而不是任意消息
+        now_ts = time.time()
+        last_inter = self.last_interactions.get(chat_id, 0)
+
+        # 只有当这个@消息是对之前@消息的回复时，才考虑取消窗口
+        if last_inter and (now_ts - last_inter) <= self.config.CANCEL_WINDOW:
+            # 检查这条消息是否是回复之前的@消息
+            if event.message.reply_to and await self._is_reply_to_mention(event):
+                logger.info(f"检测到对之前@消息的回复，在取消窗口内，跳过创建提醒")
+                self._event('skip', chat_id, msg_id=event_id, reason='replied')
+                return
+
+        self._add_alert(chat_id, event_id, is_private=False, sender_id=sender.id)
+
+    def _is_mention(self, message) -> bool:
+        """消息是否@了我们：mentioned 标志、提到我们的用户名，或指向我们的 MentionName 实体"""
+        if message is None:
+            return False
+        if message.mentioned:
+            return True
+        text = message.message
+        if self._mention_handle and text and self._mention_handle in text:
+            return True
+        return any(getattr(entity, 'user_id', None) == self.my_id for entity in message.entities or ())
+
+    async def _is_reply_to_mention(self, event) -> bool:
+        """被回复的消息是否是@消息，优先查本地索引，未收录时才请求网络"""
+        # 索引以 event.chat_id 为 key，分类阶段拿不到会话实体时也能写入
+        chat_id = event.chat_id
+        entry = self.message_index.get(chat_id, event.message.reply_to_msg_id)
+        if entry is not None:
+            return entry.is_mention
+        reply_msg = await event.message.get_reply_message()
+        if not reply_msg:
+            return False
+        is_mention = self._is_mention(reply_msg)
+        self.message_index.add(chat_id, reply_msg.id, is_mention, reply_msg.sender_id)
+        return is_mention
+
+    async def _handle_private_message(self, event, chat, sender, message_text, chat_id, event_id,
+                                      rule: Optional[Rule] = None):
         """处理私聊消息"""
         sender_info = self._get_sender_info(sender)
         logging.info(f"来自私聊 {sender_info} 的消息")
@@ -292,12 +876,15 @@ class TelegramAlertSystem:
         # 获取现有告警记录
         existing_record = self.pending_alerts.get(chat_id)
         if existing_record and not existing_record.is_cancelled:
-            # 如果已有未取消的告警任务，仅更新时间
+            # 如果已有未取消的告警任务，仅更新时间和最新消息 ID（已读回执按它判断）
             existing_record.mention_time = now_ts
-            logger.info(f"更新私聊 {sender_info} 的提醒时间，重新开始计时 {config.PRIVATE_MESSAGE_TIMEOUT}s")
+            existing_record.message_id = max(existing_record.message_id, event_id)
+            self._schedule_alert(chat_id, existing_record)
+            logger.info(f"更新私聊 {sender_info} 的提醒时间，重新开始计时 {self.config.PRIVATE_MESSAGE_TIMEOUT}s")
+            self._event('refresh', chat_id, msg_id=event_id)
         else:
             # 如果没有活动的告警任务，创建新的
-            self._add_alert(chat_id, event_id, is_private=True)
+            self._add_alert(chat_id, event_id, is_private=True, sender_id=sender.id)
 
     async def _check_sensitive_words(self, message_text: str, sender_info: str, chat_id: int) -> bool:
         """检查敏感词"""
@@ -305,18 +892,22 @@ class TelegramAlertSystem:
             return False
 
         try:
-            msg_lower = message_text.lower()
-            if any(word.lower() in msg_lower for word in config.SENSITIVE_WORDS):
-                logger.info(f"私聊包含敏感词 - 用户: {sender_info} 内容: {message_text[:200]}")
-                await SoundManager.play_sound(config.SENSITIVE_MUSIC_PATH)  # 播放音乐
-                self.last_interactions[chat_id] = time.time()
+            matches = self.sensitive_matcher.find_all(message_text)
+            if matches:
+                SENSITIVE_HITS_TOTAL.inc()
+                self._event('sensitive', chat_id, words=[m.word for m in matches])
+                hits = ', '.join(f"{m.word}@{m.start}" for m in matches)
+                logger.info(f"私聊包含敏感词 [{hits}] - 用户: {sender_info} 内容: {message_text[:200]}")
+                SoundManager.play_sound_nowait(self.config.SENSITIVE_MUSIC_PATH, Priority.SENSITIVE)  # 播放音乐
+                self._mark_interaction(chat_id)
                 return True
         except Exception:
             logger.debug("敏感词检测失败", exc_info=True)
         return False
 
-    def _add_alert(self, chat_id: int, message_id: int, is_private: bool):
-        """添加告警任务"""
+    def _add_alert(self, chat_id: int, message_id: int, is_private: bool, mention_time: Optional[float] = None,
+                   sender_id: Optional[int] = None):
+        """添加告警任务，mention_time 默认为当前时间（补扫时传入消息的发送时间）"""
         try:
             now_ts = time.time()
             # 检查最近互动
@@ -324,95 +915,171 @@ class TelegramAlertSystem:
             
             # 对于私聊消息，只在回复对方消息时才会更新互动时间，所以这里不需要检查
             # 对于群组消息，保持原有的取消窗口检查逻辑
-            if not is_private and last_inter and (now_ts - last_inter) <= config.CANCEL_WINDOW:
+            if not is_private and last_inter and (now_ts - last_inter) <= self.config.CANCEL_WINDOW:
                 logger.info(f"检测到群组 chat {chat_id} 的最后一次互动在取消窗口内，跳过创建提醒")
+                self._event('skip', chat_id, msg_id=message_id, reason='cancel_window')
                 return
 
-            # 获取超时时间
-            timeout = config.PRIVATE_MESSAGE_TIMEOUT if is_private else config.GROUP_MENTION_TIMEOUT
+            if sender_id is None and is_private:
+                sender_id = chat_id  # 私聊的发送者就是会话本身（补扫时没有 sender_id）
+            rule = self.compiled.rules.resolve(chat_id, sender_id)
+            max_alert_count = self.config.MAX_ALERT_COUNT
+            if is_private:
+                timeout = self.config.PRIVATE_MESSAGE_TIMEOUT
+            else:
+                timeout = self.config.GROUP_MENTION_TIMEOUT
+            if rule is not None:
+                if rule.muted:
+                    logger.info(f"chat {chat_id} 已设置静音，跳过创建提醒")
+                    self._event('skip', chat_id, msg_id=message_id, reason='muted')
+                    return
+                if not rule.vip and rule.in_quiet_hours(now_ts):
+                    logger.info(f"chat {chat_id} 处于免打扰时段，跳过创建提醒")
+                    self._event('skip', chat_id, msg_id=message_id, reason='quiet_hours')
+                    return
+                # 规则中的超时和次数优先
+                timeout = (rule.private_timeout if is_private else rule.group_timeout) or timeout
+                max_alert_count = rule.max_alert_count or max_alert_count
 
             # 检查是否已有告警任务
             existing_record = self.pending_alerts.get(chat_id)
             if existing_record and not existing_record.is_cancelled:
-                # 如果已有任务还在运行，更新最后提醒时间并延长等待时间
+                # 如果已有任务还在运行，更新最后提醒时间和最新消息 ID，并延长等待时间
                 existing_record.mention_time = now_ts
-                # 不取消现有任务，让它继续运行，但会更新下一次提醒的时间
+                existing_record.message_id = max(existing_record.message_id, message_id)
+                # 不取消现有告警，只把它的截止时间推后
+                self._schedule_alert(chat_id, existing_record)
                 logger.info(f"更新 chat {chat_id} 的提醒时间，重新开始计时 {timeout}s")
+                self._event('refresh', chat_id, msg_id=message_id)
                 return
 
             # 如果没有现有任务，则创建新的告警记录
             record = AlertRecord(
                 message_id=message_id,
-                mention_time=now_ts,
+                mention_time=mention_time or now_ts,
                 is_private=is_private,
-                timeout_interval=timeout
+                timeout_interval=timeout,
+                max_alert_count=max_alert_count,
             )
             
             self.pending_alerts[chat_id] = record
-            record.task = asyncio.create_task(self._alert_worker(chat_id))
+            self._schedule_alert(chat_id, record)
+            self.alerts_created += 1
             logger.info(f"为 chat {chat_id} 创建提醒任务，超时 {timeout}s")
+            self._event('alert', chat_id, msg_id=message_id, private=is_private, timeout=timeout)
             
         except Exception:
             logger.error("add_alert 执行失败", exc_info=True)
 
+    def _journal(self, op: str, chat_id: int, data=None):
+        """写入状态日志（未启用持久化时忽略）"""
+        if self.state_store:
+            self.state_store.record(op, chat_id, data)
+
+    def _event(self, kind: str, chat_id: int, **fields):
+        """写入结构化事件日志（未启用时忽略）"""
+        journal = self.shared.journal
+        if journal is not None:
+            journal.record(kind, chat_id, account=self.name, **fields)
+
+    def _mark_interaction(self, chat_id: int, ts: Optional[float] = None):
+        """记录我们在该会话中的最近一次互动"""
+        ts = ts or time.time()
+        self.last_interactions[chat_id] = ts
+        self._journal(OP_INTERACTION, chat_id, ts)
+
+    def _schedule_alert(self, chat_id: int, record: AlertRecord):
+        """按记录的基准时间（重新）设置截止时间"""
+        self.scheduler.schedule((self.name, chat_id), record.mention_time + record.timeout_interval, self._on_alert_due)
+        self._journal(OP_ALERT, chat_id, asdict(record))
+
+    def _forget_alert(self, chat_id: int) -> Optional[AlertRecord]:
+        """移除告警记录及其截止时间"""
+        record = self.pending_alerts.pop(chat_id, None)
+        self.scheduler.cancel((self.name, chat_id))
+        if record:
+            self._journal(OP_CLEAR, chat_id)
+        return record
+
     def _cancel_existing_alert(self, chat_id: int):
         """取消现有告警"""
-        record = self.pending_alerts.get(chat_id)
-        if record and record.task and not record.task.done():
-            try:
-                record.task.cancel()
-            except Exception:
-                logger.debug("取消已有提醒任务时出错", exc_info=True)
-        self.pending_alerts.pop(chat_id, None)
+        record = self._forget_alert(chat_id)
+        if record:
+            record.is_cancelled = True
 
-    async def _alert_worker(self, chat_id: int):
-        """告警工作协程"""
+    async def _on_alert_due(self, key):
+        """告警到期回调，由调度器在截止时间触发"""
+        _, chat_id = key
         record = self.pending_alerts.get(chat_id)
-        if not record:
+        if not record or record.is_cancelled:
+            self._forget_alert(chat_id)
             return
 
+        finished = True
         try:
-            while (not record.is_cancelled and 
-                   record.alert_count < config.MAX_ALERT_COUNT):
-                
-                waiting = True
-                while waiting and not record.is_cancelled:
-                    # 计算需要等待的时间
-                    now = time.time()
-                    wait_time = record.mention_time + record.timeout_interval - now
-                    
-                    if wait_time <= 0:
-                        waiting = False
-                    else:
-                        # 使用较短的等待时间，以便能够及时响应mention_time的更新
-                        sleep_time = min(wait_time, 1.0)
-                        await asyncio.sleep(sleep_time)
-                        # 重新获取记录，以防在等待期间被更新或取消
-                        record = self.pending_alerts.get(chat_id)
-                        if not record or record.is_cancelled:
-                            return
-                
-                # 检查是否应该取消告警
-                if self._should_cancel_alert(chat_id, record):
-                    break
-
-                # 播放告警声音
-                await self._play_alert(chat_id, record)
-                
-                if record.alert_count >= config.MAX_ALERT_COUNT:
-                    break
-
-                # 更新下一次提醒的基准时间为当前时间
-                record.mention_time = time.time()
-                logger.info(f"更新下一次提醒时间为: {datetime.fromtimestamp(record.mention_time).strftime('%H:%M:%S')}")
+            # 检查是否应该取消告警
+            if self._should_cancel_alert(chat_id, record):
+                self._event('retire', chat_id, msg_id=record.message_id, reason='interaction')
+                return
+
+            # 播放告警声音
+            ALERT_FIRE_DELAY.observe(max(0.0, time.time() - record.mention_time - record.timeout_interval))
+            await self._play_alert(chat_id, record)
+
+            # 播放期间告警可能已被取消或替换
+            if self.pending_alerts.get(chat_id) is not record or record.is_cancelled:
+                finished = False
+                return
+            if record.alert_count >= record.max_alert_count:
+                self._event('done', chat_id, msg_id=record.message_id, count=record.alert_count)
+                return
+
+            # 更新下一次提醒的基准时间为当前时间
+            record.mention_time = time.time()
+            self._schedule_alert(chat_id, record)
+            finished = False
+            logger.info(f"更新下一次提醒时间为: {datetime.fromtimestamp(record.mention_time).strftime('%H:%M:%S')}")
 
         except asyncio.CancelledError:
-            logger.info(f"alert worker for chat {chat_id} 被取消")
+            # 只在退出时发生，保留记录以便下次启动恢复
+            finished = False
+            logger.info(f"chat {chat_id} 的提醒被取消")
+            raise
         except Exception:
-            logger.error("alert worker 未处理的异常", exc_info=True)
+            logger.error("告警回调未处理的异常", exc_info=True)
         finally:
-            self.pending_alerts.pop(chat_id, None)
-            logger.info(f"已清理 chat {chat_id} 的提醒任务")
+            if finished:
+                if self.pending_alerts.get(chat_id) is record:
+                    self._forget_alert(chat_id)
+                logger.info(f"已清理 chat {chat_id} 的提醒任务")
+
+    def _retire_alert(self, chat_id: int, reason: str, max_id: Optional[int] = None) -> bool:
+        """提前结束会话的告警，max_id 为已读到的消息 ID（提醒的消息比它新时保留）"""
+        record = self.pending_alerts.get(chat_id)
+        if record is None or record.is_cancelled:
+            return False
+        if max_id is not None and record.message_id > max_id:
+            return False
+        self._cancel_existing_alert(chat_id)
+        self.alerts_retired += 1
+        ALERTS_RETIRED_TOTAL.labels(reason=reason).inc()
+        self._event('retire', chat_id, msg_id=record.message_id, reason=reason)
+        logger.info(f"chat {chat_id} 的提醒已结束（{reason}）")
+        return True
+
+    async def _on_read(self, event):
+        """我们在其他设备上读了会话：已读到的消息对应的提醒直接结束"""
+        self._retire_alert(utils.resolve_id(event.chat_id)[0], 'read', event.max_id)
+
+    async def _on_entity_update(self, update):
+        """实体信息变化：删除对应的缓存，下一条消息重新获取"""
+        if isinstance(update, (types.UpdateUserName, types.UpdateUser)):
+            peer = types.PeerUser(update.user_id)
+        elif isinstance(update, types.UpdateChannel):
+            peer = types.PeerChannel(update.channel_id)
+        else:
+            peer = types.PeerChat(update.chat_id)
+        self.entity_cache.invalidate(self._peer_key(utils.get_peer_id(peer)))
 
     def _should_cancel_alert(self, chat_id: int, record: AlertRecord) -> bool:
         """检查是否应该取消告警"""
@@ -420,7 +1087,7 @@ class TelegramAlertSystem:
         now_ts = time.time()
         
         if (last_inter > record.mention_time and 
-            (now_ts - last_inter) <= config.CANCEL_WINDOW):
+            (now_ts - last_inter) <= self.config.CANCEL_WINDOW):
             logger.info(f"检测到 chat {chat_id} 的最后一次互动在取消窗口内，取消提醒")
             record.is_cancelled = True
             return True
@@ -429,9 +1096,16 @@ class TelegramAlertSystem:
     async def _play_alert(self, chat_id: int, record: AlertRecord):
         """播放告警声音"""
         try:
-            await SoundManager.play_alert_sound_async(count=1)
+            priority = Priority.PRIVATE if record.is_private else Priority.GROUP
+            if self.config.ALERT_SEQUENCE:
+                await SoundManager.play_sequence_async(self.config.ALERT_SEQUENCE, priority=priority)
+            else:
+                await SoundManager.play_alert_sound_async(count=1, priority=priority)
             self.play_counts[chat_id] += 1
+            self._journal(OP_PLAY, chat_id, self.play_counts[chat_id])
             record.alert_count += 1
+            ALERTS_FIRED_TOTAL.labels(chat_type='private' if record.is_private else 'group').inc()
+            self._event('fire', chat_id, msg_id=record.message_id, count=record.alert_count)
             logger.info(f"触发提醒 #{record.alert_count} for chat {chat_id}")
         except Exception as e:
             logger.error(f"播放提示音失败: {e}", exc_info=True)
@@ -441,45 +1115,193 @@ class TelegramAlertSystem:
         try:
             # 启动客户端
             await self.client.start()
-            self.my_id = (await self.client.get_me()).id
-            self.my_username = (await self.client.get_me()).username
+            self._set_identity(await self.client.get_me())
+            self._restore_state()
+            await self._prune_state()
             
-            # 注册事件处理器
-            @self.client.on(events.MessageEdited)
+            if self.config.PIPELINE_ENABLED:
+                self.pipeline.start()
+
+            # 注册事件处理器（越早注册，连接后收到的第一批消息越不容易错过）
             @self.client.on(events.NewMessage)
             async def message_handler(event):
-                await self._handle_message(event)
+                await self._ingest(event)
+
+            @self.client.on(events.MessageEdited)
+            async def edited_handler(event):
+                event.is_edit = True
+                await self._ingest(event)
+
+            # 在其他设备上读过会话时，结束已读消息对应的提醒
+            self.client.add_event_handler(self._on_read, events.MessageRead(inbox=True))
+            # 用户改名、会话标题或权限变化时，丢弃缓存的旧实体
+            self.client.add_event_handler(self._on_entity_update, events.Raw(
+                (types.UpdateUserName, types.UpdateUser, types.UpdateChannel, types.UpdateChat)))
+
+            # 不影响消息判定的初始化放在处理器注册之后：事件日志和消息存储启动前的记录先在队列中等待，
+            # 音频文件在线程池中预加载
+            await self.shared.start()
+            SoundManager.engine()
+            asyncio.get_running_loop().run_in_executor(None, SoundManager.preload)
+
+            if self.config.CATCH_UP_ENABLED:
+                self._catch_up_task = asyncio.create_task(self._catch_up())
 
             logger.info(f"\n🚀 Telegram 告警系统已启动" +
-                      f"\n✅ 已登录，用户ID: {self.my_id}")
+                      f"\n✅ 已登录账号 {self.name}，用户ID: {self.my_id}")
 
             # 保持运行
             await self.client.run_until_disconnected()
             
         except Exception as e:
             logger.error(f"运行时发生错误: {e}", exc_info=True)
+        finally:
+            if self._catch_up_task:
+                self._catch_up_task.cancel()
+            await self.pipeline.stop()
+            if self._owns_shared:
+                await self.shared.close()
+            else:
+                # 共享调度器继续为其他账号服务，只撤下本账号的截止时间
+                for chat_id in list(self.pending_alerts):
+                    self.scheduler.cancel((self.name, chat_id))
+                self.scheduler.cancel((self.name, 'prune'))
+            if self.state_store:
+                self.state_store.close()
+            # 已停止的账号不再计入进程级指标
+            TelegramAlertSystem.instances.remove(self)
+
+    async def _prune_state(self, _key=None):
+        """清理过期的互动时间和播放次数，并安排下一次清理"""
+        expired = self.last_interactions.prune(self.config.CANCEL_WINDOW)
+        for chat_id in expired:
+            self._journal(OP_INTERACTION, chat_id, None)
+        stale = self.play_counts.prune(self.config.PLAY_COUNT_RETENTION)
+        for chat_id in stale:
+            self._journal(OP_PLAY, chat_id, None)
+        if expired or stale:
+            logger.debug(f"清理过期状态: 互动 {len(expired)} 条, 播放次数 {len(stale)} 条")
+        self.scheduler.schedule((self.name, 'prune'), time.time() + self.config.STATE_PRUNE_INTERVAL, self._prune_state)
+
+    async def _catch_up(self):
+        """补扫离线期间错过的@和私聊，为尚无告警的会话补建提醒"""
+        # 补扫在事件处理器注册之后才开始，用到时再导入，不占用启动时间
+        from catch_up import scan_unread
+        try:
+            items = await scan_unread(self.client, self.config.CATCH_UP_HORIZON, self.config.CATCH_UP_CONCURRENCY,
+                                      self.config.CATCH_UP_MAX_DIALOGS, self.config.CATCH_UP_MIN_INTERVAL)
+        except Exception:
+            logger.error("启动补扫失败", exc_info=True)
+            return
+        for item in items:
+            if item.chat_id in self.pending_alerts:
+                continue
+            last_inter = self.last_interactions.get(item.chat_id, 0)
+            if last_inter >= item.timestamp:
+                continue
+            self._add_alert(item.chat_id, item.message_id, item.is_private, mention_time=item.timestamp)
+
+    def _restore_state(self):
+        """从状态日志恢复告警、互动时间和播放次数，并重新挂上截止时间"""
+        if not self.state_store:
+            return
+        state = self.state_store.load()
+        for chat_id, ts in sorted(state.interactions.items(), key=lambda item: item[1]):
+            self.last_interactions.set(chat_id, ts, ts)
+        self.play_counts.update(state.play_counts)
+        for chat_id, data in state.alerts.items():
+            record = AlertRecord(**data)
+            self.pending_alerts[chat_id] = record
+            # 已过期的截止时间会立即触发
+            self.scheduler.schedule((self.name, chat_id), record.mention_time + record.timeout_interval, self._on_alert_due)
+
+    async def _ingest(self, event):
+        """事件入口：交给流水线，或在关闭流水线时直接处理"""
+        if self.config.PIPELINE_ENABLED:
+            await self.pipeline['classify'].put(event)
+        else:
+            await self._handle_message(event)
+
+def load_accounts() -> List[dict]:
+    """读取账号列表：设置了 ACCOUNTS_FILE 时从文件读取，否则使用环境变量中的单个账号
+
+    文件格式: {"accounts": [{"name": "work", "session": "work", "api_id": 1, "api_hash": "...",
+                             "phone": "...", "config": {"GROUP_MENTION_TIMEOUT": 20}}]}
+    """
+    path = os.getenv("ACCOUNTS_FILE") or config.ACCOUNTS_FILE
+    if not path:
+        return [{
+            'name': 'default',
+            'session': 'tg_monitor_bot',
+            'api_id': os.getenv("API_ID"),
+            'api_hash': os.getenv("API_HASH"),
+            'phone': os.getenv("PHONE"),
+        }]
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data['accounts'] if isinstance(data, dict) else data
+
+
+def build_systems(accounts: List[dict], shared: SharedResources) -> List[TelegramAlertSystem]:
+    """为每个账号创建告警系统，所有账号共用 shared"""
+    systems = []
+    for account in accounts:
+        name = account.get('name') or account.get('session') or f"account{len(systems)}"
+        session = account.get('session', name)
+        overrides = dict(account.get('config', {}))
+        # 多账号时每个账号各自的状态文件
+        if len(accounts) > 1 and config.STATE_DB_PATH:
+            overrides.setdefault('STATE_DB_PATH', f"{session}_state.db")
+        try:
+            account_config = compile_config(config, overrides).config
+        except ConfigError as e:
+            raise ConfigError(f"账号 {name} 的配置不合法: {e}") from e
+        system = TelegramAlertSystem(
+            account.get('api_id'),
+            account.get('api_hash'),
+            account.get('phone'),
+            session=session,
+            account_config=account_config,
+            shared=shared,
+            name=name,
+        )
+        system.account_overrides = overrides
+        systems.append(system)
+    return systems
+
 
 async def main():
     """主函数"""
     # 启动防超时活动模拟器
     # activity_simulator.start()
-    
-    client = TelegramAlertSystem(
-        os.getenv("API_ID"),
-        os.getenv("API_HASH"),
-        os.getenv("PHONE")
-    )
+
+    # 加载环境变量（.env）
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    global config
+    config_file = os.getenv("CONFIG_FILE") or config.CONFIG_FILE
+    if config_file:
+        config = load_config(config_file)
+
+    shared = SharedResources()
+    systems = build_systems(load_accounts(), shared)
     
     try:
-        await client.run()
+        await asyncio.gather(*(system.run() for system in systems))
     except KeyboardInterrupt:
         logger.info("❌ 程序已停止")
     except asyncio.CancelledError:
         logger.info("👋 按了 Ctrl+C 停止程序")
     finally:
         # activity_simulator.stop()  # 停止活动模拟器
-        await client.client.disconnect()
+        await shared.close()
+        await SoundManager.close_queue()
+        for system in systems:
+            await system.client.disconnect()
         logger.info("🔌 客户端断开连接")
+        SoundManager.shutdown()
+        LogManager.shutdown()
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+# 源码在 test/ 目录下，模块之间按顶层模块名互相导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test'))
+
+
+@pytest.fixture
+def make_system(monkeypatch):
+    """创建接在 FakeClient 上的告警系统：不出声、不落盘、不开端口，播放请求记在 system.played 中"""
+    import tg_alert_monitor as monitor
+    from replay import FakeClient
+
+    for name, value in (('AUDIO_DRIVER', 'null'), ('AUDIO_CACHE_DIR', ''), ('METRICS_PORT', 0),
+                        ('STATE_DB_PATH', ''), ('JOURNAL_DIR', ''), ('MESSAGE_STORE_PATH', ''),
+                        ('PIPELINE_ENABLED', False), ('CATCH_UP_ENABLED', False)):
+        monkeypatch.setattr(monitor.config, name, value)
+    played = []
+
+    async def play(target_volume=60, count=1, priority=None):
+        played.append(priority)
+
+    monkeypatch.setattr(monitor.SoundManager, 'play_alert_sound_async', staticmethod(play))
+    systems = []
+
+    def make(**overrides):
+        for name, value in overrides.items():
+            monkeypatch.setattr(monitor.config, name, value)
+        client = FakeClient([])
+        system = monitor.TelegramAlertSystem(0, '', '', client=client)
+        system._set_identity(client.me)
+        system.played = played
+        systems.append(system)
+        return system
+
+    yield make
+    for system in systems:
+        system.scheduler.close()
+        if system.state_store:
+            system.state_store.close()
+        if system in monitor.TelegramAlertSystem.instances:
+            monitor.TelegramAlertSystem.instances.remove(system)
+
+
+@pytest.fixture
+def system(make_system):
+    return make_system()
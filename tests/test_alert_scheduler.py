@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+from alert_scheduler import AlertScheduler
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_fires_in_deadline_order():
+    async def main():
+        scheduler = AlertScheduler()
+        fired = []
+
+        async def due(key):
+            fired.append(key)
+
+        now = time.time()
+        scheduler.schedule('late', now + 0.06, due)
+        scheduler.schedule('early', now + 0.02, due)
+        scheduler.schedule('middle', now + 0.04, due)
+        await asyncio.sleep(0.12)
+        assert fired == ['early', 'middle', 'late']
+        assert len(scheduler) == 0
+
+    run(main())
+
+
+def test_reschedule_replaces_previous_deadline():
+    async def main():
+        scheduler = AlertScheduler()
+        fired = []
+
+        async def due(key):
+            fired.append((key, time.time()))
+
+        scheduler.schedule('chat', time.time() + 0.02, due)
+        pushed = time.time() + 0.08
+        scheduler.schedule('chat', pushed, due)
+        assert scheduler.deadline('chat') == pushed
+        await asyncio.sleep(0.05)
+        assert fired == []
+        await asyncio.sleep(0.08)
+        assert [key for key, _ in fired] == ['chat']
+        assert fired[0][1] >= pushed
+
+    run(main())
+
+
+def test_cancel_prevents_callback():
+    async def main():
+        scheduler = AlertScheduler()
+        fired = []
+
+        async def due(key):
+            fired.append(key)
+
+        scheduler.schedule('a', time.time() + 0.02, due)
+        scheduler.schedule('b', time.time() + 0.02, due)
+        assert scheduler.cancel('a')
+        assert not scheduler.cancel('a')
+        assert 'a' not in scheduler
+        await asyncio.sleep(0.06)
+        assert fired == ['b']
+
+    run(main())
+
+
+def test_callback_can_reschedule_same_key_and_errors_do_not_stop_timer():
+    async def main():
+        scheduler = AlertScheduler()
+        fired = []
+
+        async def due(key):
+            fired.append(key)
+            if len(fired) < 3:
+                scheduler.schedule(key, time.time() + 0.01, due)
+
+        async def broken(key):
+            raise RuntimeError('boom')
+
+        scheduler.schedule('broken', time.time(), broken)
+        scheduler.schedule('repeat', time.time() + 0.01, due)
+        await asyncio.sleep(0.1)
+        assert fired == ['repeat'] * 3
+        assert len(scheduler) == 0
+        # 一次唤醒处理所有到期条目，没有轮询
+        assert scheduler.wakeups <= 5
+
+    run(main())
+
+
+def test_close_cancels_pending_entries():
+    async def main():
+        scheduler = AlertScheduler()
+        fired = []
+
+        async def due(key):
+            fired.append(key)
+
+        scheduler.schedule('a', time.time() + 0.02, due)
+        scheduler.close()
+        await asyncio.sleep(0.05)
+        assert fired == []
+        assert len(scheduler) == 0
+
+    run(main())
@@ -0,0 +1,218 @@
+import asyncio
+
+import tg_alert_monitor as monitor
+from replay import FakeEvent
+
+
+def message(system, **fields):
+    record = {'kind': 'new', 'id': 1, 'chat_id': 100, 'sender_id': 5, 'private': False, 'text': '',
+              'mentioned': False}
+    record.update(fields)
+    return FakeEvent(system.client, record)
+
+
+def deliver(system, event):
+    asyncio.run(system._handle_message(event))
+
+
+def fire(system, chat_id):
+    asyncio.run(system._on_alert_due((system.name, chat_id)))
+
+
+def test_mention_creates_alert(system):
+    deliver(system, message(system, text='hi @me', mentioned=True))
+    record = system.pending_alerts[100]
+    assert not record.is_private
+    assert (system.name, 100) in system.scheduler
+    assert system.scheduler.deadline((system.name, 100)) == record.mention_time + record.timeout_interval
+
+
+def test_unmentioned_group_message_is_ignored(system):
+    deliver(system, message(system, text='hello everyone'))
+    assert system.pending_alerts == {}
+    # 预过滤在获取实体之前就丢弃了无关的群消息
+    assert system.client.entity_fetches == 0
+
+
+def test_refresh_keeps_record_and_pushes_deadline(system):
+    deliver(system, message(system, id=1, mentioned=True))
+    record = system.pending_alerts[100]
+    first = system.scheduler.deadline((system.name, 100))
+    record.mention_time -= 10
+    deliver(system, message(system, id=2, mentioned=True))
+    assert system.pending_alerts[100] is record
+    assert record.message_id == 2
+    assert system.scheduler.deadline((system.name, 100)) >= first
+    assert system.alerts_created == 1
+
+
+def test_stops_after_max_alert_count(system, monkeypatch):
+    monkeypatch.setattr(system.config, 'MAX_ALERT_COUNT', 2)
+    deliver(system, message(system, private=True, chat_id=5, text='are you there?'))
+    record = system.pending_alerts[5]
+    assert record.max_alert_count == 2
+
+    fire(system, 5)
+    assert system.pending_alerts[5] is record
+    assert record.alert_count == 1
+    assert (system.name, 5) in system.scheduler
+
+    fire(system, 5)
+    assert record.alert_count == 2
+    assert 5 not in system.pending_alerts
+    assert (system.name, 5) not in system.scheduler
+    assert len(system.played) == 2
+    assert system.alerts_created == 1  # 到期后的重新调度不算新告警
+
+
+def test_interaction_inside_cancel_window_retires_alert(system):
+    deliver(system, message(system, private=True, chat_id=5))
+    record = system.pending_alerts[5]
+    system.last_interactions[5] = record.mention_time + 1
+    fire(system, 5)
+    assert record.is_cancelled
+    assert 5 not in system.pending_alerts
+    assert system.played == []
+
+
+def test_recent_interaction_suppresses_group_alert(system):
+    deliver(system, message(system, id=1, sender_id=1, text='our reply'))
+    deliver(system, message(system, id=2, mentioned=True))
+    assert 100 not in system.pending_alerts
+
+
+def test_outgoing_message_retires_alert(system):
+    deliver(system, message(system, id=1, mentioned=True))
+    deliver(system, message(system, id=2, sender_id=1, out=True, text='on it'))
+    assert 100 not in system.pending_alerts
+    assert system.alerts_retired == 1
+
+
+def test_read_receipt_retires_only_read_messages(system):
+    from replay import FakeReadEvent
+
+    deliver(system, message(system, id=5, mentioned=True))
+    asyncio.run(system._on_read(FakeReadEvent({'chat_id': 100, 'max_id': 4})))
+    assert 100 in system.pending_alerts
+    asyncio.run(system._on_read(FakeReadEvent({'chat_id': 100, 'max_id': 5})))
+    assert 100 not in system.pending_alerts
+
+
+def test_debug_capture_chats_are_not_filtered(system, monkeypatch):
+    captured = []
+    monkeypatch.setattr(system, 'debug_capture_chat_ids', frozenset({100}))
+    monkeypatch.setattr(system, '_log_debug_info', lambda event, chat, sender, text, chat_id: captured.append(text))
+    deliver(system, message(system, id=1, text='ordinary chatter'))
+    deliver(system, message(system, id=2, chat_id=200, text='other chat'))
+    assert captured == ['ordinary chatter']
+    assert system.pending_alerts == {}
+
+
+def test_edit_of_our_old_message_does_not_retire_alert(system):
+    deliver(system, message(system, id=1, sender_id=1, out=True, text='earlier'))
+    system.last_interactions.clear()
+    deliver(system, message(system, id=2, mentioned=True))
+    edit = message(system, kind='edit', id=1, sender_id=1, out=True, text='earlier')
+    deliver(system, edit)
+    assert 100 in system.pending_alerts
+    assert system.alerts_retired == 0
+
+
+def test_alert_sequence_goes_through_playback_queue(system, monkeypatch):
+    requests = []
+
+    class Queue:
+        async def play(self, path, priority, volume, count, interval):
+            requests.append((path, priority))
+
+    monkeypatch.setattr(system.config, 'ALERT_SEQUENCE', 'knock')
+    monkeypatch.setattr(monitor.SoundManager, 'queue', staticmethod(lambda: Queue()))
+    deliver(system, message(system, private=True, chat_id=5))
+    fire(system, 5)
+    assert requests == [('sequence:knock', monitor.Priority.PRIVATE)]
+    assert system.pending_alerts[5].alert_count == 1
+
+
+def test_entity_update_invalidates_cached_entity(system):
+    from telethon.tl import types
+
+    user_key, channel_key = system._peer_key(5), system._peer_key(-1000000000777)
+    system.entity_cache.put(user_key, 'old user')
+    system.entity_cache.put(channel_key, 'old channel')
+    asyncio.run(system._on_entity_update(types.UpdateUserName(5, 'New', '', [])))
+    assert system.entity_cache.get(user_key) is None
+    assert system.entity_cache.get(channel_key) == 'old channel'
+    asyncio.run(system._on_entity_update(types.UpdateChannel(777)))
+    assert system.entity_cache.get(channel_key) is None
+
+
+def test_reply_after_slow_enrich_still_retires_alert(system, monkeypatch):
+    enrich = system._enrich
+
+    async def slow_enrich(event):
+        if event.id == 1:
+            await asyncio.sleep(0.05)  # 会话实体没有命中缓存
+        return await enrich(event)
+
+    monkeypatch.setattr(system, '_enrich', slow_enrich)
+
+    async def scenario():
+        system.pipeline.start()
+        await system.pipeline['classify'].put(message(system, id=1, private=True, chat_id=5))
+        await system.pipeline['classify'].put(message(system, id=2, private=True, chat_id=5, sender_id=1,
+                                                      out=True, text='here'))
+        await system.pipeline.join()
+        await system.pipeline.stop()
+
+    asyncio.run(scenario())
+    assert 5 not in system.pending_alerts
+    assert system.alerts_created == 1 and system.alerts_retired == 1
+
+
+def test_stopped_system_leaves_pending_alert_gauge(system):
+    deliver(system, message(system, id=1, mentioned=True))
+    assert monitor.PENDING_ALERTS.labels().get() == 1
+    asyncio.run(system.run())
+    assert system not in monitor.TelegramAlertSystem.instances
+    assert monitor.PENDING_ALERTS.labels().get() == 0
+
+
+def test_reply_to_indexed_mention_needs_no_fetch(system):
+    deliver(system, message(system, id=1, mentioned=True))
+    reply = message(system, id=2, reply_to=1)
+    deliver(system, reply)
+    assert asyncio.run(system._is_reply_to_mention(reply))
+    assert not asyncio.run(system._is_reply_to_mention(message(system, id=3, reply_to=2)))
+    assert system.client.reply_fetches == 0
+
+
+def test_reply_to_unindexed_message_is_fetched_once(system):
+    system.client.messages[(100, 7)] = message(system, id=7, mentioned=True).message
+    reply = message(system, id=8, reply_to=7)
+    assert asyncio.run(system._is_reply_to_mention(reply))
+    assert asyncio.run(system._is_reply_to_mention(reply))
+    assert system.client.reply_fetches == 1
+
+
+def test_reply_to_mention_inside_cancel_window_is_skipped(system):
+    deliver(system, message(system, id=1, mentioned=True))
+    deliver(system, message(system, id=2, sender_id=1, out=True, text='on it'))
+    deliver(system, message(system, id=3, mentioned=True, reply_to=1))
+    assert 100 not in system.pending_alerts
+    assert system.alerts_created == 1
+
+
+def test_unchanged_edit_is_skipped_and_text_change_is_processed(system):
+    edited = monitor.MESSAGES_TOTAL.labels(type='edited')
+    before = edited.get()
+    deliver(system, message(system, id=1, private=True, chat_id=5, text='hello'))
+    # 链接预览、表情回应等只会重发同样的内容
+    deliver(system, message(system, kind='edit', id=1, private=True, chat_id=5, text='hello'))
+    assert system.edits_skipped == 1
+    assert edited.get() == before
+
+    deliver(system, message(system, kind='edit', id=1, private=True, chat_id=5, text='hello, are you there?'))
+    assert system.edits_skipped == 1
+    assert edited.get() == before + 1
+    deliver(system, message(system, kind='edit', id=1, private=True, chat_id=5, text='hello, are you there?'))
+    assert system.edits_skipped == 2
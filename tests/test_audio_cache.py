@@ -0,0 +1,101 @@
+import os
+import struct
+import subprocess
+import wave
+
+import pytest
+
+import audio_cache
+from audio_cache import AudioAssetCache
+from audio_engine import AudioEngine, FileSinkDriver, LinuxDriver
+
+FRAMES = [struct.pack('<h', (i * 37) % 2000 - 1000) for i in range(4410)]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / 'click.wav')
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(22050)
+        out.writeframes(b''.join(FRAMES))
+    return path
+
+
+def test_decodes_once_and_maps_pcm(tmp_path, source):
+    directory = str(tmp_path / 'cache')
+    cache = AudioAssetCache(directory)
+    asset = cache.get(source)
+    assert cache.get(source) is asset
+    assert (cache.decoded, cache.hits) == (1, 0)
+    assert (asset.rate, asset.channels, asset.frames) == (22050, 1, 4410)
+    assert asset.pcm.tobytes() == b''.join(FRAMES)
+    assert asset.duration == pytest.approx(0.2)
+    assert not [name for name in os.listdir(directory) if name.endswith('.tmp')]
+    cache.close()
+
+    # 重启后直接映射已有的缓存文件
+    restarted = AudioAssetCache(directory)
+    assert restarted.get(source).path == asset.path
+    assert (restarted.decoded, restarted.hits) == (0, 1)
+    restarted.close()
+
+
+def test_changed_source_is_decoded_again(tmp_path, source):
+    cache = AudioAssetCache(str(tmp_path / 'cache'))
+    first = cache.get(source)
+    with wave.open(source, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(22050)
+        out.writeframes(b'\0\0' * 100)
+    os.utime(source, ns=(0, 0))
+    second = cache.get(source)
+    assert second.path != first.path
+    assert second.frames == 100
+    assert cache.decoded == 2
+    cache.close()
+
+
+def test_decode_failure_falls_back_to_original_file(tmp_path, monkeypatch):
+    def no_decoder(source, target):
+        raise RuntimeError('没有可用的解码器')
+
+    monkeypatch.setattr(audio_cache, 'convert_to_wav', no_decoder)
+    source = str(tmp_path / 'music.mp3')
+    with open(source, 'wb') as f:
+        f.write(b'ID3')
+    directory = str(tmp_path / 'cache')
+    driver = FileSinkDriver(str(tmp_path / 'sink.log'))
+    engine = AudioEngine(driver, burst_idle=0, cache=AudioAssetCache(directory))
+    engine.play(source)
+    engine.close()
+    assert driver.plays == [source]
+    assert os.listdir(directory) == []
+
+
+def test_file_sink_plays_cached_asset(tmp_path, source):
+    sink = str(tmp_path / 'sink.log')
+    engine = AudioEngine(FileSinkDriver(sink), burst_idle=0, cache=AudioAssetCache(str(tmp_path / 'cache')))
+    engine.play(source)
+    engine.play(source)
+    engine.close()
+    assert engine.cache.decoded == 1
+    with open(sink) as f:
+        plays = [line for line in f if ' play ' in line]
+    assert len(plays) == 2
+    assert 'pcm 4410 frames 1ch 22050Hz' in plays[0]
+
+
+def test_linux_driver_streams_mapped_pcm(tmp_path, source, monkeypatch):
+    calls = []
+    monkeypatch.setattr(subprocess, 'run', lambda args, input=None, **kwargs: calls.append((args, bytes(input))))
+    driver = LinuxDriver.__new__(LinuxDriver)
+    driver.player = '/usr/bin/paplay'
+    cache = AudioAssetCache(str(tmp_path / 'cache'))
+    driver.play(driver.load_asset(cache.get(source)))
+    args, data = calls[0]
+    assert args[1:] == ['--raw', '--format=s16le', '--rate=22050', '--channels=1']
+    assert data == b''.join(FRAMES)
+    cache.close()
@@ -0,0 +1,46 @@
+import time
+
+from audio_engine import AudioEngine, NullDriver
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_volume_is_set_once_per_burst_and_restored_after_idle():
+    driver = NullDriver()
+    engine = AudioEngine(driver, burst_idle=0.3)
+    try:
+        futures = [engine.submit(f'alert{i}.mp3', volume=80) for i in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        assert driver.plays == ['alert0.mp3', 'alert1.mp3', 'alert2.mp3']
+        assert (driver.volume, driver.volume_changes) == (80, 1)
+
+        wait_for(lambda: driver.volume_changes == 2)
+        assert driver.volume == 50
+
+        # 下一组播放重新调整音量
+        engine.play('alert.mp3', volume=80, count=2, interval=0)
+        assert (driver.volume, driver.volume_changes) == (80, 3)
+        wait_for(lambda: driver.volume == 50)
+    finally:
+        engine.close()
+    assert driver.volume_changes == 4
+
+
+def test_volume_change_inside_burst_keeps_original_for_restore():
+    driver = NullDriver()
+    engine = AudioEngine(driver, burst_idle=0.3)
+    try:
+        engine.submit('group.mp3', volume=60)
+        engine.play('private.mp3', volume=90)
+        assert driver.volume == 90
+    finally:
+        engine.close()
+    # 关闭时恢复 burst 开始前的音量
+    assert driver.volume == 50
+    assert driver.volume_changes == 3
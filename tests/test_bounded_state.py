@@ -0,0 +1,73 @@
+from bounded_state import AgingMap
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_default_factory_does_not_insert():
+    counts = AgingMap(int)
+    assert counts['missing'] == 0
+    assert 'missing' not in counts
+    counts['a'] += 1
+    counts['a'] += 1
+    assert counts['a'] == 2
+    assert AgingMap().get('missing', 'x') == 'x'
+
+
+def test_maxsize_evicts_least_recently_written():
+    m = AgingMap(maxsize=2)
+    m['a'] = 1
+    m['b'] = 2
+    m['a'] = 3  # 重新写入后 a 变为最新
+    m['c'] = 4
+    assert list(m) == ['a', 'c']
+    assert m.evicted == 1
+
+
+def test_maxsize_eviction_calls_on_evict():
+    evicted = []
+    m = AgingMap(maxsize=1, on_evict=evicted.append)
+    m['a'] = 1
+    m['a'] = 2
+    m['b'] = 3
+    assert evicted == ['a']
+    assert list(m) == ['b']
+
+
+def test_prune_removes_only_expired_entries():
+    clock = Clock()
+    m = AgingMap(clock=clock)
+    m['old'] = 1
+    clock.now += 50
+    m['new'] = 2
+    clock.now += 20
+    assert m.prune(60) == ['old']
+    assert list(m) == ['new']
+    assert m.touched_at('new') == 1050
+    assert m.prune(60) == []
+
+
+def test_set_with_explicit_time():
+    clock = Clock()
+    m = AgingMap(clock=clock)
+    m.set('restored', 'v', touched_at=clock.now - 100)
+    assert m.touched_at('restored') == clock.now - 100
+    assert m.prune(60) == ['restored']
+
+
+def test_prune_rebuilds_after_mass_eviction():
+    clock = Clock()
+    m = AgingMap(clock=clock)
+    for i in range(100):
+        m[i] = i
+    clock.now += 10
+    m['keep'] = 1
+    assert len(m.prune(5)) == 100
+    assert dict(m) == {'keep': 1}
+    m['more'] = 2
+    assert list(m) == ['keep', 'more']
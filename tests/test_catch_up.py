@@ -0,0 +1,38 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from catch_up import scan_unread
+
+
+def dialog(entity_id, age, pinned=False, unread=1, out=False):
+    date = datetime.fromtimestamp(time.time() - age, tz=timezone.utc)
+    return SimpleNamespace(
+        name=f"chat{entity_id}", pinned=pinned, is_user=True, is_group=False, unread_count=unread,
+        unread_mentions_count=0, entity=SimpleNamespace(id=entity_id),
+        message=SimpleNamespace(id=entity_id * 10, date=date, out=out))
+
+
+class Client:
+    def __init__(self, dialogs):
+        self.dialogs = dialogs
+
+    async def iter_dialogs(self, limit=None):
+        for d in self.dialogs[:limit]:
+            yield d
+
+
+def scan(dialogs, horizon=3600):
+    return asyncio.run(scan_unread(Client(dialogs), horizon))
+
+
+def test_old_pinned_dialog_does_not_stop_scan():
+    items = scan([dialog(1, 86400, pinned=True), dialog(2, 60), dialog(3, 120), dialog(4, 7200), dialog(5, 60)])
+    assert [item.chat_id for item in items] == [2, 3]
+    assert all(item.is_private for item in items)
+
+
+def test_skips_read_and_outgoing_private_dialogs():
+    items = scan([dialog(1, 60, unread=0), dialog(2, 60, out=True), dialog(3, 60, pinned=True)])
+    assert [item.chat_id for item in items] == [3]
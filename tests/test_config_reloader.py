@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import pytest
+
+import tg_alert_monitor as monitor
+from config_reloader import ConfigError, ConfigWatcher
+
+
+@pytest.fixture
+def reload(system, tmp_path, monkeypatch):
+    """把 data 写入配置文件并检查一次，返回是否替换了配置"""
+    # _apply_reload 会替换模块级的 config，测试结束后还原
+    monkeypatch.setattr(monitor, 'config', monitor.config)
+    path = tmp_path / 'config.json'
+    watcher = ConfigWatcher(str(path), system.shared._compile_reload, system.shared._apply_reload)
+
+    def check(data):
+        path.write_text(data if isinstance(data, str) else json.dumps(data), encoding='utf-8')
+        return asyncio.run(watcher.check())
+
+    check.watcher = watcher
+    return check
+
+
+def test_valid_file_swaps_config(system, reload):
+    assert reload({'GROUP_MENTION_TIMEOUT': 42, 'SENSITIVE_WORDS': ['refund']})
+    assert system.config.GROUP_MENTION_TIMEOUT == 42
+    assert system.compiled.config is system.config
+    assert [m.word for m in system.sensitive_matcher.find_all('need a refund')] == ['refund']
+    assert monitor.config.GROUP_MENTION_TIMEOUT == 42
+
+
+@pytest.mark.parametrize('data', [
+    '{"GROUP_MENTION_TIMEOUT": ',
+    {'GROUP_MENTION_TIMEOUT': 0},
+    {'GROUP_MENTION_TIMEOUT': 'soon'},
+    {'NO_SUCH_OPTION': 1},
+])
+def test_invalid_file_keeps_old_config(system, reload, data):
+    before = system.compiled
+    assert not reload(data)
+    assert system.compiled is before
+    assert reload.watcher.failures == 1
+
+
+def test_bad_account_override_is_rejected(system, reload):
+    with pytest.raises(ConfigError, match='work'):
+        monitor.build_systems([{'name': 'work', 'config': {'MAX_ALERT_COUNT': 'many'}}], system.shared)
+
+    before = system.compiled
+    system.account_overrides = {'MAX_ALERT_COUNT': 0}
+    assert not reload({'GROUP_MENTION_TIMEOUT': 42})
+    assert system.compiled is before
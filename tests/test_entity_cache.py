@@ -0,0 +1,91 @@
+import asyncio
+
+from entity_cache import EntityCache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = EntityCache(ttl=10, clock=clock)
+    cache.put('chat', 'entity')
+    clock.now += 9.9
+    assert cache.get('chat') == 'entity'
+    clock.now += 0.1
+    assert cache.get('chat') is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EntityCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 读取后 a 变为最近使用
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_concurrent_fetches_share_one_request():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'entity'
+
+    async def main():
+        cache = EntityCache()
+        results = await asyncio.gather(*(cache.get_or_fetch('chat', fetch) for _ in range(5)))
+        again = await cache.get_or_fetch('chat', fetch)
+        return results, again, cache.stats()
+
+    results, again, stats = asyncio.run(main())
+    assert results == ['entity'] * 5 and again == 'entity'
+    assert len(calls) == 1
+    assert stats['hits'] == 1 and stats['misses'] == 5
+
+
+def test_failed_fetch_reaches_all_waiters_and_is_not_cached():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ConnectionError('flood wait')
+
+    async def main():
+        cache = EntityCache()
+        results = await asyncio.gather(*(cache.get_or_fetch('chat', fetch) for _ in range(3)),
+                                       return_exceptions=True)
+        return results, len(cache)
+
+    results, size = asyncio.run(main())
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert len(calls) == 1 and size == 0
+
+
+def test_none_key_is_not_cached():
+    async def main():
+        cache = EntityCache()
+        entity = await cache.get_or_fetch(None, lambda: asyncio.sleep(0, 'entity'))
+        return entity, len(cache), cache.stats()['misses']
+
+    assert asyncio.run(main()) == ('entity', 0, 0)
+
+
+def test_invalidate_forces_refetch():
+    async def main():
+        cache = EntityCache()
+        await cache.get_or_fetch('user', lambda: asyncio.sleep(0, 'old name'))
+        cache.invalidate('user')
+        return await cache.get_or_fetch('user', lambda: asyncio.sleep(0, 'new name'))
+
+    assert asyncio.run(main()) == 'new name'
@@ -0,0 +1,90 @@
+import gzip
+import json
+import os
+
+import event_journal
+from event_journal import EventJournal, query, read_index
+
+
+def write(directory, events, **kwargs):
+    journal = EventJournal(str(directory), flush_interval=0, **kwargs)
+    for ts, kind, chat_id in events:
+        journal.record(kind, chat_id, ts=ts, account='work')
+    journal.start()
+    journal.close()
+    return journal
+
+
+EVENTS = [(1000.0 + i, 'fire' if i % 3 == 0 else 'message', 100 + i // 4) for i in range(12)]
+
+
+def test_segments_rotate_at_max_bytes(tmp_path):
+    journal = write(tmp_path, EVENTS, max_bytes=200, compress=False)
+    index = read_index(str(tmp_path))
+    assert [entry['segment'] for entry in index] == ['events-000001.jsonl', 'events-000002.jsonl',
+                                                      'events-000003.jsonl']
+    # 分段首尾相接，不丢也不重复；写满 max_bytes 的那一行之后才切换
+    assert sum(entry['count'] for entry in index) == journal.written == len(EVENTS)
+    for previous, entry in zip(index, index[1:]):
+        assert previous['end'] < entry['start']
+    for entry in index:
+        lines = (tmp_path / entry['segment']).read_bytes().splitlines(keepends=True)
+        assert len(lines) == entry['count']
+        assert sum(map(len, lines[:-1])) < 200 <= sum(map(len, lines))
+    # 关闭时新开的空分段被删掉
+    assert journal.rotations == 3
+    assert not (tmp_path / 'events-000004.jsonl').exists()
+
+
+def test_closed_segments_are_gzipped(tmp_path):
+    write(tmp_path, EVENTS, max_bytes=200)
+    index = read_index(str(tmp_path))
+    names = sorted(name for name in os.listdir(tmp_path) if name.startswith('events-'))
+    assert names == sorted(entry['segment'] + '.gz' for entry in index)
+    with gzip.open(tmp_path / names[0], 'rt', encoding='utf-8') as f:
+        first = json.loads(f.readline())
+    assert (first['ts'], first['kind'], first['chat_id'], first['account']) == (1000.0, 'fire', 100, 'work')
+
+
+def test_query_spans_segments_in_order(tmp_path):
+    write(tmp_path, EVENTS, max_bytes=200)
+    events = list(query(str(tmp_path)))
+    assert [(e['ts'], e['kind'], e['chat_id']) for e in events] == EVENTS
+    fires = list(query(str(tmp_path), kinds={'fire'}, since=1002.0, until=1009.0))
+    assert [e['ts'] for e in fires] == [1003.0, 1006.0, 1009.0]
+    assert list(query(str(tmp_path), account='home')) == []
+
+
+def test_index_limits_which_segments_are_read(tmp_path, monkeypatch):
+    write(tmp_path, EVENTS, max_bytes=200)
+    opened = []
+    read_segment = event_journal._read_segment
+
+    def tracking(path):
+        opened.append(os.path.basename(path))
+        return read_segment(path)
+
+    monkeypatch.setattr(event_journal, '_read_segment', tracking)
+    index = read_index(str(tmp_path))
+    expected = [entry['segment'] + '.gz' for entry in index if 102 in entry['chats']]
+
+    events = list(query(str(tmp_path), chat_id=102))
+    assert [e['ts'] for e in events] == [1008.0, 1009.0, 1010.0, 1011.0]
+    assert opened == expected and len(expected) < len(index)
+
+    opened.clear()
+    assert list(query(str(tmp_path), since=2000.0)) == []
+    assert opened == []
+
+
+def test_unindexed_segment_is_queried_and_indexed_on_start(tmp_path):
+    # 上次异常退出：当前分段写了一半，没有登记到索引
+    with open(tmp_path / 'events-000001.jsonl', 'w', encoding='utf-8') as f:
+        f.write('{"ts":1.0,"kind":"fire","chat_id":7}\n{"ts":2.0,"kind":"me')
+    assert [e['ts'] for e in query(str(tmp_path))] == [1.0]
+
+    write(tmp_path, [(3.0, 'fire', 7)])
+    index = read_index(str(tmp_path))
+    assert [(entry['segment'], entry['count']) for entry in index] == [
+        ('events-000001.jsonl', 1), ('events-000002.jsonl', 1)]
+    assert [e['ts'] for e in query(str(tmp_path), chat_id=7)] == [1.0, 3.0]
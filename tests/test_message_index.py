@@ -0,0 +1,29 @@
+from message_index import MessageIndex
+
+
+def test_lookup_hits_and_misses():
+    index = MessageIndex()
+    index.add(100, 1, True, 5)
+    assert index.get(100, 1) == (True, 5)
+    assert index.get(100, 2) is None
+    assert index.get(200, 1) is None
+    assert (index.hits, index.misses) == (1, 2)
+
+
+def test_each_chat_keeps_only_recent_messages():
+    index = MessageIndex(per_chat=2)
+    for msg_id in (1, 2, 3):
+        index.add(100, msg_id, False, 5)
+    assert index.get(100, 1) is None
+    assert index.get(100, 3) is not None
+    assert len(index) == 2
+
+
+def test_least_recently_active_chat_is_dropped():
+    index = MessageIndex(max_chats=2)
+    index.add(100, 1, False, 5)
+    index.add(200, 1, False, 5)
+    index.add(100, 2, False, 5)  # 100 重新变为活跃
+    index.add(300, 1, False, 5)
+    assert index.get(200, 1) is None
+    assert index.get(100, 1) is not None and index.get(300, 1) is not None
@@ -0,0 +1,53 @@
+import time
+
+from message_store import MessageStore, search
+
+
+def write(path, messages, **kwargs):
+    store = MessageStore(path, **kwargs)
+    for message in messages:
+        store.add(*message)
+    store.start()
+    store.close()
+    return store
+
+
+def test_round_trip_search(tmp_path):
+    path = str(tmp_path / 'messages.db')
+    now = time.time()
+    write(path, [
+        ('work', 100, 1, 5, 'please process my refund', now - 30),
+        ('work', 100, 2, 6, 'lunch at noon?', now - 20),
+        ('work', 200, 1, 5, 'refund status', now - 10),
+        ('home', 100, 3, 7, '退款什么时候到账', now),
+    ])
+
+    assert [m.text for m in search(path, 'refund')] == ['refund status', 'please process my refund']
+    assert [(m.chat_id, m.msg_id) for m in search(path, 'refund', chat_id=100)] == [(100, 1)]
+    assert [m.msg_id for m in search(path, sender_id=5)] == [1, 1]
+    assert [m.account for m in search(path, '退款')] == ['home']
+    assert [m.msg_id for m in search(path, since=now - 15)] == [3, 1]
+    assert len(search(path, limit=2)) == 2
+
+
+def test_edit_replaces_text(tmp_path):
+    path = str(tmp_path / 'messages.db')
+    write(path, [('work', 100, 1, 5, 'old text', None), ('work', 100, 1, 5, 'new text', None)])
+    assert [m.text for m in search(path, chat_id=100)] == ['new text']
+    assert search(path, 'old text') == []
+
+
+def test_prune_drops_expired_and_excess_rows(tmp_path):
+    path = str(tmp_path / 'messages.db')
+    now = time.time()
+    store = write(path, [('work', 100, i, 5, f'message {i}', now - 100 + i) for i in range(5)]
+                  + [('work', 100, 99, 5, 'ancient', now - 1000)], retention=500, max_rows=3)
+    assert store.pruned == 3
+    assert [m.msg_id for m in search(path)] == [4, 3, 2]
+
+
+def test_batches_are_capped(tmp_path):
+    store = write(str(tmp_path / 'messages.db'), [('work', 1, i, 5, 'x', None) for i in range(2500)],
+                  flush_interval=10, max_batch=1000)
+    assert store.written == 2500
+    assert store.batches == 3
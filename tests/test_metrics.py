@@ -0,0 +1,96 @@
+import asyncio
+
+from metrics import Counter, Gauge, Histogram, MetricsServer, Registry
+
+
+def test_counter_and_gauge_text_format():
+    registry = Registry()
+    total = Counter('demo_messages_total', 'Messages seen', ['type'], registry=registry)
+    total.labels(type='group').inc()
+    total.labels(type='group').inc(2)
+    total.labels('private').inc()
+    depth = Gauge('demo_queue_depth', 'Queue depth', registry=registry)
+    depth.set(3.5)
+    pending = Gauge('demo_pending', 'Pending', registry=registry)
+    pending.set_function(lambda: 7)
+    broken = Gauge('demo_broken', 'Broken', registry=registry)
+    broken.set_function(lambda: 1 / 0)
+
+    assert registry.render().splitlines() == [
+        '# HELP demo_messages_total Messages seen',
+        '# TYPE demo_messages_total counter',
+        'demo_messages_total{type="group"} 3',
+        'demo_messages_total{type="private"} 1',
+        '# HELP demo_queue_depth Queue depth',
+        '# TYPE demo_queue_depth gauge',
+        'demo_queue_depth 3.5',
+        '# HELP demo_pending Pending',
+        '# TYPE demo_pending gauge',
+        'demo_pending 7',
+        '# HELP demo_broken Broken',
+        '# TYPE demo_broken gauge',
+        'demo_broken NaN',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = Histogram('demo_latency_seconds', 'Latency', ['kind'], buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels(kind='chat').observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'demo_latency_seconds_bucket{kind="chat",le="0.1"} 2',
+        'demo_latency_seconds_bucket{kind="chat",le="1"} 3',
+        'demo_latency_seconds_bucket{kind="chat",le="+Inf"} 4',
+        'demo_latency_seconds_sum{kind="chat"} 3.65',
+        'demo_latency_seconds_count{kind="chat"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    total = Counter('demo_total', 'Demo', ['account'], registry=registry)
+    total.labels(account='a "quoted"\\path\nnext').inc()
+    assert registry.render().splitlines()[2] == 'demo_total{account="a \\"quoted\\"\\\\path\\nnext"} 1'
+
+
+def test_duplicate_registration_is_rejected():
+    registry = Registry()
+    Counter('demo_total', 'Demo', registry=registry)
+    try:
+        Counter('demo_total', 'Demo', registry=registry)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('duplicate metric registered')
+
+
+async def _get(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return head.decode().splitlines()[0], body.decode()
+
+
+def test_http_endpoint_serves_metrics():
+    registry = Registry()
+    Counter('demo_total', 'Demo', registry=registry).inc()
+
+    async def main():
+        server = MetricsServer('127.0.0.1', 0, registry)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await _get(port, '/metrics'), await _get(port, '/other')
+        finally:
+            await server.stop()
+
+    (status, body), (missing, _) = asyncio.run(main())
+    assert status == 'HTTP/1.1 200 OK'
+    assert body == registry.render()
+    assert 'demo_total 1' in body.splitlines()
+    assert missing == 'HTTP/1.1 404 Not Found'
@@ -0,0 +1,77 @@
+import asyncio
+
+from pipeline import Pipeline
+
+
+def test_drop_mode_keeps_essential_items():
+    async def main():
+        handled = []
+        release = asyncio.Event()
+
+        async def handler(item):
+            await release.wait()
+            handled.append(item)
+
+        pipeline = Pipeline()
+        stage = pipeline.add_stage('group', handler, workers=1, maxsize=1, drop_when_full=True)
+        pipeline.start()
+        assert await stage.put('first')
+        await asyncio.sleep(0)  # worker 取走 first，阻塞在处理中
+        assert await stage.put('queued')
+        assert not await stage.put('chatter')
+        assert stage.stats.dropped == 1
+
+        mention = asyncio.create_task(stage.put('mention', essential=True))
+        await asyncio.sleep(0.01)
+        assert not mention.done()  # 队列满时等待而不是丢弃
+        release.set()
+        assert await mention
+        await pipeline.join()
+        await pipeline.stop()
+        assert handled == ['first', 'queued', 'mention']
+        assert stage.stats.dropped == 1
+
+    asyncio.run(main())
+
+
+def test_blocking_mode_applies_backpressure():
+    async def main():
+        async def handler(item):
+            pass
+
+        pipeline = Pipeline()
+        stage = pipeline.add_stage('private', handler, workers=1, maxsize=1)
+        put = asyncio.create_task(stage.put('a'))
+        second = asyncio.create_task(stage.put('b'))
+        await asyncio.sleep(0.01)
+        assert put.done() and not second.done()
+        pipeline.start()
+        assert await second
+        await pipeline.join()
+        await pipeline.stop()
+        assert stage.stats.processed == 2 and stage.stats.dropped == 0
+
+    asyncio.run(main())
+
+
+def test_sharded_stage_keeps_per_key_order():
+    async def main():
+        handled = []
+
+        async def handler(item):
+            chat_id, delay = item
+            await asyncio.sleep(delay)
+            handled.append(item)
+
+        pipeline = Pipeline()
+        stage = pipeline.add_sharded_stage('enrich', handler, key=lambda item: item[0], shards=4)
+        pipeline.start()
+        # 同一会话的慢条目挡住后面的快条目，其他会话不受影响
+        for item in ((1, 0.05), (1, 0.0), (2, 0.0)):
+            await stage.put(item)
+        await pipeline.join()
+        await pipeline.stop()
+        assert handled == [(2, 0.0), (1, 0.05), (1, 0.0)]
+        assert stage.stats.processed == 3 and stage.depth == 0
+
+    asyncio.run(main())
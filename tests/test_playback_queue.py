@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import Future
+
+from playback_queue import PlaybackQueue, Priority
+
+
+class Player:
+    """记录提交的播放请求，由测试决定每次播放何时结束"""
+
+    def __init__(self):
+        self.calls = []
+        self.futures = []
+
+    def __call__(self, path, volume, count, interval):
+        self.calls.append((path, volume, count))
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    @property
+    def paths(self):
+        return [call[0] for call in self.calls]
+
+    def finish(self):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(None)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_higher_priority_plays_first():
+    async def scenario():
+        player = Player()
+        queue = PlaybackQueue(player)
+        queue.enqueue('busy', Priority.GROUP)
+        await settle()
+        waiters = [queue.enqueue('group', Priority.GROUP), queue.enqueue('private', Priority.PRIVATE),
+                   queue.enqueue('sensitive', Priority.SENSITIVE)]
+        assert queue.depth == 3
+        for _ in range(4):
+            player.finish()
+            await settle()
+        await asyncio.gather(*waiters)
+        await queue.close()
+        return player.paths
+
+    assert asyncio.run(scenario()) == ['busy', 'sensitive', 'private', 'group']
+
+
+def test_pending_duplicates_are_coalesced():
+    async def scenario():
+        player = Player()
+        queue = PlaybackQueue(player)
+        queue.enqueue('busy', Priority.GROUP)
+        await settle()
+        first = queue.enqueue('alert', Priority.GROUP, volume=40, count=1)
+        second = queue.enqueue('alert', Priority.GROUP, volume=70, count=2)
+        for _ in range(2):
+            player.finish()
+            await settle()
+        await asyncio.gather(first, second)
+        await queue.close()
+        return player.calls, queue.coalesced
+
+    calls, coalesced = asyncio.run(scenario())
+    assert calls == [('busy', 70, 1), ('alert', 70, 2)]
+    assert coalesced == 1
+
+
+def test_request_joins_playback_only_inside_coalesce_window():
+    async def scenario(window):
+        player = Player()
+        queue = PlaybackQueue(player, coalesce_window=window)
+        first = queue.enqueue('alert', Priority.GROUP)
+        await settle()
+        second = queue.enqueue('alert', Priority.GROUP)
+        for _ in range(2):
+            player.finish()
+            await settle()
+        await asyncio.gather(first, second)
+        await queue.close()
+        return player.paths
+
+    assert asyncio.run(scenario(10.0)) == ['alert']
+    assert asyncio.run(scenario(0.0)) == ['alert', 'alert']
+
+
+def test_pending_request_is_promoted_to_higher_priority():
+    async def scenario():
+        player = Player()
+        queue = PlaybackQueue(player)
+        queue.enqueue('busy', Priority.GROUP)
+        await settle()
+        queue.enqueue('music', Priority.GROUP)
+        queue.enqueue('private', Priority.PRIVATE)
+        queue.enqueue('music', Priority.SENSITIVE)
+        for _ in range(4):
+            player.finish()
+            await settle()
+        await queue.close()
+        return player.paths
+
+    # 提升后留在队列里的旧条目不会再播放一次
+    assert asyncio.run(scenario()) == ['busy', 'music', 'private']
+
+
+def test_close_cancels_pending_requests():
+    async def scenario():
+        player = Player()
+        queue = PlaybackQueue(player)
+        queue.enqueue('busy', Priority.GROUP)
+        await settle()
+        pending = queue.enqueue('later', Priority.GROUP)
+        await queue.close()
+        return pending.cancelled(), player.paths
+
+    assert asyncio.run(scenario()) == (True, ['busy'])
+
+
+def test_on_start_receives_queue_latency():
+    async def scenario():
+        player = Player()
+        latencies = []
+        queue = PlaybackQueue(player, on_start=latencies.append)
+        queue.enqueue('first', Priority.GROUP)
+        await settle()
+        queue.enqueue('second', Priority.GROUP)
+        await asyncio.sleep(0.05)
+        player.finish()
+        await settle()
+        await queue.close()
+        return latencies, queue.stats()
+
+    latencies, stats = asyncio.run(scenario())
+    assert len(latencies) == 2
+    assert latencies[1] >= 0.05 > latencies[0]
+    assert stats['latency_max'] == latencies[1]
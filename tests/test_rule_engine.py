@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from config_reloader import ConfigError
+from rule_engine import Rule, RuleEngine, compile_rule
+
+
+def test_compile_rule_fields():
+    rule = compile_rule({'VIP': True, 'GROUP_MENTION_TIMEOUT': 30, 'KEYWORDS': ['deploy'],
+                         'REGEX': r'err(or)?\b', 'QUIET_HOURS': '23:00-07:00'}, 'test')
+    assert rule.vip and not rule.muted
+    assert rule.group_timeout == 30
+    assert rule.private_timeout is None
+    assert rule.matches('DEPLOY now')
+    assert rule.matches('got an Error')
+    assert not rule.matches('all good')
+    assert not rule.matches('')
+    assert rule.quiet_hours == ((23 * 60, 7 * 60),)
+
+
+@pytest.mark.parametrize('spec', [
+    {'MUTED': 'yes'},
+    {'MAX_ALERT_COUNT': 0},
+    {'GROUP_MENTION_TIMEOUT': 1.5},
+    {'KEYWORDS': 'deploy'},
+    {'REGEX': '('},
+    {'QUIET_HOURS': '25:00-26:00'},
+    {'QUIET_HOURS': 'night'},
+    {'UNKNOWN': 1},
+    [],
+])
+def test_invalid_rules_raise_config_error(spec):
+    with pytest.raises(ConfigError):
+        compile_rule(spec, 'test')
+
+
+def _at(hour, minute):
+    return time.mktime((2024, 1, 1, hour, minute, 0, 0, 0, -1))
+
+
+def test_quiet_hours_across_midnight():
+    rule = Rule(quiet_hours=((23 * 60, 7 * 60),))
+    assert rule.in_quiet_hours(_at(23, 30))
+    assert rule.in_quiet_hours(_at(3, 0))
+    assert not rule.in_quiet_hours(_at(7, 0))
+    assert not rule.in_quiet_hours(_at(12, 0))
+    assert not Rule().in_quiet_hours(_at(3, 0))
+
+
+def test_resolve_merges_chat_and_sender_rules():
+    engine = RuleEngine({'100': {'GROUP_MENTION_TIMEOUT': 30, 'KEYWORDS': ['deploy']}},
+                        {'7': {'VIP': True, 'GROUP_MENTION_TIMEOUT': 10, 'MAX_ALERT_COUNT': 2}})
+    assert len(engine) == 2
+    assert engine.resolve(200, 8) is None
+    assert engine.resolve(100, 8).group_timeout == 30
+    assert engine.resolve(200, 7).vip
+    merged = engine.resolve(100, 7)
+    assert merged.vip
+    assert merged.group_timeout == 10  # 发送者规则的数值优先
+    assert merged.max_alert_count == 2
+    assert merged.matches('deploy')
+    assert engine.resolve(100, 7) is merged
+
+
+def test_rule_keys_must_be_ids():
+    with pytest.raises(ConfigError):
+        RuleEngine({'general': {'MUTED': True}})
@@ -0,0 +1,33 @@
+from sensitive_matcher import SensitiveMatch, SensitiveWordMatcher
+
+
+def spans(matcher, text):
+    return [(m.word, text[m.start:m.end]) for m in matcher.find_all(text)]
+
+
+def test_finds_overlapping_words_in_order():
+    matcher = SensitiveWordMatcher(['he', 'she', 'his', 'hers'])
+    assert spans(matcher, 'ushers') == [('she', 'she'), ('he', 'he'), ('hers', 'hers')]
+
+
+def test_case_insensitive_and_reports_original_spelling():
+    matcher = SensitiveWordMatcher(['Password', 'password', '密码'])
+    assert len(matcher) == 2
+    assert matcher.find_all('my PASSWORD 和密码') == [
+        SensitiveMatch('Password', 3, 11),
+        SensitiveMatch('密码', 13, 15),
+    ]
+
+
+def test_offsets_refer_to_original_text_when_folding_changes_length():
+    matcher = SensitiveWordMatcher(['ab', 'Straße'])
+    text = 'İxAB STRASSE'
+    assert spans(matcher, text) == [('ab', 'AB'), ('Straße', 'STRASSE')]
+
+
+def test_search():
+    matcher = SensitiveWordMatcher(['token'])
+    assert matcher.search('send me the TOKEN')
+    assert not matcher.search('nothing here')
+    assert not SensitiveWordMatcher([]).search('token')
+    assert SensitiveWordMatcher(['', None]).find_all('anything') == []
@@ -0,0 +1,112 @@
+import datetime
+import logging
+import sqlite3
+
+import pytest
+from telethon.crypto import AuthKey
+from telethon.sessions import SQLiteSession
+from telethon.tl import types
+
+from session_store import SESSION_VERSION, BatchedSession
+
+NOW = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def user(user_id, username):
+    return types.User(user_id, access_hash=user_id * 7, username=username, first_name=username)
+
+
+def state(pts):
+    return types.updates.State(pts, 0, NOW, pts, 0)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'account.session')
+
+
+@pytest.fixture(autouse=True)
+def no_write_errors(caplog):
+    yield
+    errors = [r for r in caplog.records if r.name == 'session_store' and r.levelno >= logging.ERROR]
+    assert not errors
+
+
+def test_round_trip_with_telethon_sqlite_session(path):
+    original = SQLiteSession(path)
+    original.set_dc(2, '149.154.167.51', 443)
+    original.auth_key = AuthKey(b'a' * 256)
+    original.process_entities(types.Updates([], [user(10, 'alice')], [], NOW, 0))
+    original.set_update_state(0, state(5))
+    original.save()
+    original.close()
+
+    batched = BatchedSession(path, flush_interval=0)
+    assert (batched.dc_id, batched.server_address, batched.port) == (2, '149.154.167.51', 443)
+    assert batched.auth_key.key == b'a' * 256
+    assert batched.get_entity_rows_by_username('alice') == (10, 70)
+    assert batched.get_update_state(0).pts == 5
+
+    # 连接时 telethon 会重设 DC 和密钥，会话行总是脏的
+    batched.set_dc(4, '149.154.167.91', 443)
+    batched.auth_key = AuthKey(b'b' * 256)
+    batched.process_entities(types.Updates([], [user(11, 'bob')], [], NOW, 0))
+    batched.set_update_state(0, state(9))
+    batched.save()
+    batched.close()
+    assert batched.flushes == 1
+
+    reopened = SQLiteSession(path)
+    assert (reopened.dc_id, reopened.port) == (4, 443)
+    assert reopened.auth_key.key == b'b' * 256
+    assert reopened.get_entity_rows_by_id(10) == (10, 70)
+    assert reopened.get_entity_rows_by_username('bob') == (11, 77)
+    assert reopened.get_update_state(0).pts == 9
+    reopened.close()
+
+
+def test_upgrades_version_7_file(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE version (version INTEGER PRIMARY KEY);
+        INSERT INTO version VALUES (7);
+        CREATE TABLE sessions (dc_id INTEGER PRIMARY KEY, server_address TEXT, port INTEGER, auth_key BLOB,
+                               takeout_id INTEGER);
+        CREATE TABLE entities (id INTEGER PRIMARY KEY, hash INTEGER NOT NULL, username TEXT, phone INTEGER,
+                               name TEXT, date INTEGER);
+        CREATE TABLE sent_files (md5_digest BLOB, file_size INTEGER, type INTEGER, id INTEGER, hash INTEGER,
+                                 PRIMARY KEY (md5_digest, file_size, type));
+        CREATE TABLE update_state (id INTEGER PRIMARY KEY, pts INTEGER, qts INTEGER, date INTEGER, seq INTEGER);
+    """)
+    conn.execute('INSERT INTO sessions VALUES (2, ?, 443, ?, NULL)', ('149.154.167.51', b'c' * 256))
+    conn.commit()
+    conn.close()
+
+    batched = BatchedSession(path, flush_interval=0)
+    assert batched.auth_key.key == b'c' * 256
+    batched.set_dc(2, '149.154.167.51', 443)
+    batched.save()
+    batched.close()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT version FROM version').fetchall() == [(SESSION_VERSION,)]
+    conn.close()
+    reopened = SQLiteSession(path)
+    assert reopened.auth_key.key == b'c' * 256
+    reopened.close()
+
+
+def test_background_writer_flushes_on_close(path):
+    batched = BatchedSession(path, flush_interval=30)
+    batched.set_dc(2, '149.154.167.51', 443)
+    for i in range(100):
+        batched.process_entities(types.Updates([], [user(100 + i % 10, f"user{i % 10}")], [], NOW, 0))
+        batched.set_update_state(0, state(i))
+    batched.close()
+    # 同一行在一个周期内多次变化只写一次
+    assert batched.rows_written == 10 + 1 + 1
+
+    reopened = BatchedSession(path, flush_interval=0)
+    assert reopened.get_entity_rows_by_username('user3') == (103, 721)
+    assert reopened.get_update_state(0).pts == 99
+    reopened.close()
@@ -0,0 +1,119 @@
+import asyncio
+import shutil
+import sqlite3
+import time
+
+from state_store import OP_ALERT, OP_CLEAR, OP_INTERACTION, OP_PLAY, StateStore
+
+
+def _read_state(path):
+    store = StateStore(path)
+    state = store.load()
+    store.close()
+    return state
+
+
+def test_restart_restores_pending_alerts_and_interactions(make_system, tmp_path):
+    path = str(tmp_path / 'state.db')
+
+    async def before_restart():
+        system = make_system(STATE_DB_PATH=path)
+        system._restore_state()
+        system._add_alert(5, 10, is_private=True)
+        system._mark_interaction(100, 1234.5)
+        system.play_counts[5] += 1
+        system._journal(OP_PLAY, 5, system.play_counts[5])
+        system.state_store.close()
+        return system.pending_alerts[5]
+
+    async def after_restart():
+        system = make_system(STATE_DB_PATH=path)
+        system._restore_state()
+        return system, system.scheduler.deadline((system.name, 5))
+
+    record = asyncio.run(before_restart())
+    restored, deadline = asyncio.run(after_restart())
+    assert restored.pending_alerts[5] == record
+    assert deadline == record.mention_time + record.timeout_interval
+    assert restored.last_interactions[100] == 1234.5
+    assert restored.last_interactions.touched_at(100) == 1234.5
+    assert restored.play_counts[5] == 1
+
+
+def test_compaction_drops_retired_and_expired_rows(tmp_path):
+    path = str(tmp_path / 'state.db')
+    store = StateStore(path, flush_interval=0)
+    store.load()
+    store.record(OP_ALERT, 1, {'message_id': 1})
+    store.record(OP_ALERT, 2, {'message_id': 2})
+    store.record(OP_CLEAR, 1)
+    store.record(OP_INTERACTION, 7, 100.0)
+    store.record(OP_INTERACTION, 7, None)
+    store.record(OP_PLAY, 8, 3)
+    store.close()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT COUNT(*) FROM journal').fetchone() == (0,)
+    assert sorted(conn.execute('SELECT kind, chat_id FROM snapshot')) == [(OP_ALERT, 2), (OP_PLAY, 8)]
+    conn.close()
+
+    state = _read_state(path)
+    assert state.alerts == {2: {'message_id': 2}}
+    assert state.interactions == {}
+    assert state.play_counts == {8: 3}
+
+
+def test_journal_is_compacted_while_running(tmp_path):
+    store = StateStore(str(tmp_path / 'state.db'), flush_interval=0, compact_every=2)
+    store.load()
+    for chat_id in range(6):
+        store.record(OP_INTERACTION, chat_id, float(chat_id))
+    store.close()
+    assert store.written == 6
+    assert store.compactions >= 2
+
+
+def _wait_written(store, count):
+    deadline = time.monotonic() + 5
+    while store.written < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.written == count
+
+
+def test_truncated_wal_still_opens(tmp_path):
+    path = tmp_path / 'state.db'
+    store = StateStore(str(path), flush_interval=0, compact_every=10 ** 6)
+    store.load()
+    for chat_id in range(50):
+        store.record(OP_ALERT, chat_id, {'message_id': chat_id})
+    _wait_written(store, 50)
+
+    # 模拟写到一半时断电：复制仍在使用中的数据库和 WAL，把 WAL 截断在中途
+    wal = tmp_path / 'state.db-wal'
+    size = wal.stat().st_size
+    for keep in (size // 2, 10):
+        copy = tmp_path / f'copy{keep}.db'
+        shutil.copy(path, copy)
+        shutil.copy(wal, tmp_path / f'copy{keep}.db-wal')
+        with open(tmp_path / f'copy{keep}.db-wal', 'r+b') as f:
+            f.truncate(keep)
+        state = _read_state(str(copy))
+        # 只保留完整提交的批次，顺序写入的前缀
+        assert set(state.alerts) == set(range(len(state.alerts)))
+    store.close()
+
+
+def test_evicted_chats_are_removed_from_journal(make_system, tmp_path):
+    path = str(tmp_path / 'state.db')
+    system = make_system(STATE_DB_PATH=path, MAX_TRACKED_CHATS=2)
+    system._restore_state()
+    for chat_id in (1, 2, 3):
+        system._mark_interaction(chat_id, 1000.0 + chat_id)
+        system.play_counts[chat_id] += 1
+        system._journal(OP_PLAY, chat_id, system.play_counts[chat_id])
+    assert list(system.last_interactions) == [2, 3]
+    system.state_store.close()
+
+    state = _read_state(path)
+    assert state.interactions == {2: 1002.0, 3: 1003.0}
+    assert state.play_counts == {2: 1, 3: 1}